@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+
+# Fields copied from mt5.account_info() into each snapshot
+ACCOUNT_FIELDS = ('balance', 'equity', 'profit', 'margin', 'margin_free', 'margin_level')
+
+
+class AccountMonitor:
+    """Single source of balance and equity for sizing, risk checks and the UI
+
+    A background thread polls account_info at an adaptive cadence: back
+    to min_interval whenever something changed or after touch() (an order
+    was sent), doubling up to max_interval while the account is idle.
+    The floor of one second matches the loop this replaced, so terminal
+    calls never exceed it. The last snapshot is cached for readers, and
+    listeners are only called with the fields that moved by at least
+    threshold since the last snapshot they were sent, so slow drift is
+    still reported once it adds up.
+    """
+
+    def __init__(self, fetch, min_interval=1.0, max_interval=10.0, threshold=0.01):
+        self.fetch = fetch
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.threshold = threshold
+        self.interval = min_interval
+        self.snapshot = None
+        self.snapshot_time = 0.0
+        self.published = None  # Last snapshot sent to the listeners
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.running = False
+
+    def add_listener(self, callback):
+        """Call callback(snapshot, changed_fields) whenever a field moves by at least threshold"""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+
+    def touch(self):
+        """Poll again soon; called after trading activity"""
+        self.interval = self.min_interval
+        self.wakeup.set()
+
+    def _run(self):
+        while self.running:
+            self.refresh()
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+
+    def refresh(self):
+        """Poll account_info now; returns the current snapshot (the cached one if the poll failed)"""
+        try:
+            info = self.fetch()
+        except Exception as e:
+            logging.error(f"Error polling account info: {str(e)}")
+            info = None
+        if info is None:
+            self.interval = min(self.interval * 2, self.max_interval)
+            return self.snapshot
+
+        snapshot = {name: getattr(info, name) for name in ACCOUNT_FIELDS}
+        with self.lock:
+            self.snapshot = snapshot
+            self.snapshot_time = time.monotonic()
+            published = self.published
+            if published is None:
+                changed = list(ACCOUNT_FIELDS)
+            else:
+                changed = [name for name in ACCOUNT_FIELDS if abs(snapshot[name] - published[name]) >= self.threshold]
+            if changed:
+                self.published = snapshot
+
+        if changed:
+            self.interval = self.min_interval
+            for callback in list(self.listeners):
+                try:
+                    callback(snapshot, changed)
+                except Exception as e:
+                    logging.error(f"Error in account listener: {str(e)}")
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        return snapshot
+
+    def get(self, max_age=None):
+        """Cached snapshot; refreshed first when missing or older than max_age seconds"""
+        if self.snapshot is None or (max_age is not None and time.monotonic() - self.snapshot_time > max_age):
+            return self.refresh()
+        return self.snapshot
+
+    @property
+    def balance(self):
+        snapshot = self.get()
+        return snapshot['balance'] if snapshot else None
+
+    @property
+    def equity(self):
+        snapshot = self.get()
+        return snapshot['equity'] if snapshot else None
@@ -0,0 +1,468 @@
+import argparse
+import json
+import logging
+import numpy as np
+import pandas as pd
+
+# Default strategy parameters, mirroring ForexTradingBot and trading_bot.main
+DEFAULT_PARAMS = {
+    'short_window': 20,
+    'long_window': 50,
+    'rsi_period': 14,
+    'stop_loss': 0.5,      # Stop loss in percentage
+    'take_profit': 0.3,    # Take profit in percentage
+    'grid_spacing': 0.2,   # Minimum distance between entries in percentage
+    'max_positions': 3,    # Maximum number of positions per direction
+    'volume': 0.01,
+}
+
+# Equity curve statistics are computed in blocks of this many bars
+EQUITY_BLOCK = 1 << 20
+
+TRADE_COLUMNS = [
+    'entry_index', 'exit_index', 'direction', 'entry_price', 'exit_price',
+    'sl', 'tp', 'volume', 'pnl', 'reason'
+]
+
+
+def sma(values, window):
+    """Simple moving average, NaN until the window is full"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if 0 < window <= len(values):
+        csum = np.cumsum(np.insert(values, 0, 0.0))
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def ema(values, span):
+    """Exponential moving average (same as pandas ewm(span, adjust=False))"""
+    values = np.asarray(values, dtype=np.float64)
+    return pd.Series(values).ewm(span=span, adjust=False).mean().to_numpy()
+
+
+def rsi(values, period=14):
+    """RSI with simple rolling averages, same as trading_bot.calculate_rsi"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if len(values) <= period:
+        return out
+    delta = np.diff(values)
+    gain = sma(np.where(delta > 0, delta, 0.0), period)
+    loss = sma(np.where(delta < 0, -delta, 0.0), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = gain / loss
+        out[1:] = 100 - (100 / (1 + rs))
+    return out
+
+
+def atr(high, low, close, period=14):
+    """Average true range with a simple rolling mean"""
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return sma(true_range, period)
+
+
+class StreamingSMA:
+    """sma() over consecutive chunks, bit-identical to one call over the whole series
+
+    The running cumulative sum is continued from the previous chunk and
+    only its last window values are kept, so memory is O(window).
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.tail = np.zeros(1)  # Cumulative sums C[count - len(tail) + 1 .. count], C[0] = 0
+        self.count = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        window = self.window
+        csum = np.cumsum(np.concatenate((self.tail[-1:], values)))
+        history = np.concatenate((self.tail[:-1], csum))
+        base = self.count + 1 - len(self.tail)
+        out = np.full(len(values), np.nan)
+        first = max(window - 1, self.count)  # First global index with a full window
+        if window > 0 and first < self.count + len(values):
+            ends = np.arange(first, self.count + len(values)) + 1 - base
+            out[first - self.count:] = (history[ends] - history[ends - window]) / window
+        self.count += len(values)
+        self.tail = history[-window:] if window > 0 else history[-1:]
+        return out
+
+
+class StreamingRSI:
+    """rsi() over consecutive chunks, bit-identical to one call over the whole series"""
+
+    def __init__(self, period=14):
+        self.gain = StreamingSMA(period)
+        self.loss = StreamingSMA(period)
+        self.last = None
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        out = np.full(len(values), np.nan)
+        if not len(values):
+            return out
+        if self.last is None:
+            delta, target = np.diff(values), out[1:]
+        else:
+            delta, target = np.diff(np.concatenate(([self.last], values))), out
+        self.last = values[-1]
+        gain = self.gain.update(np.where(delta > 0, delta, 0.0))
+        loss = self.loss.update(np.where(delta < 0, -delta, 0.0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = gain / loss
+            target[:] = 100 - (100 / (1 + rs))
+        return out
+
+
+class IndicatorCache:
+    """Indicator arrays for one slice of history, computed once and shared across parameter sets"""
+
+    def __init__(self, df):
+        self.close = df['close'].to_numpy(dtype=np.float64)
+        self.high = df['high'].to_numpy(dtype=np.float64)
+        self.low = df['low'].to_numpy(dtype=np.float64)
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.close)
+
+    def _get(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def sma(self, window):
+        return self._get(('sma', window), lambda: sma(self.close, window))
+
+    def ema(self, span):
+        return self._get(('ema', span), lambda: ema(self.close, span))
+
+    def rsi(self, period):
+        return self._get(('rsi', period), lambda: rsi(self.close, period))
+
+    def atr(self, period):
+        return self._get(('atr', period), lambda: atr(self.high, self.low, self.close, period))
+
+
+class BacktestResult:
+    """Trades and equity curve of a single simulation"""
+
+    def __init__(self, trades, equity, initial_balance):
+        self.trades = trades
+        self.equity = equity
+        self.initial_balance = initial_balance
+
+    @property
+    def net_profit(self):
+        return float(self.trades['pnl'].sum()) if len(self.trades) else 0.0
+
+    @property
+    def win_rate(self):
+        if not len(self.trades):
+            return 0.0
+        return float((self.trades['pnl'] > 0).mean())
+
+    @property
+    def max_drawdown(self):
+        if not len(self.equity):
+            return 0.0
+        # Blockwise so a memory-mapped equity curve is never loaded whole
+        drawdown, peak = 0.0, -np.inf
+        for start in range(0, len(self.equity), EQUITY_BLOCK):
+            block = np.asarray(self.equity[start:start + EQUITY_BLOCK])
+            block_peak = np.maximum.accumulate(np.maximum(block, peak))
+            drawdown = max(drawdown, float(np.max(block_peak - block)))
+            peak = block_peak[-1]
+        return drawdown
+
+    @property
+    def sharpe(self):
+        if len(self.equity) < 2:
+            return 0.0
+        if len(self.equity) <= EQUITY_BLOCK:
+            returns = np.diff(self.equity)
+            mean, std = returns.mean(), returns.std()
+        else:
+            # Two passes over blocks of returns: the mean, then the variance around it
+            n = len(self.equity) - 1
+            mean = sum(float(block.sum()) for block in self._return_blocks()) / n
+            std = np.sqrt(sum(float(((block - mean) ** 2).sum()) for block in self._return_blocks()) / n)
+        return float(mean / std * np.sqrt(len(self.equity) - 1)) if std > 0 else 0.0
+
+    def _return_blocks(self):
+        for start in range(0, len(self.equity) - 1, EQUITY_BLOCK):
+            yield np.diff(np.asarray(self.equity[start:start + EQUITY_BLOCK + 1]))
+
+    def score(self, objective='net_profit'):
+        """Score used to rank parameter sets"""
+        if objective == 'sharpe':
+            return self.sharpe
+        if objective == 'calmar':
+            drawdown = self.max_drawdown
+            return self.net_profit / drawdown if drawdown > 0 else self.net_profit
+        return self.net_profit
+
+    def summary(self):
+        return {
+            'trades': len(self.trades),
+            'net_profit': self.net_profit,
+            'win_rate': self.win_rate,
+            'max_drawdown': self.max_drawdown,
+            'sharpe': self.sharpe,
+        }
+
+
+class Simulation:
+    """Balance, open positions and trades of the trading_bot.main rules
+
+    step() advances the simulation over a block of bars, so the same state
+    can run over one in-memory slice (run_backtest) or over consecutive
+    chunks of a longer history (run_streaming_backtest).
+    """
+
+    def __init__(self, params=None, initial_balance=10000.0, contract_size=100.0, spread=0.0):
+        p = dict(DEFAULT_PARAMS)
+        if params:
+            p.update(params)
+        self.params = p
+        self.initial_balance = initial_balance
+        self.contract_size = contract_size
+        self.spread = spread
+        self.balance = initial_balance
+        self.positions = []  # [direction, entry_price, sl, tp, entry_index]
+        self.trades = []
+        self.last_close = None
+        self.last_index = None
+
+    def step(self, high, low, close, sma_short, sma_long, rsi_values, start, end, equity, offset=0):
+        """Simulate bars [start, end) of the arrays, writing equity[i - start]
+
+        offset is the global index of element 0, used for trade indices.
+        """
+        p = self.params
+        sl_pct = p['stop_loss'] / 100
+        tp_pct = p['take_profit'] / 100
+        spacing = p['grid_spacing'] / 100
+        max_positions = p['max_positions']
+        volume = p['volume']
+        value_per_point = volume * self.contract_size
+        spread = self.spread
+        balance = self.balance
+        positions = self.positions
+        trades = self.trades
+
+        for i in range(start, end):
+            h, l, c = high[i], low[i], close[i]
+
+            # Check SL/TP on open positions
+            if positions:
+                remaining = []
+                for pos in positions:
+                    direction, entry, sl, tp, entry_index = pos
+                    exit_price = None
+                    if direction > 0:
+                        if l <= sl:
+                            exit_price, reason = sl, 'SL'
+                        elif h >= tp:
+                            exit_price, reason = tp, 'TP'
+                    else:
+                        if h >= sl:
+                            exit_price, reason = sl, 'SL'
+                        elif l <= tp:
+                            exit_price, reason = tp, 'TP'
+                    if exit_price is None:
+                        remaining.append(pos)
+                        continue
+                    pnl = (exit_price - entry) * direction * value_per_point
+                    balance += pnl
+                    trades.append((entry_index, i + offset, direction, entry, exit_price, sl, tp, volume, pnl, reason))
+                positions = remaining
+
+            s, lg, r = sma_short[i], sma_long[i], rsi_values[i]
+            if not (np.isnan(s) or np.isnan(lg) or np.isnan(r)):
+                buys = [pos[1] for pos in positions if pos[0] > 0]
+                sells = [pos[1] for pos in positions if pos[0] < 0]
+
+                # Oversold or uptrend
+                if len(buys) < max_positions and ((s > lg and r < 70) or r < 30):
+                    entry = c + spread
+                    if all(abs(entry - e) >= e * spacing for e in buys):
+                        positions.append([1, entry, entry * (1 - sl_pct), entry * (1 + tp_pct), i + offset])
+
+                # Overbought or downtrend
+                if len(sells) < max_positions and ((s < lg and r > 30) or r > 70):
+                    entry = c
+                    if all(abs(entry - e) >= e * spacing for e in sells):
+                        positions.append([-1, entry, entry * (1 + sl_pct), entry * (1 - tp_pct), i + offset])
+
+            unrealized = sum((c - pos[1]) * pos[0] for pos in positions) * value_per_point
+            equity[i - start] = balance + unrealized
+
+        self.balance = balance
+        self.positions = positions
+        if end > start:
+            self.last_close = close[end - 1]
+            self.last_index = end - 1 + offset
+
+    def finish(self):
+        """Close whatever is still open at the last bar"""
+        if self.positions and self.last_index is not None:
+            c = self.last_close
+            volume = self.params['volume']
+            value_per_point = volume * self.contract_size
+            for direction, entry, sl, tp, entry_index in self.positions:
+                pnl = (c - entry) * direction * value_per_point
+                self.balance += pnl
+                self.trades.append((entry_index, self.last_index, direction, entry, c, sl, tp, volume, pnl, 'END'))
+            self.positions = []
+
+    def result(self, equity):
+        return BacktestResult(pd.DataFrame(self.trades, columns=TRADE_COLUMNS), equity, self.initial_balance)
+
+
+def run_backtest(indicators, params=None, start=0, end=None, initial_balance=10000.0,
+                 contract_size=100.0, spread=0.0):
+    """Simulate the trading_bot.main rules over bars [start, end) of an IndicatorCache
+
+    Entries follow the SMA/RSI conditions of the main loop at the bar close,
+    exits use the percentage SL/TP levels checked against the bar high/low
+    (stop loss first when both are touched), and a new entry on a side is
+    only taken when it is at least grid_spacing percent away from the
+    existing entries on that side.
+    """
+    sim = Simulation(params, initial_balance, contract_size, spread)
+    p = sim.params
+    end = len(indicators) if end is None else end
+    equity = np.empty(max(end - start, 0))
+    sim.step(indicators.high, indicators.low, indicators.close, indicators.sma(p['short_window']),
+             indicators.sma(p['long_window']), indicators.rsi(p['rsi_period']), start, end, equity)
+    sim.finish()
+    return sim.result(equity)
+
+
+def run_streaming_backtest(chunks, params=None, initial_balance=10000.0, contract_size=100.0,
+                           spread=0.0, equity_path=None):
+    """run_backtest over an iterable of history chunks, with the same trades and equity
+
+    Each chunk is a DataFrame or structured array with high, low and close
+    columns (see history_chunks). Indicator and position state carry over
+    between chunks, so memory is bounded by the chunk size. The equity
+    curve is kept in memory, or appended to equity_path and returned as
+    a read-only memmap when given.
+    """
+    sim = Simulation(params, initial_balance, contract_size, spread)
+    p = sim.params
+    sma_short = StreamingSMA(p['short_window'])
+    sma_long = StreamingSMA(p['long_window'])
+    rsi_values = StreamingRSI(p['rsi_period'])
+    parts = []
+    equity_file = open(equity_path, 'wb') if equity_path else None
+    offset = 0
+    try:
+        for chunk in chunks:
+            close = np.asarray(chunk['close'], dtype=np.float64)
+            high = np.asarray(chunk['high'], dtype=np.float64)
+            low = np.asarray(chunk['low'], dtype=np.float64)
+            equity = np.empty(len(close))
+            sim.step(high, low, close, sma_short.update(close), sma_long.update(close), rsi_values.update(close),
+                     0, len(close), equity, offset)
+            offset += len(close)
+            if equity_file is not None:
+                equity.tofile(equity_file)
+            else:
+                parts.append(equity)
+    finally:
+        if equity_file is not None:
+            equity_file.close()
+    sim.finish()
+
+    if equity_path is None:
+        equity = np.concatenate(parts) if parts else np.empty(0)
+    elif offset:
+        equity = np.memmap(equity_path, dtype=np.float64, mode='r')
+    else:
+        equity = np.empty(0)
+    return sim.result(equity)
+
+
+def history_chunks(path, chunk_size=100000):
+    """Yield bars of a history file in chunks
+
+    .npy files (structured arrays with high, low and close fields, see
+    convert_history) are memory-mapped and sliced; CSV files are read
+    chunk_size rows at a time with the same column handling as load_history.
+    """
+    if path.endswith('.npy'):
+        bars = np.load(path, mmap_mode='r')
+        for start in range(0, len(bars), chunk_size):
+            yield bars[start:start + chunk_size]
+        return
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        chunk.columns = [col.strip().lower().strip('<>') for col in chunk.columns]
+        missing = {'high', 'low', 'close'} - set(chunk.columns)
+        if missing:
+            raise ValueError(f"History file {path} is missing columns: {', '.join(sorted(missing))}")
+        yield chunk
+
+
+def convert_history(csv_path, npy_path, chunk_size=100000):
+    """Convert a CSV history to a memory-mappable .npy of float64 high, low and close"""
+    dtype = np.dtype([('high', 'f8'), ('low', 'f8'), ('close', 'f8')])
+    count = sum(len(chunk) for chunk in history_chunks(csv_path, chunk_size))
+    bars = np.lib.format.open_memmap(npy_path, mode='w+', dtype=dtype, shape=(count,))
+    offset = 0
+    for chunk in history_chunks(csv_path, chunk_size):
+        for field in dtype.names:
+            bars[field][offset:offset + len(chunk)] = chunk[field].to_numpy(dtype=np.float64)
+        offset += len(chunk)
+    bars.flush()
+    logging.info(f"Converted {count} bars from {csv_path} to {npy_path}")
+    return count
+
+
+def load_history(path):
+    """Load OHLC history from a CSV exported from MT5 (time, open, high, low, close, ...)"""
+    df = pd.read_csv(path)
+    df.columns = [col.strip().lower().strip('<>') for col in df.columns]
+    if 'time' in df.columns:
+        if np.issubdtype(df['time'].dtype, np.number):
+            df['time'] = pd.to_datetime(df['time'], unit='s')
+        else:
+            df['time'] = pd.to_datetime(df['time'])
+    missing = {'high', 'low', 'close'} - set(df.columns)
+    if missing:
+        raise ValueError(f"History file {path} is missing columns: {', '.join(sorted(missing))}")
+    logging.info(f"Loaded {len(df)} bars from {path}")
+    return df.reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the trading_bot.main rules on history larger than memory")
+    parser.add_argument('history', help="CSV file or .npy written by --convert")
+    parser.add_argument('--params', help="JSON file with strategy parameters (e.g. best_params.json)")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="Bars per chunk")
+    parser.add_argument('--equity', help="Write the equity curve to this file instead of keeping it in memory")
+    parser.add_argument('--convert', metavar='NPY', help="Convert the CSV history to a memory-mappable .npy and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.convert:
+        convert_history(args.history, args.convert, args.chunk_size)
+        return
+    params = None
+    if args.params:
+        with open(args.params) as f:
+            params = json.load(f)
+    result = run_streaming_backtest(history_chunks(args.history, args.chunk_size), params, equity_path=args.equity)
+    logging.info(f"Backtest: {result.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from lazy import LazyModule
+
+mt5 = LazyModule('MetaTrader5')
+
+# Bar fields held as time x symbol matrices
+FIELDS = ('open', 'high', 'low', 'close', 'tick_volume')
+
+
+class Basket:
+    """Aligned time x symbol bar matrices for a basket of symbols
+
+    Bars of every symbol are aligned on the union of their bar times. A
+    symbol without a bar at some time (different sessions, a gap in the
+    feed) carries its last close forward, with open/high/low set to that
+    close and zero volume, so every indicator below runs over all symbols
+    in one column-wise call instead of one Python loop per symbol.
+    """
+
+    def __init__(self, symbols, timeframe=None, count=500):
+        self.symbols = list(symbols)
+        self.timeframe = timeframe if timeframe is not None else 15  # mt5.TIMEFRAME_M15
+        self.count = count
+        self.bars = {}
+
+    @classmethod
+    def from_frames(cls, frames, timeframe=None):
+        """Basket built from {symbol: DataFrame with time and OHLC columns}, e.g. loaded history"""
+        basket = cls(list(frames), timeframe)
+        basket.align(frames)
+        return basket
+
+    def load(self):
+        """Fetch the last count bars of every symbol; returns False if any symbol failed"""
+        frames = {}
+        for symbol in self.symbols:
+            rates = mt5.copy_rates_from_pos(symbol, self.timeframe, 0, self.count)
+            if rates is None or len(rates) == 0:
+                logging.error(f"Failed to get bars for {symbol}")
+                return False
+            frames[symbol] = pd.DataFrame(rates)
+        self.align(frames)
+        return True
+
+    def align(self, frames):
+        """Build the aligned matrices from per-symbol bar frames"""
+        stacked = pd.concat(
+            {symbol: df.set_index('time')[[f for f in FIELDS if f in df.columns]] for symbol, df in frames.items()},
+            axis=1,
+        ).sort_index()
+        close = stacked.xs('close', axis=1, level=1)[self.symbols].ffill()
+        self.bars = {'close': close}
+        for field in FIELDS:
+            if field == 'close' or field not in stacked.columns.get_level_values(1):
+                continue
+            matrix = stacked.xs(field, axis=1, level=1)[self.symbols]
+            self.bars[field] = matrix.fillna(0.0) if field == 'tick_volume' else matrix.fillna(close)
+
+    @property
+    def close(self):
+        return self.bars['close']
+
+    @property
+    def times(self):
+        return self.close.index
+
+
+# Indicators over a whole matrix at once, with the definitions of the ta
+# library calls in strategy.TradingStrategy (NaN until each window fills).
+
+def sma(matrix, window):
+    return matrix.rolling(window, min_periods=window).mean()
+
+
+def ema(matrix, span):
+    return matrix.ewm(span=span, min_periods=span, adjust=False).mean()
+
+
+def rsi(matrix, window=14):
+    """Wilder RSI per column"""
+    diff = matrix.diff()
+    up = diff.where(diff > 0, 0.0)
+    down = -diff.where(diff < 0, 0.0)
+    avg_up = up.ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    avg_down = down.ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    values = 100 - 100 / (1 + avg_up / avg_down)
+    return values.where(avg_down != 0, 100.0).where(avg_down.notna())
+
+
+def macd(matrix, fast=12, slow=26, signal=9):
+    """(MACD line, signal line) per column"""
+    line = ema(matrix, fast) - ema(matrix, slow)
+    return line, ema(line, signal)
+
+
+def atr(high, low, close, window=14):
+    """Average true range per column, simple rolling mean"""
+    prev_close = close.shift(1)
+    true_range = np.fmax(high - low, np.fmax((high - prev_close).abs(), (low - prev_close).abs()))
+    return sma(true_range, window)
+
+
+def basket_indicators(basket, short_window=20, long_window=50, rsi_window=14):
+    """TradingStrategy.calculate_indicators for every symbol: {name: time x symbol DataFrame}"""
+    close = basket.close
+    line, signal = macd(close)
+    return {
+        'SMA_short': sma(close, short_window),
+        'SMA_long': sma(close, long_window),
+        'RSI': rsi(close, rsi_window),
+        'MACD': line,
+        'MACD_signal': signal,
+    }
+
+
+def basket_signals(indicators):
+    """TradingStrategy.generate_signals for every symbol: time x symbol positions (+1 buy, -1 sell, 0)"""
+    trend = (indicators['SMA_short'] > indicators['SMA_long']).astype(float)
+    position = trend.diff()
+    blocked = (indicators['RSI'] > 70) | (indicators['RSI'] < 30) | (indicators['MACD'] < indicators['MACD_signal'])
+    return position.mask(blocked, 0.0)
+
+
+def latest_signals(indicators):
+    """{symbol: 'BUY' | 'SELL' | 'HOLD'} for the last bar, like TradingStrategy.get_latest_signal"""
+    last = basket_signals(indicators).iloc[-1]
+    return {symbol: 'BUY' if value > 0 else 'SELL' if value < 0 else 'HOLD' for symbol, value in last.items()}
+
+
+# Cross-sectional features
+
+def relative_strength(close, window=20):
+    """Return over window bars minus the basket's mean return over the same bars"""
+    returns = close / close.shift(window) - 1
+    return returns.sub(returns.mean(axis=1), axis=0)
+
+
+def strength_rank(close, window=20):
+    """Cross-sectional percentile rank (0..1] of each symbol's return over window bars"""
+    return (close / close.shift(window) - 1).rank(axis=1, pct=True)
+
+
+def rolling_correlation(close, reference, window=50):
+    """Rolling correlation of every symbol's bar returns with the reference symbol's"""
+    returns = close.pct_change()
+    return returns.rolling(window, min_periods=window).corr(returns[reference])
+
+
+def spread_zscores(close, pairs, window=100):
+    """Rolling z-score of the hedged log spread of each (a, b) pair, one column per 'a/b'
+
+    The hedge ratio is the rolling OLS beta of log(a) on log(b) over the
+    same window; all pairs are computed together on T x P matrices.
+    """
+    logs = np.log(close)
+    a = logs[[p[0] for p in pairs]].to_numpy()
+    b = logs[[p[1] for p in pairs]].to_numpy()
+    names = [f"{p[0]}/{p[1]}" for p in pairs]
+    a = pd.DataFrame(a, index=close.index, columns=names)
+    b = pd.DataFrame(b, index=close.index, columns=names)
+
+    mean_a = a.rolling(window, min_periods=window).mean()
+    mean_b = b.rolling(window, min_periods=window).mean()
+    cov = (a * b).rolling(window, min_periods=window).mean() - mean_a * mean_b
+    var = (b * b).rolling(window, min_periods=window).mean() - mean_b * mean_b
+    beta = cov / var.where(var > 0)
+    spread = a - beta * b
+    # Statistics of the spread over the window, using the current hedge ratio throughout
+    spread_mean = mean_a - beta * mean_b
+    spread_var = ((a * a).rolling(window, min_periods=window).mean() - mean_a * mean_a) - beta * beta * var
+    spread_std = np.sqrt(spread_var.where(spread_var > 0))
+    return (spread - spread_mean) / spread_std
@@ -0,0 +1,904 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from lazy import LazyModule
+from telegram_notifier import TelegramNotifier
+from timeframes import RATE_DTYPE, timeframe_minutes
+
+# Tick layout returned by mt5.copy_ticks_from
+TICK_DTYPE = np.dtype([
+    ('time', 'i8'), ('bid', 'f8'), ('ask', 'f8'), ('last', 'f8'), ('volume', 'u8'),
+    ('time_msc', 'i8'), ('flags', 'u4'), ('volume_real', 'f8'),
+])
+
+Tick = namedtuple('Tick', 'time bid ask last volume time_msc flags volume_real')
+SymbolInfo = namedtuple('SymbolInfo', 'name visible digits point spread trade_contract_size trade_mode '
+                                      'volume_min volume_max volume_step trade_stops_level bid ask')
+AccountInfo = namedtuple('AccountInfo', 'login balance equity profit margin margin_free margin_level '
+                                        'leverage currency')
+TerminalInfo = namedtuple('TerminalInfo', 'connected trade_allowed')
+Position = namedtuple('Position', 'ticket time time_msc type magic identifier volume price_open sl tp '
+                                  'price_current swap profit symbol comment')
+Order = namedtuple('Order', 'ticket time_setup type magic volume_initial volume_current price_open sl tp '
+                            'symbol comment')
+OrderResult = namedtuple('OrderResult', 'retcode deal order volume price bid ask comment request_id')
+Deal = namedtuple('Deal', 'ticket order time time_msc type entry magic reason position_id volume price '
+                          'commission swap profit fee symbol comment external_id')
+
+
+class SimulatedBroker:
+    """In-process MetaTrader5 stand-in with a random-walk market in accelerated time
+
+    The market clock runs speed times faster than the wall clock, and
+    ticks, M1 bars, stop loss/take profit hits and pending order triggers
+    are generated up to the current market time on every call, so no
+    thread is needed. Only the calls and constants the bot uses exist;
+    the constants have the terminal's values.
+    """
+
+    ORDER_TYPE_BUY = 0
+    ORDER_TYPE_SELL = 1
+    ORDER_TYPE_BUY_LIMIT = 2
+    ORDER_TYPE_SELL_LIMIT = 3
+    ORDER_TYPE_BUY_STOP = 4
+    ORDER_TYPE_SELL_STOP = 5
+    ORDER_TYPE_BUY_STOP_LIMIT = 6
+    ORDER_TYPE_SELL_STOP_LIMIT = 7
+    TRADE_ACTION_DEAL = 1
+    TRADE_ACTION_PENDING = 5
+    TRADE_ACTION_SLTP = 6
+    TRADE_ACTION_MODIFY = 7
+    TRADE_ACTION_REMOVE = 8
+    TRADE_RETCODE_REQUOTE = 10004
+    TRADE_RETCODE_DONE = 10009
+    TRADE_RETCODE_DONE_PARTIAL = 10010
+    TRADE_RETCODE_TIMEOUT = 10012
+    TRADE_RETCODE_INVALID_VOLUME = 10014
+    TRADE_RETCODE_INVALID_STOPS = 10016
+    TRADE_RETCODE_PRICE_OFF = 10021
+    TRADE_RETCODE_POSITION_CLOSED = 10036
+    ORDER_FILLING_FOK = 0
+    ORDER_FILLING_IOC = 1
+    ORDER_FILLING_RETURN = 2
+    ORDER_TIME_GTC = 0
+    COPY_TICKS_ALL = -1
+    TIMEFRAME_M1 = 1
+    TIMEFRAME_M15 = 15
+    SYMBOL_TRADE_MODE_DISABLED = 0
+    SYMBOL_TRADE_MODE_FULL = 4
+
+    def __init__(self, symbol='XAUUSDm', price=2000.0, spread=0.2, digits=2, contract_size=100.0,
+                 volatility=0.00003, tick_ms=250, speed=60.0, history_minutes=6000, balance=10000.0,
+                 leverage=100, tick_capacity=200000, stops_level=0, seed=None):
+        self.symbol = symbol
+        self.spread = spread
+        self.digits = digits
+        self.point = 10.0 ** -digits
+        self.stops_level = stops_level  # Minimum stop distance from the price in points
+        self.contract_size = contract_size
+        self.volatility = volatility  # Standard deviation of the log return per tick
+        self.tick_ms = tick_ms
+        self.speed = speed
+        self.balance = balance
+        self.leverage = leverage
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.RLock()
+
+        self.origin = time.monotonic()
+        self.origin_msc = int(time.time() * 1000) // 60000 * 60000
+        self.mid = price
+        self.ticks = np.zeros(tick_capacity, dtype=TICK_DTYPE)
+        self.tick_count = 0  # Ticks held in self.ticks
+        self.total_ticks = 0
+        self.last_msc = self.origin_msc
+        self.minutes = []  # Closed and forming M1 bars as RATE_DTYPE tuples
+        self._seed_history(history_minutes)
+
+        self.positions = {}
+        self.orders = {}
+        self.deals = []
+        self.next_ticket = 1000
+        self.opened = []  # (wall clock, side, volume, ticket) of every position opened
+        self.max_open = 0
+        self.error = (1, 'Success')
+
+    # Market
+
+    def now_msc(self):
+        return self.origin_msc + int((time.monotonic() - self.origin) * self.speed * 1000)
+
+    def _seed_history(self, minutes):
+        per_minute = self.volatility * np.sqrt(60000 / self.tick_ms)
+        closes = self.mid * np.exp(np.cumsum(self.rng.normal(0, per_minute, minutes)))
+        closes *= self.mid / closes[-1]
+        opens = np.concatenate(([closes[0]], closes[:-1]))
+        wiggle = self.mid * per_minute * np.abs(self.rng.normal(0, 0.5, (2, minutes)))
+        start = self.origin_msc // 1000 - minutes * 60
+        for i in range(minutes):
+            self.minutes.append((start + i * 60, opens[i], max(opens[i], closes[i]) + wiggle[0, i],
+                                 min(opens[i], closes[i]) - wiggle[1, i], closes[i], 240, 20, 0))
+
+    def _advance(self):
+        """Generate ticks up to the market clock, then apply stops, targets and pending orders"""
+        now = self.now_msc()
+        count = (now - self.last_msc) // self.tick_ms
+        if count <= 0:
+            return
+        times = self.last_msc + self.tick_ms * np.arange(1, count + 1, dtype=np.int64)
+        self.last_msc = int(times[-1])
+        mids = self.mid * np.exp(np.cumsum(self.rng.normal(0, self.volatility, count)))
+        self.mid = float(mids[-1])
+        bids = np.round(mids - self.spread / 2, self.digits)
+        asks = np.round(bids + self.spread, self.digits)
+
+        self._store_ticks(times, bids, asks)
+        self._update_minutes(times, bids)
+        self._trigger_orders(bids, asks)
+        self._hit_stops(bids)
+        self.max_open = max(self.max_open, len(self.positions))
+
+    def _store_ticks(self, times, bids, asks):
+        count = len(times)
+        capacity = len(self.ticks)
+        if count >= capacity:
+            times, bids, asks = times[-capacity:], bids[-capacity:], asks[-capacity:]
+            count = capacity
+        if self.tick_count + count > capacity:
+            keep = capacity // 2
+            self.ticks[:keep] = self.ticks[self.tick_count - keep:self.tick_count]
+            self.tick_count = keep
+        block = self.ticks[self.tick_count:self.tick_count + count]
+        block['time_msc'] = times
+        block['time'] = times // 1000
+        block['bid'] = bids
+        block['ask'] = asks
+        block['flags'] = 6  # TICK_FLAG_BID | TICK_FLAG_ASK
+        self.tick_count += count
+        self.total_ticks += count
+
+    def _update_minutes(self, times, bids):
+        buckets = times // 60000 * 60
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        ends = np.concatenate((starts[1:], [len(buckets)]))
+        for start, end in zip(starts, ends):
+            bucket = int(buckets[start])
+            segment = bids[start:end]
+            last = self.minutes[-1]
+            if last[0] == bucket:
+                self.minutes[-1] = (bucket, last[1], max(last[2], segment.max()), min(last[3], segment.min()),
+                                    segment[-1], last[5] + end - start, last[6], 0)
+            else:
+                self.minutes.append((bucket, segment[0], segment.max(), segment.min(), segment[-1],
+                                     end - start, int(round(self.spread / self.point)), 0))
+
+    def _trigger_orders(self, bids, asks):
+        for ticket, order in list(self.orders.items()):
+            kind, price = order['type'], order['price']
+            if kind in (self.ORDER_TYPE_BUY_LIMIT,):
+                hit = asks.min() <= price
+            elif kind in (self.ORDER_TYPE_BUY_STOP, self.ORDER_TYPE_BUY_STOP_LIMIT):
+                hit = asks.max() >= price
+            elif kind == self.ORDER_TYPE_SELL_LIMIT:
+                hit = bids.max() >= price
+            else:
+                hit = bids.min() <= price
+            if hit:
+                del self.orders[ticket]
+                side = 1 if kind in (self.ORDER_TYPE_BUY_LIMIT, self.ORDER_TYPE_BUY_STOP,
+                                     self.ORDER_TYPE_BUY_STOP_LIMIT) else -1
+                self._open(side, order['volume'], price, order['sl'], order['tp'], order['magic'],
+                           order['comment'], ticket)
+
+    def _hit_stops(self, bids):
+        low, high = bids.min(), bids.max()
+        for ticket, pos in list(self.positions.items()):
+            buy = pos['side'] > 0
+            price = bids[-1] if buy else bids[-1] + self.spread
+            lo, hi = (low, high) if buy else (low + self.spread, high + self.spread)
+            if pos['sl'] and (lo <= pos['sl'] if buy else hi >= pos['sl']):
+                self._close(ticket, pos['volume'], pos['sl'], reason=4)  # DEAL_REASON_SL
+            elif pos['tp'] and (hi >= pos['tp'] if buy else lo <= pos['tp']):
+                self._close(ticket, pos['volume'], pos['tp'], reason=5)  # DEAL_REASON_TP
+            else:
+                pos['price_current'] = price
+
+    def quote(self):
+        tick = self.ticks[self.tick_count - 1] if self.tick_count else None
+        if tick is None:
+            bid = round(self.mid - self.spread / 2, self.digits)
+            return self.last_msc, bid, round(bid + self.spread, self.digits)
+        return int(tick['time_msc']), float(tick['bid']), float(tick['ask'])
+
+    # Trading
+
+    def _ticket(self):
+        self.next_ticket += 1
+        return self.next_ticket
+
+    def _profit(self, pos, price):
+        return round((price - pos['price_open']) * pos['side'] * pos['volume'] * self.contract_size, 2)
+
+    def _deal(self, order, pos, entry, volume, price, profit, reason, comment):
+        time_msc, _, _ = self.quote()
+        side = pos['side'] if entry == 0 else -pos['side']
+        deal = Deal(self._ticket(), order, time_msc // 1000, time_msc, 0 if side > 0 else 1, entry,
+                    pos['magic'], reason, pos['ticket'], volume, price, 0.0, 0.0, profit, 0.0,
+                    self.symbol, comment, '')
+        self.deals.append(deal)
+        return deal
+
+    def _open(self, side, volume, price, sl, tp, magic, comment, order=None):
+        time_msc, _, _ = self.quote()
+        ticket = order or self._ticket()
+        pos = {
+            'ticket': ticket, 'side': side, 'volume': volume, 'price_open': price, 'price_current': price,
+            'sl': sl or 0.0, 'tp': tp or 0.0, 'magic': magic, 'comment': comment, 'time_msc': time_msc,
+        }
+        self.positions[ticket] = pos
+        self.opened.append((time.monotonic(), side, volume, ticket))
+        self.max_open = max(self.max_open, len(self.positions))
+        return self._deal(ticket, pos, 0, volume, price, 0.0, 3, comment)  # DEAL_REASON_EXPERT
+
+    def _close(self, ticket, volume, price, reason=3, comment=''):
+        pos = self.positions[ticket]
+        volume = min(volume, pos['volume'])
+        profit = self._profit(dict(pos, volume=volume), price)
+        self.balance += profit
+        pos['volume'] = round(pos['volume'] - volume, 8)
+        if pos['volume'] <= 0:
+            del self.positions[ticket]
+        return self._deal(self._ticket(), pos, 1, volume, price, profit, reason, comment)
+
+    def _result(self, retcode, deal=0, order=0, volume=0.0, price=0.0, comment='', request_id=0):
+        _, bid, ask = self.quote()
+        return OrderResult(retcode, deal, order, volume, price, bid, ask, comment, request_id)
+
+    def reject(self, request, retcode, comment):
+        """Result of a request the server turned down, without executing it"""
+        with self.lock:
+            self._advance()
+            return self._result(retcode, comment=comment)
+
+    def order_send(self, request, partial=False):
+        """Execute a request dict; partial fills half the volume of a deal (rounded to the volume step)"""
+        with self.lock:
+            self._advance()
+            action = request.get('action')
+            if action == self.TRADE_ACTION_DEAL:
+                return self._send_deal(request, partial)
+            if action == self.TRADE_ACTION_PENDING:
+                ticket = self._ticket()
+                self.orders[ticket] = {
+                    'ticket': ticket, 'type': request['type'], 'volume': request['volume'],
+                    'price': request['price'], 'sl': request.get('sl', 0.0), 'tp': request.get('tp', 0.0),
+                    'magic': request.get('magic', 0), 'comment': request.get('comment', ''),
+                    'time': self.quote()[0] // 1000,
+                }
+                return self._result(self.TRADE_RETCODE_DONE, order=ticket, volume=request['volume'],
+                                    price=request['price'], comment='Request executed')
+            if action == self.TRADE_ACTION_REMOVE:
+                if self.orders.pop(request.get('order'), None) is None:
+                    return self._result(10013, comment='Invalid request')  # TRADE_RETCODE_INVALID
+                return self._result(self.TRADE_RETCODE_DONE, order=request['order'], comment='Request executed')
+            if action == self.TRADE_ACTION_SLTP:
+                pos = self.positions.get(request.get('position'))
+                if pos is None:
+                    return self._result(self.TRADE_RETCODE_POSITION_CLOSED, comment='Position closed')
+                _, bid, ask = self.quote()
+                sl = request.get('sl', 0.0)
+                close_price = bid if pos['side'] > 0 else ask
+                if sl and (close_price - sl) * pos['side'] < self.stops_level * self.point:
+                    return self._result(self.TRADE_RETCODE_INVALID_STOPS, comment='Invalid stops')
+                pos['sl'] = request.get('sl', pos['sl'])
+                pos['tp'] = request.get('tp', pos['tp'])
+                return self._result(self.TRADE_RETCODE_DONE, comment='Request executed')
+            return self._result(10013, comment='Invalid request')
+
+    def _send_deal(self, request, partial):
+        volume = request.get('volume', 0.0)
+        if volume < 0.01:
+            return self._result(self.TRADE_RETCODE_INVALID_VOLUME, comment='Invalid volume')
+        filled = max(round(volume / 2, 2), 0.01) if partial and volume > 0.01 else volume
+        retcode = self.TRADE_RETCODE_DONE_PARTIAL if filled < volume else self.TRADE_RETCODE_DONE
+        _, bid, ask = self.quote()
+        buy = request.get('type') == self.ORDER_TYPE_BUY
+        price = ask if buy else bid
+        ticket = request.get('position')
+        if ticket:
+            pos = self.positions.get(ticket)
+            if pos is None:
+                return self._result(self.TRADE_RETCODE_POSITION_CLOSED, comment='Position closed')
+            deal = self._close(ticket, filled, price, comment=request.get('comment', ''))
+        else:
+            deal = self._open(1 if buy else -1, filled, price, request.get('sl'), request.get('tp'),
+                              request.get('magic', 0), request.get('comment', ''))
+        return self._result(retcode, deal.ticket, deal.order, filled, price, 'Request executed')
+
+    # MetaTrader5 calls
+
+    def initialize(self, *args, **kwargs):
+        return True
+
+    def shutdown(self):
+        return None
+
+    def last_error(self):
+        return self.error
+
+    def terminal_info(self):
+        return TerminalInfo(True, True)
+
+    def symbol_select(self, symbol, enable=True):
+        return symbol == self.symbol
+
+    def symbol_info(self, symbol):
+        if symbol != self.symbol:
+            return None
+        with self.lock:
+            self._advance()
+            _, bid, ask = self.quote()
+        return SymbolInfo(symbol, True, self.digits, self.point, int(round(self.spread / self.point)),
+                          self.contract_size, self.SYMBOL_TRADE_MODE_FULL, 0.01, 100.0, 0.01, self.stops_level,
+                          bid, ask)
+
+    def symbol_info_tick(self, symbol):
+        if symbol != self.symbol:
+            return None
+        with self.lock:
+            self._advance()
+            time_msc, bid, ask = self.quote()
+        return Tick(time_msc // 1000, bid, ask, 0.0, 0, time_msc, 6, 0.0)
+
+    def copy_ticks_from(self, symbol, date_from, count, flags):
+        if symbol != self.symbol:
+            return None
+        if isinstance(date_from, datetime):
+            date_from = date_from.timestamp()
+        with self.lock:
+            self._advance()
+            ticks = self.ticks[:self.tick_count]
+            start = np.searchsorted(ticks['time_msc'], int(date_from) * 1000)
+            return ticks[start:start + count].copy()
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        if symbol != self.symbol:
+            return None
+        minutes = timeframe_minutes(timeframe)
+        with self.lock:
+            self._advance()
+            first = self.minutes[-1][0] // (minutes * 60) * (minutes * 60)
+            needed = (count + start_pos) * minutes + (self.minutes[-1][0] - first) // 60 + 1
+            rows = np.array(self.minutes[-needed:], dtype=RATE_DTYPE)
+        buckets = rows['time'] // (minutes * 60) * (minutes * 60)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        rates = np.zeros(len(starts), dtype=RATE_DTYPE)
+        rates['time'] = buckets[starts]
+        rates['open'] = rows['open'][starts]
+        rates['high'] = np.maximum.reduceat(rows['high'], starts)
+        rates['low'] = np.minimum.reduceat(rows['low'], starts)
+        rates['close'] = rows['close'][np.concatenate((starts[1:], [len(rows)])) - 1]
+        rates['tick_volume'] = np.add.reduceat(rows['tick_volume'], starts)
+        rates['spread'] = rows['spread'][starts]
+        end = len(rates) - start_pos
+        return rates[max(end - count, 0):end]
+
+    def positions_get(self, symbol=None, ticket=None, group=None):
+        with self.lock:
+            self._advance()
+            return tuple(
+                Position(p['ticket'], p['time_msc'] // 1000, p['time_msc'], 0 if p['side'] > 0 else 1,
+                         p['magic'], p['ticket'], p['volume'], p['price_open'], p['sl'], p['tp'],
+                         p['price_current'], 0.0, self._profit(p, p['price_current']), self.symbol,
+                         p['comment'])
+                for p in self.positions.values()
+                if (symbol is None or symbol == self.symbol) and (ticket is None or ticket == p['ticket'])
+            )
+
+    def orders_get(self, symbol=None, ticket=None, group=None):
+        with self.lock:
+            self._advance()
+            return tuple(
+                Order(o['ticket'], o['time'], o['type'], o['magic'], o['volume'], o['volume'], o['price'],
+                      o['sl'], o['tp'], self.symbol, o['comment'])
+                for o in self.orders.values()
+                if (symbol is None or symbol == self.symbol) and (ticket is None or ticket == o['ticket'])
+            )
+
+    def history_deals_get(self, date_from, date_to, group=None, position=None):
+        start = date_from.timestamp() if isinstance(date_from, datetime) else date_from
+        end = date_to.timestamp() if isinstance(date_to, datetime) else date_to
+        with self.lock:
+            self._advance()
+            return tuple(d for d in self.deals if start <= d.time <= end
+                         and (position is None or d.position_id == position))
+
+    def account_info(self):
+        with self.lock:
+            self._advance()
+            profit = sum(self._profit(p, p['price_current']) for p in self.positions.values())
+            margin = sum(p['volume'] * self.contract_size * p['price_open'] / self.leverage
+                         for p in self.positions.values())
+        equity = self.balance + profit
+        return AccountInfo(1, round(self.balance, 2), round(equity, 2), round(profit, 2), round(margin, 2),
+                           round(equity - margin, 2), round(equity / margin * 100, 2) if margin else 0.0,
+                           self.leverage, 'USD')
+
+
+class FaultPlan:
+    """Faults injected into broker and notifier calls
+
+    Rates are probabilities per call. latency is the upper bound of a
+    uniform delay added to every broker call; a timeout waits timeout
+    seconds and returns None, and for order_send the order still
+    executes, as a terminal that lost the reply would. Requotes and
+    partial fills only apply to deals. An outage (outage_rate per
+    terminal probe) fails every call for outage seconds.
+    """
+
+    def __init__(self, latency=0.02, timeout=0.5, timeout_rate=0.01, none_rate=0.02, requote_rate=0.1,
+                 partial_rate=0.1, outage_rate=0.0, outage=3.0, notify_latency=1.0, notify_failure_rate=0.2,
+                 seed=None):
+        self.latency = latency
+        self.timeout = timeout
+        self.timeout_rate = timeout_rate
+        self.none_rate = none_rate
+        self.requote_rate = requote_rate
+        self.partial_rate = partial_rate
+        self.outage_rate = outage_rate
+        self.outage = outage
+        self.notify_latency = notify_latency
+        self.notify_failure_rate = notify_failure_rate
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class ChaosBroker:
+    """Wraps a SimulatedBroker with the faults of a FaultPlan
+
+    Every call is timed, so the harness can measure loop latency from the
+    gaps between the trading loop's tick polls.
+    """
+
+    CALLS = ('order_send', 'positions_get', 'orders_get', 'symbol_info', 'symbol_info_tick', 'copy_ticks_from',
+             'copy_rates_from_pos', 'account_info', 'history_deals_get')
+
+    def __init__(self, broker, plan):
+        self.broker = broker
+        self.plan = plan
+        self.rng = random.Random(plan.seed)
+        self.lock = threading.Lock()
+        self.faults = Counter()
+        self.calls = defaultdict(list)  # Call name -> wall clock of every call
+        self.sends = []  # (wall clock, side, executed, gate key) of every opening deal request
+        self.key = None  # Execution gate key of the order being sent, set by track_gate()
+        self.outage_until = 0.0
+        self.outages = []
+
+    def __getattr__(self, name):
+        attr = getattr(self.broker, name)
+        if name in self.CALLS:
+            return lambda *args, **kwargs: self._call(name, attr, *args, **kwargs)
+        return attr
+
+    def _draw(self):
+        with self.lock:
+            return self.rng.random(), self.rng.uniform(0, self.plan.latency)
+
+    def _fault(self, kind):
+        with self.lock:
+            self.faults[kind] += 1
+        self.broker.error = {
+            'timeout': (-10005, 'IPC timeout'), 'none': (-10004, 'No IPC connection'),
+            'outage': (-10004, 'No IPC connection'),
+        }.get(kind, (1, 'Success'))
+
+    def in_outage(self):
+        return time.monotonic() < self.outage_until
+
+    def initialize(self, *args, **kwargs):
+        if self.in_outage():
+            self._fault('outage')
+            return False
+        return self.broker.initialize(*args, **kwargs)
+
+    def terminal_info(self):
+        now = time.monotonic()
+        if not self.in_outage():
+            with self.lock:
+                started = self.rng.random() < self.plan.outage_rate
+                if started:
+                    self.outage_until = now + self.plan.outage
+                    self.outages.append((now, self.outage_until))
+        if self.in_outage():
+            self._fault('outage')
+            return TerminalInfo(False, False)
+        return self.broker.terminal_info()
+
+    def _call(self, name, func, *args, **kwargs):
+        started = time.monotonic()
+        self.calls[name].append(started)
+        if self.in_outage():
+            self._fault('outage')
+            return None
+        draw, delay = self._draw()
+        time.sleep(delay)
+
+        plan = self.plan
+        opening = False
+        if name == 'order_send':
+            request = args[0]
+            opening = request.get('action') == self.broker.TRADE_ACTION_DEAL and not request.get('position')
+            side = 1 if request.get('type') == self.broker.ORDER_TYPE_BUY else -1
+
+        if draw < plan.timeout_rate:
+            self._fault('timeout')
+            time.sleep(plan.timeout)
+            if name == 'order_send':
+                # The reply is lost but the server executed the request
+                result = func(*args, **kwargs)
+                if opening:
+                    self.sends.append((started, side, result.retcode in FILLED_RETCODES, self.key))
+            return None
+        draw -= plan.timeout_rate
+        if draw < plan.none_rate:
+            self._fault('none')
+            return None
+        draw -= plan.none_rate
+
+        if name != 'order_send' or args[0].get('action') != self.broker.TRADE_ACTION_DEAL:
+            return func(*args, **kwargs)
+        if draw < plan.requote_rate:
+            self._fault('requote')
+            result = self.broker.reject(args[0], self.broker.TRADE_RETCODE_REQUOTE, 'Requote')
+        elif draw - plan.requote_rate < plan.partial_rate:
+            self._fault('partial')
+            result = func(*args, partial=True)
+        else:
+            result = func(*args, **kwargs)
+        if opening:
+            self.sends.append((started, side, result.retcode in FILLED_RETCODES, self.key))
+        return result
+
+    def track_gate(self, gate):
+        """Tag the sends that follow each admitted order with that order's gate key"""
+        admit = gate.admit
+
+        def tracked(symbol, side, key=None):
+            admitted = admit(symbol, side, key)
+            if admitted:
+                self.key = key
+            return admitted
+        gate.admit = tracked
+
+
+FILLED_RETCODES = (SimulatedBroker.TRADE_RETCODE_DONE, SimulatedBroker.TRADE_RETCODE_DONE_PARTIAL)
+
+
+class LagProbe:
+    """Heartbeat coroutine measuring how late its event loop wakes up, i.e. how long anything blocked it"""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.max_lag = 0.0
+        self.beating = False
+
+    async def run(self):
+        self.beating = True
+        loop = asyncio.get_running_loop()
+        while self.beating:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, loop.time() - expected)
+
+    def stop(self):
+        self.beating = False
+
+
+class ChaosNotifier(TelegramNotifier):
+    """TelegramNotifier that never touches the network
+
+    Messages take up to plan.notify_latency seconds and fail at
+    plan.notify_failure_rate, half of the failures as exceptions. A
+    LagProbe on the notifier's event loop measures how long anything
+    blocked that loop.
+    """
+
+    def __init__(self, plan):
+        super().__init__()
+        self.plan = plan
+        self.rng = random.Random(plan.seed)
+        self.stats = Counter()
+        self.probe = LagProbe()
+
+    def initialize(self):
+        return True
+
+    async def send_message(self, message):
+        self.stats['messages'] += 1
+        await asyncio.sleep(self.rng.uniform(0, self.plan.notify_latency))
+        draw = self.rng.random()
+        if draw < self.plan.notify_failure_rate / 2:
+            self.stats['errors'] += 1
+            raise ConnectionError("Injected notifier failure")
+        if draw < self.plan.notify_failure_rate:
+            self.stats['failed'] += 1
+            logging.error("Failed to send Telegram message: injected failure")
+            return False
+        self.stats['sent'] += 1
+        return True
+
+    def start_heartbeat(self):
+        self.probe.beating = True
+        self.post(self.probe.run())
+
+    def stop_heartbeat(self):
+        self.probe.stop()
+
+
+def install(broker):
+    """Route every LazyModule('MetaTrader5'), loaded or not yet, to broker; returns an undo function"""
+    previous = sys.modules.get('MetaTrader5')
+    sys.modules['MetaTrader5'] = broker
+    patched = []
+    for module in list(sys.modules.values()):
+        lazy = getattr(module, 'mt5', None)
+        if isinstance(lazy, LazyModule) and lazy._name == 'MetaTrader5':
+            patched.append((lazy, lazy._module))
+            lazy._module = broker
+
+    def restore():
+        for lazy, module in patched:
+            lazy._module = module
+        if previous is None:
+            sys.modules.pop('MetaTrader5', None)
+        else:
+            sys.modules['MetaTrader5'] = previous
+    return restore
+
+
+def loop_gaps(times, excluded=()):
+    """Gaps between consecutive calls, leaving out the ones overlapping an excluded (start, end) interval"""
+    times = np.asarray(times)
+    if len(times) < 2:
+        return np.zeros(0)
+    starts, ends = times[:-1], times[1:]
+    keep = np.ones(len(starts), dtype=bool)
+    for start, end in excluded:
+        keep &= (ends < start) | (starts > end)
+    return (ends - starts)[keep]
+
+
+def duplicate_sends(sends):
+    """Executed opening orders beyond the first for the same execution gate key (one signal)"""
+    executed = Counter(key for _, _, filled, key in sends if filled and key is not None)
+    return sum(count - 1 for count in executed.values())
+
+
+def check_invariants(report, max_positions, max_loop_gap, max_loop_lag):
+    """Messages for every invariant the run broke"""
+    violations = []
+    if report['duplicate_orders']:
+        violations.append(f"{report['duplicate_orders']} signal(s) executed more than once")
+    if report['max_open_positions'] > max_positions:
+        violations.append(f"{report['max_open_positions']} positions open, limit {max_positions}")
+    if report['max_loop_gap'] > max_loop_gap:
+        violations.append(f"Trading loop stalled {report['max_loop_gap']:.3f}s, bound {max_loop_gap}s")
+    if report['max_event_loop_lag'] > max_loop_lag:
+        violations.append(f"Notifier event loop blocked {report['max_event_loop_lag']:.3f}s, bound {max_loop_lag}s")
+    if report.get('max_main_loop_lag', 0.0) > max_loop_lag:
+        violations.append(f"main() event loop blocked {report['max_main_loop_lag']:.3f}s, bound {max_loop_lag}s")
+    if report['loop_polls'] == 0:
+        violations.append("Trading loop never polled the terminal")
+    if report['loop_errors']:
+        violations.append(f"{report['loop_errors']} trading loop iteration(s) failed with an error")
+    if report['orders_sent'] == 0:
+        violations.append("No orders were attempted, so order handling went untested")
+    return violations
+
+
+class LoopErrors(logging.Handler):
+    """Collects the errors trading_bot.main() logs when an iteration fails"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        message = record.getMessage()
+        if message.startswith(('Error in trading loop', 'An error occurred')):
+            self.messages.append(message)
+
+
+def drive_engine(bot, scheduler, duration, plan, strategy_exits, engine_params):
+    """Run TradingEngine's loop thread for duration seconds; returns (engine, loop errors)"""
+    from engine import TradingEngine
+
+    engine = TradingEngine(bot, checkpoint_path=None, scheduler=scheduler, **engine_params)
+    engine.manager.use_strategy_exits = strategy_exits
+    errors = []
+    engine.subscribe_log(lambda message: errors.append(message) if message.startswith('Error') else None)
+    engine.start()
+    time.sleep(duration)
+    engine.stop()
+    engine.thread.join(timeout=max(5.0, plan.timeout * 4))
+    bot.shutdown()
+    return engine, errors
+
+
+def drive_main(bot, scheduler, pacing, duration):
+    """Run trading_bot.main() on its own event loop for duration seconds, with a LagProbe on that loop
+
+    Returns (max lag of main's event loop, loop errors).
+    """
+    from trading_bot import main
+
+    probe = LagProbe()
+    errors = LoopErrors()
+
+    async def session():
+        task = asyncio.ensure_future(main(bot, scheduler, pacing))
+        heartbeat = asyncio.ensure_future(probe.run())
+        await asyncio.wait([task], timeout=duration)
+        # Cancelling main() runs its finally block, which shuts the bot down
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        probe.stop()
+        await heartbeat
+
+    logging.getLogger().addHandler(errors)
+    try:
+        asyncio.run(session())
+    finally:
+        logging.getLogger().removeHandler(errors)
+    return probe.max_lag, errors.messages
+
+
+def run(duration=30.0, speed=60.0, plan=None, symbol='XAUUSDm', max_loop_gap=2.0, max_loop_lag=0.1,
+        strategy_exits=False, workdir=None, target='engine', **engine_params):
+    """Run the bot's trading loop against a faulty simulated terminal and notifier; returns a report
+
+    target 'engine' drives TradingEngine's loop thread; 'main' runs
+    trading_bot.main() and also measures how long its asyncio loop is
+    blocked, with its pacing intervals scaled down by speed. The bot
+    writes its logs and stores into workdir (a temporary directory,
+    removed afterwards, when not given).
+    """
+    if target not in ('engine', 'main'):
+        raise ValueError(f"Unknown target: {target}")
+    plan = plan or FaultPlan()
+    broker = SimulatedBroker(symbol, speed=speed, seed=plan.seed)
+    chaos = ChaosBroker(broker, plan)
+    restore = install(chaos)
+    cwd = os.getcwd()
+    temporary = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='chaos-')
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    try:
+        # Imported here so the bot's log file and stores end up in workdir
+        from pacing import LoopRateController
+        from sessions import SessionCalendar, SessionScheduler
+        from trading_bot import ForexTradingBot
+
+        bot = ForexTradingBot(symbol)
+        notifier = ChaosNotifier(plan)
+        bot.telegram = notifier
+        chaos.track_gate(bot.gate)
+        disconnected = []
+        bot.supervisor.add_listener(lambda state, previous: disconnected.append(time.monotonic()))
+
+        always_open = SessionCalendar({'default': [('Mon 00:00', 'Mon 00:00')]})
+        scheduler = SessionScheduler(symbol, always_open, check_trade_mode=False)
+
+        notifier.start_heartbeat()
+        started = time.monotonic()
+        extra = {}
+        if target == 'main':
+            # main()'s one-minute pacing in market time
+            pacing = LoopRateController(base_interval=60 / speed, min_interval=10 / speed, max_interval=180 / speed,
+                                        cpu_budget=0.1, call_budget=2.0 * speed)
+            main_lag, errors = drive_main(bot, scheduler, pacing, duration)
+            extra['max_main_loop_lag'] = main_lag
+            polled = 'copy_rates_from_pos'
+            # Grid orders fill up to max_positions per direction; polls are up to max_interval apart
+            max_positions = 2 * bot.max_positions
+            max_loop_gap += pacing.params['max_interval']
+        else:
+            engine, errors = drive_engine(bot, scheduler, duration, plan, strategy_exits, engine_params)
+            pacing = engine.pacing
+            polled = 'copy_ticks_from'
+            max_positions = engine.params['max_positions']
+        elapsed = time.monotonic() - started
+        notifier.stop_heartbeat()
+
+        # Connection changes pause the loop on purpose, so gaps around them are not counted
+        excluded = [(at - 1.0, at + 2.0) for at in disconnected] + \
+                   [(start, end + bot.supervisor.backoff_max) for start, end in chaos.outages]
+        gaps = loop_gaps(chaos.calls[polled], excluded)
+        report = {
+            'target': target,
+            'duration': round(elapsed, 2),
+            'speed': speed,
+            'market_minutes': round((broker.last_msc - broker.origin_msc) / 60000, 1),
+            'ticks': broker.total_ticks,
+            'loop_polls': len(chaos.calls[polled]),
+            'max_loop_gap': float(gaps.max()) if len(gaps) else 0.0,
+            'p99_loop_gap': float(np.percentile(gaps, 99)) if len(gaps) else 0.0,
+            'max_event_loop_lag': notifier.probe.max_lag,
+            **extra,
+            'orders_sent': len(chaos.calls['order_send']),
+            'positions_opened': len(broker.opened),
+            'max_open_positions': broker.max_open,
+            'duplicate_orders': duplicate_sends(chaos.sends),
+            'deals': len(broker.deals),
+            'balance': round(broker.balance, 2),
+            'faults': dict(chaos.faults),
+            'gate': dict(bot.gate.stats),
+            'pacing': pacing.metrics(),
+            'notifications': dict(notifier.stats),
+            'loop_errors': len(errors),
+            'plan': plan.to_dict(),
+        }
+        report['violations'] = check_invariants(report, max_positions, max_loop_gap, max_loop_lag)
+        report['errors'] = errors[:10]
+        return report
+    finally:
+        os.chdir(cwd)
+        restore()
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the trading loop against injected terminal and notifier faults")
+    parser.add_argument('--duration', type=float, default=30.0, help="Wall clock seconds to run")
+    parser.add_argument('--speed', type=float, default=60.0, help="Market seconds per wall clock second")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--latency', type=float, default=0.02, help="Max added latency per terminal call")
+    parser.add_argument('--timeout-rate', type=float, default=0.01)
+    parser.add_argument('--none-rate', type=float, default=0.02)
+    parser.add_argument('--requote-rate', type=float, default=0.1)
+    parser.add_argument('--partial-rate', type=float, default=0.1)
+    parser.add_argument('--outage-rate', type=float, default=0.0, help="Chance per connection probe of an outage")
+    parser.add_argument('--notify-failure-rate', type=float, default=0.2)
+    parser.add_argument('--max-loop-gap', type=float, default=2.0, help="Bound on seconds between tick polls")
+    parser.add_argument('--max-loop-lag', type=float, default=0.1, help="Bound on event loop lag")
+    parser.add_argument('--target', choices=['engine', 'main'], default='engine',
+                        help="Drive TradingEngine, or trading_bot.main() and its event loop")
+    parser.add_argument('--strategy-exits', action='store_true',
+                        help="Enable the position manager's strategy exits (they need ta)")
+    parser.add_argument('--workdir', help="Keep the bot's logs and stores here instead of a temporary directory")
+    args = parser.parse_args()
+
+    plan = FaultPlan(latency=args.latency, timeout_rate=args.timeout_rate, none_rate=args.none_rate,
+                     requote_rate=args.requote_rate, partial_rate=args.partial_rate, outage_rate=args.outage_rate,
+                     notify_failure_rate=args.notify_failure_rate, seed=args.seed)
+    report = run(args.duration, args.speed, plan, max_loop_gap=args.max_loop_gap, max_loop_lag=args.max_loop_lag,
+                 strategy_exits=args.strategy_exits, workdir=args.workdir, target=args.target)
+    print(json.dumps(report, indent=2, default=str))
+    if report['violations']:
+        print("Invariants violated:\n  " + "\n  ".join(report['violations']))
+        sys.exit(1)
+    print("All invariants held")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import threading
+
+
+class Param:
+    """Typed parameter with a default and optional bounds"""
+
+    __slots__ = ('type', 'default', 'min', 'max', 'choices', 'doc')
+
+    def __init__(self, type, default, min=None, max=None, choices=None, doc=""):
+        self.type = type
+        self.default = default
+        self.min = min
+        self.max = max
+        self.choices = choices
+        self.doc = doc
+
+    def convert(self, name, value):
+        if isinstance(value, bool) and self.type is not bool:
+            raise ValueError(f"{name}: expected {self.type.__name__}, got {value!r}")
+        try:
+            converted = self.type(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name}: expected {self.type.__name__}, got {value!r}")
+        if self.type is int and isinstance(value, float) and value != converted:
+            raise ValueError(f"{name}: expected an integer, got {value!r}")
+        if self.min is not None and converted < self.min:
+            raise ValueError(f"{name}: {converted} is below the minimum {self.min}")
+        if self.max is not None and converted > self.max:
+            raise ValueError(f"{name}: {converted} is above the maximum {self.max}")
+        if self.choices is not None and converted not in self.choices:
+            raise ValueError(f"{name}: {converted!r} is not one of {sorted(self.choices)}")
+        return converted
+
+
+class Schema:
+    """Named set of Params; validate() turns raw values into a checked, typed dict"""
+
+    def __init__(self, **params):
+        self.params = params
+
+    def __contains__(self, name):
+        return name in self.params
+
+    def defaults(self):
+        return {name: param.default for name, param in self.params.items()}
+
+    def validate(self, values, base=None):
+        """New dict of base (or the defaults) updated with values; raises ValueError on any bad value"""
+        if not isinstance(values, dict):
+            raise ValueError(f"Parameters must be an object, got {values!r}")
+        unknown = set(values) - set(self.params)
+        if unknown:
+            raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+        result = dict(base) if base is not None else self.defaults()
+        for name, value in values.items():
+            result[name] = self.params[name].convert(name, value)
+        return result
+
+    def describe(self):
+        """Plain description for APIs and docs"""
+        return {
+            name: {'type': param.type.__name__, 'default': param.default, 'min': param.min,
+                   'max': param.max, 'doc': param.doc}
+            for name, param in self.params.items()
+        }
+
+
+def load_config(path):
+    """Read a JSON config file"""
+    with open(path) as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError(f"{path}: top level must be an object")
+    return config
+
+
+def config_section(config, name):
+    """config[name] as a dict ({} when missing); raises ValueError when it is not an object"""
+    section = config.get(name, {})
+    if not isinstance(section, dict):
+        raise ValueError(f"Config section '{name}' must be an object, got {section!r}")
+    return section
+
+
+class ConfigWatcher:
+    """Reloads a JSON config file when it changes and hands it to apply(config)
+
+    The file is checked every interval seconds. A file that fails to
+    parse or validate is logged and skipped, leaving the running
+    configuration untouched.
+    """
+
+    def __init__(self, path, apply, interval=1.0):
+        self.path = path
+        self.apply = apply
+        self.interval = interval
+        self.mtime = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def check(self):
+        """Apply the file if it changed since the last check; returns True when applied"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        try:
+            self.apply(load_config(self.path))
+        except (OSError, ValueError, TypeError) as e:
+            logging.error(f"Config {self.path} not applied: {str(e)}")
+            return False
+        except Exception:
+            # Whatever apply() raised, keep the running config and keep watching
+            logging.exception(f"Config {self.path} not applied")
+            return False
+        logging.info(f"Config {self.path} applied")
+        return True
+
+    def start(self):
+        self.check()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self.stopped.set()
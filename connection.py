@@ -0,0 +1,172 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from lazy import LazyModule
+
+mt5 = LazyModule('MetaTrader5')
+
+# Connection states
+DISCONNECTED = 'disconnected'
+CONNECTING = 'connecting'
+CONNECTED = 'connected'
+
+
+class ConnectionSupervisor:
+    """Keeps the MT5 terminal connection alive
+
+    A background thread probes terminal_info() on a schedule while
+    connected and reconnects with exponential backoff after a failure.
+    Listeners are told about every state change, requests submitted while
+    disconnected are buffered and replayed on reconnect (dropping the ones
+    that have expired), and wait_connected() lets loops block until the
+    terminal is back.
+    """
+
+    def __init__(self, connect, probe_interval=2.0, backoff_initial=0.5, backoff_max=30.0, max_pending=100):
+        self.connect = connect
+        self.probe_interval = probe_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.state = DISCONNECTED
+        self.last_error = None
+        self.attempts = 0
+        self.listeners = []
+        self.pending = deque(maxlen=max_pending)
+        self.connected_event = threading.Event()
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+
+    def add_listener(self, callback):
+        """Call callback(state, previous_state) on every state change"""
+        self.listeners.append(callback)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+
+    @property
+    def connected(self):
+        return self.state == CONNECTED
+
+    def wait_connected(self, timeout=None):
+        """Block until connected or the timeout expires; returns the connection status"""
+        return self.connected_event.wait(timeout)
+
+    def _set_state(self, state):
+        with self.lock:
+            previous, self.state = self.state, state
+        if state == CONNECTED:
+            self.connected_event.set()
+        else:
+            self.connected_event.clear()
+        if state == previous:
+            return
+        logging.info(f"MT5 connection state: {previous} -> {state}")
+        for callback in list(self.listeners):
+            try:
+                callback(state, previous)
+            except Exception as e:
+                logging.error(f"Error in connection listener: {str(e)}")
+
+    def try_connect(self):
+        """Run one connection attempt now"""
+        self._set_state(CONNECTING)
+        try:
+            ok = bool(self.connect())
+        except Exception as e:
+            logging.error(f"MT5 connection attempt failed: {str(e)}")
+            ok = False
+        if ok:
+            self.attempts = 0
+            self.last_error = None
+            self._set_state(CONNECTED)
+            self._replay_pending()
+        else:
+            self.attempts += 1
+            self.last_error = self._last_error()
+            self._set_state(DISCONNECTED)
+        return ok
+
+    def probe(self):
+        """Check the terminal is alive and connected to the trade server"""
+        try:
+            info = mt5.terminal_info()
+            healthy = info is not None and info.connected
+        except Exception:
+            healthy = False
+        if not healthy and self.state == CONNECTED:
+            self.last_error = self._last_error()
+            logging.error(f"MT5 connection lost: {self.last_error}")
+            self._set_state(DISCONNECTED)
+            self.wakeup.set()
+        return healthy
+
+    def report_failure(self):
+        """Called when a terminal request failed; probes immediately and returns whether still connected"""
+        return self.probe()
+
+    def _last_error(self):
+        try:
+            return mt5.last_error()
+        except Exception:
+            return None
+
+    def next_delay(self):
+        """Exponential backoff with jitter for the next reconnect attempt"""
+        delay = min(self.backoff_initial * (2 ** max(self.attempts - 1, 0)), self.backoff_max)
+        return delay * random.uniform(0.8, 1.2)
+
+    def _run(self):
+        while self.running:
+            if self.state == CONNECTED:
+                self.wakeup.wait(self.probe_interval)
+                self.wakeup.clear()
+                if self.running and self.state == CONNECTED:
+                    self.probe()
+            else:
+                if not self.try_connect():
+                    self.wakeup.wait(self.next_delay())
+                    self.wakeup.clear()
+
+    def submit(self, func, *args, ttl=30.0, **kwargs):
+        """Run func now when connected, otherwise buffer it until reconnect
+
+        Requests older than ttl seconds when the connection returns are
+        dropped, so stale trading decisions are never replayed.
+        """
+        future = Future()
+        if self.connected:
+            self._execute(future, func, args, kwargs)
+        else:
+            self.pending.append((time.monotonic() + ttl, future, func, args, kwargs))
+            logging.info(f"MT5 disconnected, buffered request {getattr(func, '__name__', func)}")
+        return future
+
+    def _execute(self, future, func, args, kwargs):
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _replay_pending(self):
+        now = time.monotonic()
+        while self.pending:
+            deadline, future, func, args, kwargs = self.pending.popleft()
+            if now > deadline:
+                logging.info(f"Dropped expired request {getattr(func, '__name__', func)}")
+                future.set_result(None)
+                continue
+            self._execute(future, func, args, kwargs)
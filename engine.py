@@ -0,0 +1,456 @@
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from config import ConfigWatcher, Param, Schema, config_section
+from connection import CONNECTED
+from execution import FILLED
+from indicators import interface_indicators
+from lazy import LazyModule
+from pacing import LoopRateController
+from position_manager import PositionManager
+from sessions import SessionScheduler
+from strategies import create_strategy
+from ticks import TickBarBuilder
+from timeframes import rates_to_frame
+
+mt5 = LazyModule('MetaTrader5')
+
+
+class TradingEngine:
+    """Auto-trading loop that runs independently of any user interface
+
+    The engine owns the tick-driven indicator state, evaluates the quick
+    buy/sell rules and places orders through the ForexTradingBot. Clients
+    (the Tk interface, the headless control API) only change parameters,
+    start/stop the loop and subscribe to the snapshots it publishes.
+    """
+
+    SCHEMA = Schema(
+        lot_size=Param(float, 0.01, min=0.01, max=100, doc="Volume of each order"),
+        sl_atr=Param(float, 1.5, min=0.1, max=20, doc="Stop loss distance in ATRs"),
+        tp_atr=Param(float, 3.0, min=0.1, max=50, doc="Take profit distance in ATRs"),
+        max_positions=Param(int, 3, min=1, max=100, doc="Maximum open positions on the symbol"),
+    )
+
+    def __init__(self, bot, lot_size=0.01, sl_atr=1.5, tp_atr=3.0, max_positions=3, poll_interval=0.02,
+                 checkpoint_path='engine_state.npz', checkpoint_interval=60.0, journal_interval=30.0,
+                 tick_source=None, strategy='quick', strategy_params=None, scheduler=None, load_retries=5,
+                 pacing=None):
+        self.bot = bot
+        self.params = self.SCHEMA.validate({
+            'lot_size': lot_size,
+            'sl_atr': sl_atr,
+            'tp_atr': tp_atr,
+            'max_positions': max_positions,
+        })
+        self.strategy = create_strategy(strategy, strategy_params)
+        self.config_watcher = None
+        self.poll_interval = poll_interval
+        # Loop interval around poll_interval, shorter when the ATR or the tick rate picks up
+        self.pacing = pacing or LoopRateController(base_interval=poll_interval, min_interval=poll_interval / 4,
+                                                   max_interval=1.0, cpu_budget=0.5, call_budget=200.0)
+        self.tick_source = tick_source  # Shared-memory reader replacing terminal tick polls
+        self.scheduler = scheduler or SessionScheduler(bot.symbol)
+        self.blackout = None  # Reason of the blackout in progress, entries are skipped until it ends
+        self.load_retries = load_retries
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_time = 0.0
+        self.journal_interval = journal_interval
+        self.journal_time = 0.0
+        self.tick_builder = None
+        self.running = False
+        self.stopped = threading.Event()  # Stop signal of the current run; every start() makes a new one
+        self.thread = None
+        self.lock = threading.Lock()
+        self.listeners = []
+        self.log_listeners = []
+        self.actions = deque(maxlen=200)
+        self.last_snapshot = None
+        self.manager = PositionManager(bot)
+        self.bot.supervisor.add_listener(self.on_connection_state)
+
+    def on_connection_state(self, state, previous):
+        """Log connection changes; the loop pauses itself while disconnected"""
+        if self.running and CONNECTED in (state, previous):
+            self.log_action(f"MT5 connection {state}")
+
+    def subscribe(self, callback):
+        """Call callback(snapshot) after every evaluation"""
+        self.listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def subscribe_log(self, callback):
+        """Call callback(message) for every trading action logged"""
+        self.log_listeners.append(callback)
+
+    def log_action(self, message):
+        """Record a trading action and forward it to the log listeners"""
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self.actions.append(f"[{timestamp}] {message}")
+        logging.info(message)
+        for callback in self.log_listeners:
+            try:
+                callback(message)
+            except Exception as e:
+                logging.error(f"Error in log listener: {str(e)}")
+
+    def set_params(self, **params):
+        """Validate and apply trading parameters atomically"""
+        with self.lock:
+            self.params = self.SCHEMA.validate(params, base=self.params)
+        return self.params
+
+    def set_strategy(self, name=None, params=None):
+        """Swap in a new strategy instance; name defaults to the current plugin"""
+        strategy = create_strategy(name or self.strategy.name, params)
+        self.strategy = strategy
+        self.log_action(f"Strategy set to {strategy.name} {strategy.params}")
+        return strategy
+
+    def get_config(self):
+        return {
+            'engine': self.params,
+            'strategy': {'name': self.strategy.name, 'params': self.strategy.params},
+            'bot': self.bot.params(),
+            'pacing': self.pacing.params,
+        }
+
+    def apply_config(self, config):
+        """Apply an 'engine'/'strategy'/'bot'/'pacing' config; every section is validated before anything changes"""
+        unknown = set(config) - {'engine', 'strategy', 'bot', 'pacing'}
+        if unknown:
+            raise ValueError(f"Unknown config sections: {', '.join(sorted(unknown))}")
+        params = self.SCHEMA.validate(config_section(config, 'engine'), base=self.params)
+        strategy = None
+        if 'strategy' in config:
+            section = config_section(config, 'strategy')
+            strategy = create_strategy(section.get('name', self.strategy.name), section.get('params'))
+        bot_params = self.bot.SCHEMA.validate(config_section(config, 'bot'), base=self.bot.params())
+        pacing_params = self.pacing.validate(config_section(config, 'pacing'))
+
+        with self.lock:
+            self.params = params
+            if strategy is not None:
+                self.strategy = strategy
+            self.bot.configure(**bot_params)
+            self.pacing.configure(**pacing_params)
+        self.log_action("Configuration updated")
+        return self.get_config()
+
+    def watch_config(self, path, interval=1.0):
+        """Hot-reload the config file whenever it changes"""
+        if self.config_watcher is not None:
+            self.config_watcher.stop()
+        self.config_watcher = ConfigWatcher(path, self.apply_config, interval)
+        self.config_watcher.start()
+
+    def start(self, join_timeout=10.0):
+        """Start the trading loop in a background thread
+
+        A loop that was stopped but is still finishing its iteration is
+        joined first, so two loops never trade at once.
+        """
+        if self.running:
+            return False
+        if self.thread is not None and self.thread.is_alive():
+            self.thread.join(join_timeout)
+            if self.thread.is_alive():
+                self.log_action("Previous trading loop is still stopping, not started")
+                return False
+        self.running = True
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(self.stopped,), daemon=True)
+        self.thread.start()
+        self.log_action("Auto trading started")
+        return True
+
+    def stop(self):
+        """Ask the trading loop to stop after the current iteration"""
+        if not self.running:
+            return False
+        self.running = False
+        self.stopped.set()
+        self.log_action("Auto trading stopped")
+        return True
+
+    def run(self, stopped):
+        """Run auto trading logic until stopped (an Event) is set"""
+        # Wait for the connection supervisor before touching the terminal
+        while not stopped.is_set() and not self.bot.ensure_initialized():
+            self.bot.supervisor.wait_connected(1.0)
+        if stopped.is_set():
+            return
+
+        # Seed bars once (from the checkpoint when possible), then follow the forming bar from tick deltas only
+        if self.tick_builder is None:
+            # A terminal hiccup right after connecting should not end auto trading, so retry a few times
+            builder = self.load_tick_builder()
+            for _ in range(self.load_retries):
+                if builder is not None or stopped.is_set():
+                    break
+                self.bot.supervisor.wait_connected(1.0)
+                stopped.wait(1)
+                builder = self.load_tick_builder()
+            if builder is None:
+                self.log_action("Failed to load market data for auto trading")
+                if self.stopped is stopped:
+                    self.running = False
+                self.publish(None, None, [])
+                return
+            self.tick_builder = builder
+            self.checkpoint_time = time.monotonic()
+
+        while not stopped.is_set():
+            try:
+                # Trading is paused until the supervisor restores a dropped connection
+                if not self.bot.initialized:
+                    self.bot.supervisor.wait_connected(1.0)
+                    continue
+
+                # Outside the symbol's sessions nothing is polled until the next open; during a
+                # blackout open positions are still managed but no new entries are made
+                entries = self.scheduler.is_active()
+                blackout = None if entries else self.scheduler.blackout()
+                if blackout != self.blackout:
+                    self.log_action(f"Blackout ({blackout}), managing open positions only" if blackout is not None
+                                    else f"Blackout ({self.blackout}) over")
+                    self.blackout = blackout
+                if not entries and blackout is None:
+                    self.idle_until_session(stopped)
+                    continue
+
+                # Apply new ticks to the forming bar; evaluation is cached until one arrives
+                self.pacing.begin()
+                seen = self.tick_builder.ticks_seen
+                self.tick_builder.poll()
+                calls = 0 if self.tick_source is not None else 1  # Terminal calls this iteration
+                values = self.tick_builder.evaluate()
+                if values is not None:
+                    positions = self.bot.refresh_positions()
+                    signals = self.evaluate_signals(values)
+                    calls += 1 + (3 * self.trade(values, signals, positions) if entries else 0)
+                    if self.manager.due():
+                        self.manage_positions(values, positions)
+                        calls += 1
+                    self.publish(values, signals, positions.records(self.bot.symbol))
+                self.pacing.observe(values['ATR'] if values is not None else None,
+                                    self.tick_builder.ticks_seen - seen)
+
+                if time.monotonic() - self.checkpoint_time >= self.checkpoint_interval:
+                    self.save_checkpoint()
+                if time.monotonic() - self.journal_time >= self.journal_interval:
+                    self.journal_time = time.monotonic()
+                    self.bot.sync_journal()
+
+                stopped.wait(self.pacing.end(calls))
+
+            except Exception as e:
+                self.log_action(f"Error in trading loop: {str(e)}")
+                self.bot.events.error(f"Error in trading loop: {str(e)}", self.bot.symbol)
+                stopped.wait(1)  # Short error recovery time
+
+        self.save_checkpoint()
+        self.publish(self.tick_builder.evaluate(), None, [])
+
+    def idle_until_session(self, stopped):
+        """Checkpoint and sleep through the closed market, catching up on missed bars just before the open"""
+        _, until, reason = self.scheduler.status()
+        self.log_action(f"Market inactive ({reason}), idling until {until.strftime('%Y-%m-%d %H:%M')} UTC")
+        self.save_checkpoint()
+        if self.scheduler.wait_for_session(stopped, warm_up=self.warm_up):
+            self.log_action("Session open, trading resumed")
+
+    def warm_up(self):
+        """Bring the indicator state up to date ahead of the session open"""
+        if not self.bot.ensure_initialized():
+            return
+        if not self.tick_builder.catch_up():
+            builder = self.new_tick_builder()
+            if builder.seed_from_terminal():
+                self.tick_builder = builder
+        self.bot.refresh_positions()
+        self.bot.account.refresh()
+
+    def load_tick_builder(self):
+        """Warm start from the checkpoint, falling back to seeding from terminal history"""
+        if self.checkpoint_path:
+            builder = self.new_tick_builder()
+            if builder.resume(self.checkpoint_path):
+                self.log_action("Indicator state restored from checkpoint")
+                return builder
+        builder = self.new_tick_builder()
+        return builder if builder.seed_from_terminal() else None
+
+    def new_tick_builder(self):
+        return TickBarBuilder(self.bot.symbol, self.bot.timeframe, interface_indicators(),
+                              tick_source=self.tick_source, events=self.bot.events)
+
+    def save_checkpoint(self):
+        """Persist the indicator state for the next warm restart"""
+        self.checkpoint_time = time.monotonic()
+        if not self.checkpoint_path or self.tick_builder is None:
+            return
+        try:
+            self.tick_builder.save_checkpoint(self.checkpoint_path)
+        except OSError as e:
+            logging.error(f"Failed to save checkpoint: {str(e)}")
+
+    def evaluate_signals(self, values):
+        """Evaluate the current strategy plugin on the latest indicator values"""
+        return self.strategy.evaluate(values)
+
+    def trade(self, values, signals, positions):
+        """Place orders for the current signals within the position limits (positions is a PositionTable)
+
+        Returns the number of orders sent.
+        """
+        params = self.params
+        orders = 0
+        current_price = values['close']
+        atr = values['ATR']
+        buy_count = positions.count(self.bot.symbol, direction=1)
+        sell_count = positions.count(self.bot.symbol, direction=-1)
+        total_open_positions = buy_count + sell_count
+
+        # One order per side and bar: the gate drops repeats of a bar already traded, orders
+        # still in flight and anything inside the per-side cooldown. The conditions that fired
+        # are left out of the key, they can flicker while the bar is forming
+        symbol = self.bot.symbol
+        bar_time = values.get('time')
+
+        # Only buy if total positions is less than max and there are no open sell positions
+        if total_open_positions < params['max_positions'] and sell_count == 0 and signals['quick_buy']:
+            key = f"{symbol}:buy:{bar_time}"
+            if self.bot.gate.check(symbol, 1, key) is None:
+                self.log_action(f"Buy Conditions Met: {', '.join(signals['buy_conditions'])}")
+                self.bot.events.signal(symbol, 1, current_price, ', '.join(signals['buy_conditions']))
+                sl = current_price - (atr * params['sl_atr'])
+                tp = current_price + (atr * params['tp_atr'])
+                self.log_action("Attempting to place BUY order...")
+                self.place_order(mt5.ORDER_TYPE_BUY, params['lot_size'], current_price, sl, tp, key)
+                orders += 1
+
+        # Only sell if total positions is less than max and there are no open buy positions
+        if total_open_positions < params['max_positions'] and buy_count == 0 and signals['quick_sell']:
+            key = f"{symbol}:sell:{bar_time}"
+            if self.bot.gate.check(symbol, -1, key) is None:
+                self.log_action(f"Sell Conditions Met: {', '.join(signals['sell_conditions'])}")
+                self.bot.events.signal(symbol, -1, current_price, ', '.join(signals['sell_conditions']))
+                sl = current_price + (atr * params['sl_atr'])
+                tp = current_price - (atr * params['tp_atr'])
+                self.log_action("Attempting to place SELL order...")
+                self.place_order(mt5.ORDER_TYPE_SELL, params['lot_size'], current_price, sl, tp, key)
+                orders += 1
+
+        # Exits: the TP/SL set on the order, plus the position manager's trailing stops
+        return orders
+
+    def manage_positions(self, values, positions):
+        """Trail stops, and apply strategy exits when enabled, on the bot's symbol"""
+        symbol = self.bot.symbol
+        quotes = self.bot.get_quotes([symbol])
+        bars = rates_to_frame(self.tick_builder.get_rates()) if self.manager.use_strategy_exits else None
+        actions = self.manager.update(positions, quotes, {symbol: values['ATR']}, bars=bars, symbol=symbol)
+        if actions:
+            self.log_action(f"Position manager sent {actions} modification(s)/close(s)")
+
+    def place_order(self, order_type, volume, price, sl, tp, key=None):
+        """Place an order and log the outcome"""
+        result = self.bot.place_order(order_type, volume, price, sl, tp, key=key)
+        if result and result.retcode in FILLED:
+            action = "BUY" if order_type == mt5.ORDER_TYPE_BUY else "SELL"
+            self.log_action(f"Placed {action} order: Volume={volume}, Price={price:.5f}, SL={sl:.5f}, TP={tp:.5f}")
+        elif result:
+            self.log_action(f"Order placement failed: {result.comment} (retcode: {result.retcode})")
+        else:
+            self.log_action("Order placement failed: No result")
+        return result
+
+    def close_position(self, position_id):
+        """Close a position and log its profit/loss"""
+        position = mt5.positions_get(ticket=position_id)
+        if not position:
+            self.log_action(f"Position {position_id} not found for closing.")
+            return None
+
+        pos_type = "BUY" if position[0].type == mt5.ORDER_TYPE_BUY else "SELL"
+        current_profit = position[0].profit
+        self.log_action(
+            f"Attempting to close {pos_type} position {position_id} for {position[0].symbol} "
+            f"(Volume={position[0].volume}, Entry={position[0].price_open:.5f}, Current Profit={current_profit:.2f})"
+        )
+
+        result = self.bot.close_position(position_id)
+        if result and result.retcode in FILLED:
+            self.log_action(f"Closed {pos_type} position {position_id}. Profit/Loss: {current_profit:.2f}")
+        elif result:
+            self.log_action(f"Failed to close position {position_id}: {result.comment} (retcode: {result.retcode})")
+        else:
+            self.log_action(f"Failed to close position {position_id}: No result")
+        return result
+
+    def close_all_positions(self):
+        """Close all open positions on the bot's symbol"""
+        positions = self.bot.refresh_positions().records(self.bot.symbol)
+        if not positions:
+            self.log_action("No positions to close.")
+            return 0
+        self.log_action("Attempting to close all positions...")
+        closed = sum(1 for pos in positions if self.close_position(pos.ticket))
+        self.log_action("Finished attempting to close all positions.")
+        return closed
+
+    def get_account(self):
+        """Latest account snapshot from the bot's AccountMonitor"""
+        return self.bot.account.get()
+
+    def publish(self, values, signals, positions):
+        """Build a snapshot and hand it to every subscriber"""
+        snapshot = {
+            'time': time.time(),
+            'running': self.running,
+            'symbol': self.bot.symbol,
+            'params': self.params,
+            'values': values,
+            'signals': signals,
+            'positions': [position_to_dict(pos) for pos in positions],
+            'account': self.get_account(),
+            'gate': dict(self.bot.gate.stats),
+            'pacing': self.pacing.metrics(),
+        }
+        self.last_snapshot = snapshot
+        for callback in list(self.listeners):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logging.error(f"Error in snapshot listener: {str(e)}")
+        return snapshot
+
+    def snapshot(self):
+        """Latest snapshot, or a fresh one when the loop is not running"""
+        if self.last_snapshot is not None and self.running:
+            return self.last_snapshot
+        positions = self.bot.refresh_positions().records(self.bot.symbol)
+        values = self.tick_builder.evaluate() if self.tick_builder is not None else None
+        return self.publish(values, None, positions)
+
+
+def position_to_dict(pos):
+    """Plain dict of a PositionRecord for snapshots and the control API"""
+    return {
+        'ticket': pos.ticket,
+        'symbol': pos.symbol,
+        'type': "BUY" if pos.direction > 0 else "SELL",
+        'volume': pos.volume,
+        'price_open': pos.price_open,
+        'sl': pos.sl,
+        'tp': pos.tp,
+        'profit': pos.profit,
+    }
@@ -0,0 +1,357 @@
+import argparse
+import glob
+import logging
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Event types
+TICK = 1
+SIGNAL = 2
+ORDER = 3
+ERROR = 4
+EVENT_TYPES = {TICK: 'tick', SIGNAL: 'signal', ORDER: 'order', ERROR: 'error'}
+EVENT_NAMES = {name: code for code, name in EVENT_TYPES.items()}
+
+# Fixed part of every event. value/value2 are bid/ask for ticks, price and
+# nothing for signals, price/volume for orders; code is the order retcode.
+# Free text (signal conditions, order comments, error messages) follows the
+# block's headers and is only decoded when a query asks for it.
+# Every time is epoch seconds on the local clock (time.time()).
+SYMBOL_BYTES = 32
+EVENT_DTYPE = np.dtype([
+    ('time', '<f8'),
+    ('type', 'u1'),
+    ('side', 'i1'),           # +1 buy, -1 sell, 0 none
+    ('code', '<i4'),
+    ('symbol', f'S{SYMBOL_BYTES}'),
+    ('value', '<f8'),
+    ('value2', '<f8'),
+    ('text_len', '<u4'),
+])
+# Layout of EVB1 blocks, which had 12-byte symbols
+EVENT_DTYPE_V1 = np.dtype([(name, 'S12' if name == 'symbol' else EVENT_DTYPE[name])
+                           for name in EVENT_DTYPE.names])
+
+# Each flush writes one block: magic, event count, text bytes, first and
+# last event time, then the headers and the text
+BLOCK_MAGIC = b'EVB2'
+BLOCK_DTYPES = {b'EVB1': EVENT_DTYPE_V1, BLOCK_MAGIC: EVENT_DTYPE}
+BLOCK_HEADER = struct.Struct('<4sIIdd')
+
+
+def _check_symbol(symbol):
+    if len(symbol.encode()) > SYMBOL_BYTES:
+        raise ValueError(f"Symbol {symbol!r} is longer than the event log's {SYMBOL_BYTES} bytes")
+
+
+class EventLog:
+    """Append-only binary log of ticks, signals, orders and errors
+
+    emit() only appends a tuple to a list; a background thread turns the
+    pending events into one block every flush_interval seconds and appends
+    it to the current file under path, starting a new file once it grows
+    past max_file_bytes. Nothing is formatted on the trading thread.
+    """
+
+    def __init__(self, path='events', flush_interval=1.0, max_file_bytes=256 << 20):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_file_bytes = max_file_bytes
+        self.rows = []
+        self.arrays = []
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.file = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def emit(self, type, symbol='', side=0, code=0, value=np.nan, value2=np.nan, text=None, when=None):
+        _check_symbol(symbol)
+        row = (time.time() if when is None else when, type, side, code, symbol, value, value2, text)
+        with self.lock:
+            self.rows.append(row)
+
+    def tick(self, symbol, bid, ask, when=None):
+        self.emit(TICK, symbol, value=bid, value2=ask, when=when)
+
+    def ticks(self, symbol, time_msc, bids, asks, received=None):
+        """Bulk tick events from arrays, time_msc being the broker's tick times
+
+        Broker times are in server time, so the ticks are moved onto the
+        local clock: the newest one is stamped received (default now) and
+        the others keep their spacing before it.
+        """
+        _check_symbol(symbol)
+        received = time.time() if received is None else received
+        time_msc = np.asarray(time_msc, dtype=np.int64)
+        block = np.zeros(len(time_msc), dtype=EVENT_DTYPE)
+        block['time'] = received - (time_msc[-1] - time_msc) / 1000
+        block['type'] = TICK
+        block['symbol'] = symbol
+        block['value'] = bids
+        block['value2'] = asks
+        with self.lock:
+            self.arrays.append(block)
+
+    def signal(self, symbol, side, price, conditions=None):
+        self.emit(SIGNAL, symbol, side, value=price, text=conditions)
+
+    def order(self, symbol, side, retcode, price, volume, comment=None):
+        self.emit(ORDER, symbol, side, retcode, price, volume, comment)
+
+    def error(self, message, symbol=''):
+        self.emit(ERROR, symbol, text=message)
+
+    def _run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write everything emitted so far as one block"""
+        with self.lock:
+            rows, self.rows = self.rows, []
+            arrays, self.arrays = self.arrays, []
+        if not rows and not arrays:
+            return
+        texts = []
+        if rows:
+            block = np.empty(len(rows), dtype=EVENT_DTYPE)
+            columns = list(zip(*rows))
+            for name, column in zip(EVENT_DTYPE.names[:-1], columns[:-1]):
+                block[name] = column
+            texts = [text.encode('utf-8') if text else b'' for text in columns[-1]]
+            block['text_len'] = [len(text) for text in texts]
+            arrays.insert(0, block)
+        block = np.concatenate(arrays) if len(arrays) > 1 else arrays[0]
+        payload = b''.join(texts)
+        header = BLOCK_HEADER.pack(BLOCK_MAGIC, len(block), len(payload),
+                                   float(block['time'].min()), float(block['time'].max()))
+        with self.write_lock:
+            try:
+                f = self._file()
+                f.write(header + block.tobytes() + payload)
+                f.flush()
+            except OSError as e:
+                logging.error(f"Failed to write events: {str(e)}")
+
+    def _file(self):
+        if self.file is not None and self.file.tell() >= self.max_file_bytes:
+            self.file.close()
+            self.file = None
+        if self.file is None:
+            os.makedirs(self.path, exist_ok=True)
+            name = os.path.join(self.path, f"events_{int(time.time() * 1000)}_{os.getpid()}.evl")
+            self.file = open(name, 'ab')
+        return self.file
+
+    def close(self):
+        """Write pending events and stop the writer"""
+        self.stopped.set()
+        self.thread.join()
+        self.flush()
+        with self.write_lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class EventLogHandler(logging.Handler):
+    """logging handler that copies ERROR records into an EventLog"""
+
+    def __init__(self, events, level=logging.ERROR):
+        super().__init__(level)
+        self.events = events
+
+    def emit(self, record):
+        self.events.error(record.getMessage())
+
+
+def iter_events(path='events', since=None, until=None, symbols=None, types=None, text=False):
+    """Yield (rows, texts or None) for each block with matching events, oldest file first
+
+    since/until are epoch seconds, symbols and types lists of names or
+    codes. Blocks outside the time range are skipped from their header
+    alone, and text is only read when requested, so memory stays at one
+    block however large the log is.
+    """
+    files = sorted(glob.glob(os.path.join(path, '*.evl'))) if os.path.isdir(path) else [path]
+    symbols = None if symbols is None else np.array([s.encode() for s in symbols], dtype=EVENT_DTYPE['symbol'])
+    types = None if types is None else np.array([EVENT_NAMES.get(t, t) for t in types], dtype='u1')
+    for name in files:
+        with open(name, 'rb') as f:
+            while True:
+                head = f.read(BLOCK_HEADER.size)
+                if len(head) < BLOCK_HEADER.size:
+                    break
+                magic, count, text_bytes, first, last = BLOCK_HEADER.unpack(head)
+                dtype = BLOCK_DTYPES.get(magic)
+                if dtype is None:
+                    logging.error(f"Corrupt event block in {name}, skipping the rest of the file")
+                    break
+                size = count * dtype.itemsize
+                if (since is not None and last < since) or (until is not None and first >= until):
+                    f.seek(size + text_bytes, os.SEEK_CUR)
+                    continue
+                data = f.read(size)
+                if len(data) < size:
+                    break  # Block cut short by a crash
+                rows = np.frombuffer(data, dtype=dtype)
+                if dtype is not EVENT_DTYPE:
+                    rows = rows.astype(EVENT_DTYPE)
+                mask = np.ones(count, dtype=bool)
+                if since is not None:
+                    mask &= rows['time'] >= since
+                if until is not None:
+                    mask &= rows['time'] < until
+                if symbols is not None:
+                    mask &= np.isin(rows['symbol'], symbols)
+                if types is not None:
+                    mask &= np.isin(rows['type'], types)
+                if not mask.any():
+                    f.seek(text_bytes, os.SEEK_CUR)
+                    continue
+                texts = None
+                if text:
+                    payload = f.read(text_bytes)
+                    ends = np.cumsum(rows['text_len'], dtype=np.int64)
+                    starts = ends - rows['text_len']
+                    texts = [payload[s:e].decode('utf-8', 'replace')
+                             for s, e in zip(starts[mask].tolist(), ends[mask].tolist())]
+                else:
+                    f.seek(text_bytes, os.SEEK_CUR)
+                yield rows[mask], texts
+
+
+def read_events(path='events', since=None, until=None, symbols=None, types=None, text=False):
+    """All matching events as one array; returns (rows, texts or None)"""
+    parts, texts = [], [] if text else None
+    for rows, block_texts in iter_events(path, since, until, symbols, types, text):
+        parts.append(rows)
+        if text:
+            texts.extend(block_texts)
+    rows = np.concatenate(parts) if parts else np.empty(0, dtype=EVENT_DTYPE)
+    return rows, texts
+
+
+def _key_column(rows, key):
+    if key == 'hour':
+        return (rows['time'] // 3600 % 24).astype(np.int64)
+    if key == 'day':
+        return (rows['time'] // 86400).astype(np.int64)
+    return rows[key]
+
+
+def _factorize(column):
+    """(unique values, inverse) using runs, since logged events come in long runs of equal keys"""
+    if not len(column):
+        return column[:0], np.zeros(0, dtype=np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(column[1:] != column[:-1]) + 1))
+    unique, run_inverse = np.unique(column[starts], return_inverse=True)
+    lengths = np.diff(np.concatenate((starts, [len(column)])))
+    return unique, np.repeat(run_inverse.ravel(), lengths)
+
+
+def _key_label(key, value):
+    if key == 'type':
+        return EVENT_TYPES.get(int(value), str(value))
+    if key == 'symbol':
+        return value.decode()
+    if key == 'day':
+        return str(np.datetime64(int(value), 'D'))
+    return int(value)
+
+
+def aggregate(blocks, by=('type', 'symbol')):
+    """[(key..., count, mean value)] grouped by any of type, symbol, side, code, hour and day
+
+    blocks is an event array or an iterable of them (e.g. from
+    iter_events); each block is grouped with integer codes and only the
+    per-group totals are kept.
+    """
+    if isinstance(blocks, np.ndarray):
+        blocks = [blocks]
+    totals = {}
+    for rows in blocks:
+        if not len(rows):
+            continue
+        codes = np.zeros(len(rows), dtype=np.int64)
+        uniques = []
+        size = 1
+        for key in by:
+            unique, inverse = _factorize(_key_column(rows, key))
+            codes = codes * len(unique) + inverse
+            uniques.append(unique)
+            size *= len(unique)
+        values = rows['value']
+        valid = ~np.isnan(values)
+        counts = np.bincount(codes, minlength=size)
+        sums = np.bincount(codes[valid], values[valid], minlength=size)
+        valid_counts = np.bincount(codes[valid], minlength=size)
+        groups = np.flatnonzero(counts)
+        counts, sums, valid_counts = counts[groups], sums[groups], valid_counts[groups]
+        # Decode each group code back into its key values
+        columns, rest = [], groups.copy()
+        for unique in reversed(uniques):
+            columns.append(unique[rest % len(unique)])
+            rest //= len(unique)
+        columns.reverse()
+        for i in range(len(groups)):
+            key = tuple(_key_label(name, column[i]) for name, column in zip(by, columns))
+            total = totals.setdefault(key, [0, 0.0, 0])
+            total[0] += int(counts[i])
+            total[1] += float(sums[i])
+            total[2] += int(valid_counts[i])
+    return [key + (count, total / valid if valid else float('nan'))
+            for key, (count, total, valid) in sorted(totals.items())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the binary event log")
+    parser.add_argument('command', choices=['query', 'stats'])
+    parser.add_argument('--path', default='events', help="Event log directory or file")
+    parser.add_argument('--since', type=datetime.fromisoformat, default=None, help="YYYY-MM-DD[THH:MM]")
+    parser.add_argument('--until', type=datetime.fromisoformat, default=None, help="YYYY-MM-DD[THH:MM]")
+    parser.add_argument('--symbol', action='append', default=None)
+    parser.add_argument('--type', action='append', default=None, choices=sorted(EVENT_NAMES))
+    parser.add_argument('--by', default='type,symbol', help="stats grouping: type, symbol, side, code, hour, day")
+    parser.add_argument('--limit', type=int, default=50, help="query: print at most this many (newest) events")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    started = time.perf_counter()
+    blocks = iter_events(
+        args.path,
+        since=args.since.timestamp() if args.since else None,
+        until=args.until.timestamp() if args.until else None,
+        symbols=args.symbol, types=args.type, text=args.command == 'query',
+    )
+    total = 0
+    if args.command == 'stats':
+        by = [key.strip() for key in args.by.split(',') if key.strip()]
+        for *key, count, mean in aggregate((rows for rows, _ in blocks), by):
+            total += count
+            print(f"  {' '.join(str(k) for k in key):<30} count={count:<10} mean value={mean:.5f}")
+    else:
+        # Keep only the newest limit events while streaming through the blocks
+        tail = []
+        for rows, texts in blocks:
+            total += len(rows)
+            tail.extend(zip(rows[-args.limit:], texts[-args.limit:]))
+            tail = tail[-args.limit:]
+        for row, text in tail:
+            when = datetime.fromtimestamp(row['time']).isoformat(timespec='milliseconds')
+            print(f"{when} {EVENT_TYPES.get(int(row['type']), row['type']):<6} {row['symbol'].decode():<10} "
+                  f"side={int(row['side']):+d} code={int(row['code'])} value={row['value']:.5f} "
+                  f"value2={row['value2']:.5f} {text}")
+    print(f"{total} event(s) ({time.perf_counter() - started:.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import argparse
+import glob
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+# One row per order_send call: the request, the tick the decision was made on and the result
+EXECUTION_DTYPE = np.dtype([
+    ('time', 'f8'),               # Wall time the request was sent (epoch seconds)
+    ('latency_ms', 'f4'),         # order_send round trip
+    ('symbol', 'U16'),
+    ('action', 'i2'),
+    ('type', 'i2'),
+    ('side', 'i1'),               # +1 buys, -1 sells, 0 for non-trading actions
+    ('volume', 'f8'),
+    ('price', 'f8'),              # Requested price
+    ('deviation', 'i4'),
+    ('filling', 'i2'),
+    ('tick_time_msc', 'i8'),      # Tick at decision time
+    ('tick_bid', 'f8'),
+    ('tick_ask', 'f8'),
+    ('retcode', 'i4'),            # -1 when order_send returned None
+    ('fill_price', 'f8'),
+    ('fill_volume', 'f8'),
+    ('order', 'i8'),
+    ('deal', 'i8'),
+    ('request_id', 'i8'),
+])
+
+NO_RESULT = -1
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_DONE_PARTIAL = 10010
+TRADE_RETCODE_REQUOTE = 10004
+TRADE_RETCODE_PRICE_OFF = 10021
+FILLED = (TRADE_RETCODE_DONE, TRADE_RETCODE_DONE_PARTIAL)
+
+
+class ExecutionLog:
+    """Columnar store of order executions
+
+    record() only fills one row of a preallocated structured array; the
+    trading thread never touches the disk. A background thread saves the
+    current chunk as its own .npy file under path, rewriting it in place
+    every flush_interval seconds and as soon as record() signals a fill,
+    and starts a new file once the chunk is full. Reports load whole
+    columns without parsing.
+    """
+
+    def __init__(self, path='executions', chunk_size=4096, flush_interval=5.0):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.chunk = np.zeros(chunk_size, dtype=EXECUTION_DTYPE)
+        self.size = 0
+        self.saved = 0  # Rows of the chunk already in its file
+        self.name = None
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.pending = threading.Event()  # Set by record() when rows should be saved now
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def record(self, request, result, latency_ms, tick=None, sent_at=None):
+        """Add one order_send call (request is an OrderRequest, result may be None)"""
+        with self.lock:
+            if self.size == len(self.chunk):
+                # The writer has not caught up (or its last save failed), keep the rows until it does
+                self.chunk = np.concatenate([self.chunk, np.zeros(self.chunk_size, dtype=EXECUTION_DTYPE)])
+            row = self.chunk[self.size]
+            row['time'] = sent_at if sent_at is not None else time.time()
+            row['latency_ms'] = latency_ms
+            row['symbol'] = request.symbol or ''
+            row['action'] = request.action
+            row['type'] = request.type if request.type is not None else -1
+            row['side'] = order_side(request.type)
+            row['volume'] = request.volume or 0.0
+            row['price'] = request.price or 0.0
+            row['deviation'] = request.deviation or 0
+            row['filling'] = request.type_filling if request.type_filling is not None else -1
+            if tick is not None:
+                row['tick_time_msc'] = tick.time_msc
+                row['tick_bid'] = tick.bid
+                row['tick_ask'] = tick.ask
+            else:
+                row['tick_time_msc'] = 0
+                row['tick_bid'] = row['tick_ask'] = np.nan
+            if result is not None:
+                row['retcode'] = result.retcode
+                row['fill_price'] = result.price
+                row['fill_volume'] = result.volume
+                row['order'] = result.order
+                row['deal'] = result.deal
+                row['request_id'] = result.request_id
+            else:
+                row['retcode'] = NO_RESULT
+                row['fill_price'] = np.nan
+                row['fill_volume'] = 0.0
+                row['order'] = row['deal'] = row['request_id'] = 0
+            self.size += 1
+            if self.size >= self.chunk_size or row['retcode'] in FILLED:
+                self.pending.set()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.pending.wait(self.flush_interval)
+            self.pending.clear()
+            self.flush()
+
+    def flush(self):
+        """Save the rows recorded so far; the copy is taken under the lock, the write outside it"""
+        with self.write_lock:
+            with self.lock:
+                count = self.size
+                if count == self.saved and count < self.chunk_size:
+                    return
+                rows = self.chunk[:count].copy()
+                if self.name is None:
+                    self.name = os.path.join(self.path, f"exec_{int(rows['time'][0] * 1000)}_{os.getpid()}.npy")
+                name = self.name
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                # Readers never see a half-written chunk
+                with open(name + '.tmp', 'wb') as f:
+                    np.save(f, rows)
+                os.replace(name + '.tmp', name)
+            except OSError as e:
+                logging.error(f"Failed to save executions: {str(e)}")
+                return
+            with self.lock:
+                self.saved = count
+                if count >= self.chunk_size:
+                    # Rows recorded during the write start the next chunk and file
+                    rest = self.chunk[count:self.size].copy()
+                    self.chunk = np.zeros(max(self.chunk_size, len(rest) + 1), dtype=EXECUTION_DTYPE)
+                    self.chunk[:len(rest)] = rest
+                    self.size = len(rest)
+                    self.saved = 0
+                    self.name = None
+
+    def close(self):
+        """Save pending rows and stop the writer"""
+        self.stopped.set()
+        self.pending.set()
+        self.thread.join()
+        self.flush()
+
+    def rows(self):
+        """Saved and in-memory rows, oldest first"""
+        with self.write_lock:
+            with self.lock:
+                current = self.chunk[self.saved:self.size].copy()
+            return np.concatenate([load_executions(self.path), current])
+
+
+def order_side(order_type):
+    # ORDER_TYPE_BUY, BUY_LIMIT, BUY_STOP, BUY_STOP_LIMIT are the even types 0, 2, 4 and 6
+    if order_type is None or order_type < 0:
+        return 0
+    return 1 if order_type % 2 == 0 else -1
+
+
+def load_executions(path='executions'):
+    """All saved execution chunks under path, sorted by time"""
+    files = sorted(glob.glob(os.path.join(path, 'exec_*.npy')))
+    if not files:
+        return np.zeros(0, dtype=EXECUTION_DTYPE)
+    rows = np.concatenate([np.load(f) for f in files])
+    return rows[np.argsort(rows['time'], kind='stable')]
+
+
+def slippage(rows):
+    """Adverse slippage of filled orders in price units (positive is worse)
+
+    Returns (vs_request, vs_decision_tick): the fill against the requested
+    price and against the ask (buys) or bid (sells) the decision was made on.
+    """
+    filled = rows[np.isin(rows['retcode'], FILLED) & (rows['side'] != 0) & (rows['fill_price'] > 0)]
+    side = filled['side'].astype(np.float64)
+    vs_request = np.where(filled['price'] > 0, (filled['fill_price'] - filled['price']) * side, np.nan)
+    decision = np.where(side > 0, filled['tick_ask'], filled['tick_bid'])
+    vs_tick = (filled['fill_price'] - decision) * side
+    return vs_request, vs_tick
+
+
+def percentiles(values, qs=(50, 90, 95, 99)):
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {f"p{q}": None for q in qs}
+    return {f"p{q}": float(v) for q, v in zip(qs, np.percentile(values, qs))}
+
+
+def retcode_by_hour(rows):
+    """{hour: {retcode: share}} with the hour in UTC"""
+    hours = (rows['time'] // 3600 % 24).astype(np.int64)
+    table = {}
+    for hour in np.unique(hours):
+        codes, counts = np.unique(rows['retcode'][hours == hour], return_counts=True)
+        total = counts.sum()
+        table[int(hour)] = {int(code): float(count / total) for code, count in zip(codes, counts)}
+    return table
+
+
+def report(rows, symbol=None):
+    """Summary of slippage, latency and retcodes, optionally for one symbol"""
+    if symbol is not None:
+        rows = rows[rows['symbol'] == symbol]
+    vs_request, vs_tick = slippage(rows)
+    trading = rows[rows['side'] != 0]
+    requotes = np.isin(trading['retcode'], (TRADE_RETCODE_REQUOTE, TRADE_RETCODE_PRICE_OFF))
+    return {
+        'requests': int(len(rows)),
+        'fill_rate': float(np.mean(np.isin(trading['retcode'], FILLED))) if len(trading) else None,
+        'requote_rate': float(np.mean(requotes)) if len(trading) else None,
+        'slippage_vs_request': percentiles(vs_request),
+        'slippage_vs_tick': percentiles(vs_tick),
+        'mean_slippage_vs_tick': float(np.nanmean(vs_tick)) if len(vs_tick) else None,
+        'latency_ms': percentiles(rows['latency_ms'].astype(np.float64)),
+        'retcode_by_hour': retcode_by_hour(rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Execution quality report: slippage, latency and retcodes")
+    parser.add_argument('--path', default='executions', help="Directory written by ExecutionLog")
+    parser.add_argument('--symbol', default=None)
+    args = parser.parse_args()
+
+    rows = load_executions(args.path)
+    summary = report(rows, args.symbol)
+    print(f"Requests: {summary['requests']}  fill rate: {summary['fill_rate']}  requote rate: {summary['requote_rate']}")
+    for name in ('slippage_vs_request', 'slippage_vs_tick', 'latency_ms'):
+        values = "  ".join(f"{q}={v:.5f}" if v is not None else f"{q}=n/a" for q, v in summary[name].items())
+        print(f"{name:<20} {values}")
+    print("Retcode share by hour (UTC):")
+    for hour, codes in summary['retcode_by_hour'].items():
+        shares = "  ".join(f"{code}:{share:.1%}" for code, share in sorted(codes.items()))
+        print(f"  {hour:02d}:00  {shares}")
+
+
+if __name__ == "__main__":
+    main()
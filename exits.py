@@ -0,0 +1,126 @@
+import numpy as np
+
+# Exit reason codes
+HOLD = 0
+TAKE_PROFIT = 1
+STOP_LOSS = 2
+BREAK_EVEN = 3
+TRAILING_STOP = 4
+
+REASONS = {
+    HOLD: "HOLD",
+    TAKE_PROFIT: "TP",
+    STOP_LOSS: "SL",
+    BREAK_EVEN: "BE",
+    TRAILING_STOP: "TRAIL",
+}
+
+
+class ExitDecision:
+    """Per-position exit evaluation over a PositionTable, as aligned arrays"""
+
+    def __init__(self, tickets, exit_price, pnl, pnl_pct, break_even, trailing_stop, reasons):
+        self.tickets = tickets
+        self.exit_price = exit_price        # Bid for buys, ask for sells
+        self.pnl = pnl                      # Unrealized P&L in account currency
+        self.pnl_pct = pnl_pct              # Unrealized move in percent of the open price
+        self.break_even = break_even        # Break-even stop price, NaN when not armed
+        self.trailing_stop = trailing_stop  # Trailing stop price, NaN when not armed
+        self.reasons = reasons
+
+    @property
+    def close_mask(self):
+        return self.reasons != HOLD
+
+    @property
+    def close_tickets(self):
+        return self.tickets[self.close_mask]
+
+    def close_list(self):
+        """(ticket, reason) pairs for every position that should be closed"""
+        mask = self.close_mask
+        return [(int(t), REASONS[int(r)]) for t, r in zip(self.tickets[mask], self.reasons[mask])]
+
+
+class ExitEvaluator:
+    """Vectorized TP/SL, break-even and trailing-stop checks over the whole book
+
+    Every position is priced with its own symbol's bid (buys) or ask
+    (sells). Levels are percentages of the open price, like the bot's
+    take_profit and stop_loss settings; a disabled level is None. The best
+    favourable move per ticket is remembered between calls so break-even
+    and trailing stops can arm and then trigger on a later evaluation.
+    """
+
+    def __init__(self, take_profit=None, stop_loss=None, break_even=None, trailing_stop=None):
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
+        self.break_even = break_even
+        self.trailing_stop = trailing_stop
+        self.state_tickets = np.zeros(0, dtype=np.int64)
+        self.state_best = np.zeros(0)
+
+    def _best_moves(self, tickets, pnl_pct):
+        """Update and return the best favourable move (percent) seen for each ticket"""
+        best = pnl_pct.copy()
+        if len(self.state_tickets):
+            idx = np.searchsorted(self.state_tickets, tickets)
+            idx = np.minimum(idx, len(self.state_tickets) - 1)
+            known = self.state_tickets[idx] == tickets
+            best[known] = np.maximum(best[known], self.state_best[idx[known]])
+        # Keep state only for open tickets, sorted for the next lookup
+        order = np.argsort(tickets)
+        self.state_tickets = tickets[order]
+        self.state_best = best[order]
+        return best
+
+    def evaluate(self, table, quotes, contract_sizes=None, mask=None):
+        """Evaluate the positions of a PositionTable
+
+        quotes maps symbol -> (bid, ask); contract_sizes maps symbol ->
+        contract size (defaults to 1). mask optionally limits the rows.
+        """
+        rows = table.rows if mask is None else table.rows[mask]
+        n_symbols = len(table.symbols)
+        bids = np.full(n_symbols, np.nan)
+        asks = np.full(n_symbols, np.nan)
+        sizes = np.ones(n_symbols)
+        for i, symbol in enumerate(table.symbols):
+            if symbol in quotes:
+                bids[i], asks[i] = quotes[symbol]
+            if contract_sizes and symbol in contract_sizes:
+                sizes[i] = contract_sizes[symbol]
+
+        symbol_ids = rows['symbol']
+        direction = rows['direction'].astype(np.float64)
+        price_open = rows['price_open']
+        exit_price = np.where(direction > 0, bids[symbol_ids], asks[symbol_ids])
+
+        points = (exit_price - price_open) * direction
+        pnl = points * rows['volume'] * sizes[symbol_ids]
+        pnl_pct = points / price_open * 100
+        best = self._best_moves(rows['ticket'].astype(np.int64), np.nan_to_num(pnl_pct, nan=-np.inf))
+
+        reasons = np.full(len(rows), HOLD, dtype=np.int8)
+        nan = np.full(len(rows), np.nan)
+        be_level = nan.copy()
+        trail_level = nan.copy()
+
+        # Later checks take priority over earlier ones
+        if self.trailing_stop is not None:
+            armed = best >= self.trailing_stop
+            stop_pct = best - self.trailing_stop
+            trail_level = np.where(armed, price_open * (1 + direction * stop_pct / 100), np.nan)
+            reasons[armed & (pnl_pct <= stop_pct)] = TRAILING_STOP
+        if self.break_even is not None:
+            armed = best >= self.break_even
+            be_level = np.where(armed, price_open, np.nan)
+            reasons[armed & (pnl_pct <= 0)] = BREAK_EVEN
+        if self.take_profit is not None:
+            reasons[pnl_pct >= self.take_profit] = TAKE_PROFIT
+        if self.stop_loss is not None:
+            reasons[pnl_pct <= -self.stop_loss] = STOP_LOSS
+
+        # Positions without a quote are never closed
+        reasons[np.isnan(exit_price)] = HOLD
+        return ExitDecision(rows['ticket'].copy(), exit_price, pnl, pnl_pct, be_level, trail_level, reasons)
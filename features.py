@@ -0,0 +1,206 @@
+import argparse
+import logging
+import pickle
+import time
+
+import numpy as np
+
+from indicators import interface_indicators
+
+# Fixed feature layout. Every feature is scale free (ratios to the close or
+# to 100 for RSI) so one model can score several symbols.
+FEATURES = ('ema_gap', 'close_gap', 'rsi', 'macd', 'macd_hist', 'atr_pct', 'range_pct', 'body_pct')
+N_FEATURES = len(FEATURES)
+
+
+def feature_row(values, out=None):
+    """Fill a float32 row from one bar's indicator values
+
+    values is an IndicatorSet result (EMA20, EMA50, RSI, MACD, ATR) plus
+    the bar's open, high, low and close, as TickBarBuilder.evaluate()
+    returns it. Features are NaN while an indicator is still warming up.
+    """
+    if out is None:
+        out = np.empty(N_FEATURES, dtype=np.float32)
+    close = values['close']
+    ema_fast, ema_slow = values['EMA20'], values['EMA50']
+    macd, macd_signal = values['MACD']
+    out[0] = (ema_fast - ema_slow) / close
+    out[1] = (close - ema_fast) / close
+    out[2] = values['RSI'] / 100
+    out[3] = macd / close
+    out[4] = (macd - macd_signal) / close
+    out[5] = values['ATR'] / close
+    out[6] = (values['high'] - values['low']) / close
+    out[7] = (close - values['open']) / close
+    return out
+
+
+def batch_features(rates, indicators=None):
+    """(n_bars, N_FEATURES) float32 matrix for closed bars, for training
+
+    Bars go through the same incremental indicators the live engine uses,
+    so row i equals the closed-bar row ModelStrategy scores once bar i has
+    closed.
+    """
+    indicators = indicators or interface_indicators()
+    matrix = np.empty((len(rates), N_FEATURES), dtype=np.float32)
+    for i, bar in enumerate(rates):
+        values = indicators.update(bar)
+        for field in ('open', 'high', 'low', 'close'):
+            values[field] = float(bar[field])
+        feature_row(values, matrix[i])
+    return matrix
+
+
+def forward_returns(close, horizon=5):
+    """Return over the next horizon bars as float32 (NaN at the end)"""
+    close = np.asarray(close, dtype=np.float64)
+    returns = np.full(len(close), np.nan, dtype=np.float32)
+    if len(close) > horizon:
+        returns[:-horizon] = close[horizon:] / close[:-horizon] - 1
+    return returns
+
+
+def up_labels(close, horizon=5):
+    """Classification label: 1.0 when the close is higher horizon bars later, else 0.0 (NaN at the end)
+
+    A classifier trained on these labels scores the probability of an up
+    move, which is what ModelStrategy's buy_above/sell_below thresholds
+    expect.
+    """
+    returns = forward_returns(close, horizon)
+    return np.where(np.isnan(returns), np.nan, (returns > 0).astype(np.float32)).astype(np.float32)
+
+
+class SklearnModel:
+    """scikit-learn style estimator; scores are the positive-class probability when available"""
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self.proba = hasattr(estimator, 'predict_proba')
+
+    def predict(self, X):
+        if self.proba:
+            return np.asarray(self.estimator.predict_proba(X))[:, -1]
+        return np.asarray(self.estimator.predict(X), dtype=np.float64).ravel()
+
+
+class OnnxModel:
+    """ONNX Runtime CPU session taking the float32 feature matrix as its only input"""
+
+    def __init__(self, path, threads=1):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, X):
+        outputs = self.session.run(None, {self.input_name: X})
+        # Classifiers export labels then probabilities; prefer the last 2-D array
+        for output in reversed(outputs):
+            if isinstance(output, np.ndarray) and output.ndim == 2:
+                return output[:, -1]
+        return np.asarray(outputs[0], dtype=np.float64).ravel()
+
+
+def load_model(path):
+    """OnnxModel for .onnx files, otherwise a pickled scikit-learn estimator"""
+    if path.endswith('.onnx'):
+        return OnnxModel(path)
+    with open(path, 'rb') as f:
+        return SklearnModel(pickle.load(f))
+
+
+class InferenceStage:
+    """Batched, cached model scores for many symbols
+
+    submit() writes a symbol's feature row into a shared float32 matrix
+    and marks it pending only when the row changed, so repeated ticks on
+    an unchanged bar cost nothing. run() scores pending rows in a single
+    predict call. The per-row cost is tracked, and a batch is cut to what
+    fits in budget_ms; the remainder goes first in the next run.
+    """
+
+    def __init__(self, model, symbols, budget_ms=5.0):
+        self.model = model
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.budget_ms = budget_ms
+        self.matrix = np.full((len(self.symbols), N_FEATURES), np.nan, dtype=np.float32)
+        self.scores = np.full(len(self.symbols), np.nan)
+        self.pending = []
+        self.row = np.empty(N_FEATURES, dtype=np.float32)
+        self.row_ms = None  # Smoothed inference cost per row
+        self.stats = {'runs': 0, 'rows': 0, 'cache_hits': 0, 'deferred': 0, 'over_budget': 0, 'last_ms': 0.0}
+
+    def submit(self, symbol, values):
+        """Queue symbol for scoring if its features changed; returns True when queued"""
+        i = self.index[symbol]
+        feature_row(values, self.row)
+        if np.array_equal(self.row, self.matrix[i], equal_nan=True):
+            self.stats['cache_hits'] += 1
+            return False
+        self.matrix[i] = self.row
+        if np.isnan(self.row).any():
+            self.scores[i] = np.nan
+            return False
+        if i not in self.pending:
+            self.pending.append(i)
+        return True
+
+    def run(self):
+        """Score pending rows within the latency budget; returns the symbols scored"""
+        if not self.pending:
+            return []
+        limit = len(self.pending)
+        if self.row_ms:
+            limit = max(1, min(limit, int(self.budget_ms / self.row_ms)))
+        rows, self.pending = self.pending[:limit], self.pending[limit:]
+        self.stats['deferred'] += len(self.pending)
+
+        started = time.perf_counter()
+        self.scores[rows] = self.model.predict(self.matrix[rows])
+        elapsed = (time.perf_counter() - started) * 1000
+        per_row = elapsed / len(rows)
+        self.row_ms = per_row if self.row_ms is None else 0.8 * self.row_ms + 0.2 * per_row
+
+        self.stats['runs'] += 1
+        self.stats['rows'] += len(rows)
+        self.stats['last_ms'] = elapsed
+        if elapsed > self.budget_ms:
+            self.stats['over_budget'] += 1
+            logging.warning(f"Model inference took {elapsed:.2f} ms for {len(rows)} row(s), budget {self.budget_ms} ms")
+        return [self.symbols[i] for i in rows]
+
+    def score(self, symbol):
+        """Latest score for symbol, or None before its first complete feature row"""
+        value = self.scores[self.index[symbol]]
+        return None if value != value else float(value)
+
+
+def main():
+    from backtest import load_history
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Export a training feature matrix from OHLC history")
+    parser.add_argument('history', help="CSV of bars exported from MT5")
+    parser.add_argument('--out', default='features.npz')
+    parser.add_argument('--horizon', type=int, default=5, help="Label: close higher after this many bars")
+    args = parser.parse_args()
+
+    df = load_history(args.history)
+    if 'open' not in df.columns:
+        df['open'] = df['close'].shift(1).fillna(df['close'])
+    rates = df[['open', 'high', 'low', 'close']].to_records(index=False)
+    X = batch_features(rates)
+    y = up_labels(df['close'], args.horizon)
+    returns = forward_returns(df['close'], args.horizon)
+    np.savez(args.out, X=X, y=y, returns=returns, features=np.array(FEATURES))
+    usable = int((~np.isnan(X).any(axis=1) & ~np.isnan(y)).sum())
+    print(f"Wrote {len(X)} rows x {N_FEATURES} features to {args.out} ({usable} complete)")
+
+
+if __name__ == '__main__':
+    main()
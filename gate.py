@@ -0,0 +1,71 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+# Reasons an order is held back, counted in ExecutionGate.stats
+DUPLICATE = 'duplicate'
+COOLDOWN = 'cooldown'
+IN_FLIGHT = 'in_flight'
+
+
+class ExecutionGate:
+    """Lets each trading signal through to order_send at most once
+
+    Orders are identified by (symbol, side) with side +1 for buys and -1
+    for sells, plus an idempotency key naming the signal, e.g. symbol,
+    side and bar time. An order is held back when its
+    key was already sent, when another order on the same symbol and side
+    is still in flight, or within cooldown seconds of the last one. A key
+    whose order failed is forgotten, so the signal may retry after the
+    cooldown.
+    """
+
+    def __init__(self, cooldown=5.0, in_flight_timeout=30.0, max_keys=1024):
+        self.cooldown = cooldown
+        self.in_flight_timeout = in_flight_timeout
+        self.max_keys = max_keys
+        self.keys = OrderedDict()
+        self.last_sent = {}
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.stats = {'admitted': 0, DUPLICATE: 0, COOLDOWN: 0, IN_FLIGHT: 0}
+
+    def check(self, symbol, side, key=None, now=None):
+        """Reason the order would be held back, or None; changes nothing"""
+        now = time.monotonic() if now is None else now
+        if key is not None and key in self.keys:
+            return DUPLICATE
+        started = self.in_flight.get((symbol, side))
+        if started is not None and now - started < self.in_flight_timeout:
+            return IN_FLIGHT
+        last = self.last_sent.get((symbol, side))
+        if last is not None and now - last < self.cooldown:
+            return COOLDOWN
+        return None
+
+    def admit(self, symbol, side, key=None):
+        """Claim the right to send; call complete() with the outcome when True is returned"""
+        now = time.monotonic()
+        with self.lock:
+            reason = self.check(symbol, side, key, now)
+            if reason is not None:
+                self.stats[reason] += 1
+                return False
+            self.in_flight[(symbol, side)] = now
+            self.last_sent[(symbol, side)] = now
+            if key is not None:
+                self.keys[key] = now
+                while len(self.keys) > self.max_keys:
+                    self.keys.popitem(last=False)
+            self.stats['admitted'] += 1
+            return True
+
+    def complete(self, symbol, side, key=None, success=True):
+        """Clear the in-flight order; a failed order releases its key"""
+        with self.lock:
+            self.in_flight.pop((symbol, side), None)
+            if not success and key is not None:
+                self.keys.pop(key, None)
+        if not success:
+            logging.info(f"Order {key or symbol} failed, signal may retry after the cooldown")
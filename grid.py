@@ -0,0 +1,168 @@
+import logging
+from bisect import bisect_left, bisect_right, insort
+
+from lazy import LazyModule
+from records import MAGIC
+
+mt5 = LazyModule('MetaTrader5')
+
+
+class GridLevels:
+    """Grid prices spaced a fixed percentage around an anchor
+
+    Level prices are kept sorted and the unfilled ones in a second sorted
+    list, so the nearest free level above or below a price is a bisect.
+    """
+
+    def __init__(self, anchor, spacing, levels_per_side):
+        self.anchor = anchor
+        self.spacing = spacing
+        self.step = anchor * spacing / 100
+        self.prices = [anchor + k * self.step for k in range(-levels_per_side, levels_per_side + 1) if k != 0]
+        self.free = list(self.prices)
+
+    def contains(self, price):
+        """Whether price lies within the grid (half a step beyond the outer levels)"""
+        return self.prices[0] - self.step / 2 <= price <= self.prices[-1] + self.step / 2
+
+    def level_of(self, price):
+        """Grid level price nearest to price, or None when it is off the grid"""
+        i = bisect_left(self.prices, price)
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(self.prices)]
+        if not candidates:
+            return None
+        level = min((self.prices[j] for j in candidates), key=lambda p: abs(p - price))
+        return level if abs(level - price) <= self.step / 2 else None
+
+    def is_free(self, level):
+        i = bisect_left(self.free, level)
+        return i < len(self.free) and self.free[i] == level
+
+    def occupy(self, price):
+        """Mark the level nearest to price as filled; returns that level or None"""
+        level = self.level_of(price)
+        if level is not None and self.is_free(level):
+            del self.free[bisect_left(self.free, level)]
+        return level
+
+    def release(self, level):
+        if bisect_left(self.free, level) == bisect_right(self.free, level):
+            insort(self.free, level)
+
+    def reset(self):
+        self.free = list(self.prices)
+
+    def free_below(self, price):
+        """Nearest unfilled level strictly below price"""
+        i = bisect_left(self.free, price)
+        return self.free[i - 1] if i else None
+
+    def free_above(self, price):
+        """Nearest unfilled level strictly above price"""
+        i = bisect_right(self.free, price)
+        return self.free[i] if i < len(self.free) else None
+
+
+class GridEngine:
+    """Places pending limit orders on a price grid instead of stacking market orders
+
+    Buy limits go on free levels below the price and sell limits on free
+    levels above it, up to max_positions per direction counting both
+    open positions and pending orders. A level holding an order or a
+    position is never used twice. When the price leaves the grid it is
+    rebuilt around the new price, and pending orders that are not on a
+    free level of the new grid are cancelled.
+    """
+
+    def __init__(self, bot, spacing=None, levels_per_side=10):
+        self.bot = bot
+        self.fixed_spacing = spacing
+        self.levels_per_side = levels_per_side
+        self.levels = None
+
+    @property
+    def spacing(self):
+        """Fixed spacing if given, otherwise the bot's current grid_spacing"""
+        return self.fixed_spacing if self.fixed_spacing is not None else self.bot.grid_spacing
+
+    def rebuild(self, anchor):
+        self.levels = GridLevels(anchor, self.spacing, self.levels_per_side)
+        logging.info(f"Grid anchored at {anchor} with {self.spacing}% spacing")
+
+    def sync(self, orders):
+        """Mark levels taken by the bot's pending orders and open positions
+
+        Returns (per-direction counts, stale orders): an order is stale when
+        it is off the grid or on a level already taken, and is not counted.
+        """
+        self.levels.reset()
+        counts = {1: 0, -1: 0}
+        positions = self.bot.positions
+        rows = positions.rows[positions.mask(self.bot.symbol, magic=MAGIC)]
+        for price, direction in zip(rows['price_open'].tolist(), rows['direction'].tolist()):
+            self.levels.occupy(price)
+            counts[direction] += 1
+        stale = []
+        for order in orders:
+            level = self.levels.level_of(order.price_open)
+            if level is None or not self.levels.is_free(level):
+                stale.append(order)
+                continue
+            self.levels.occupy(level)
+            counts[order_direction(order)] += 1
+        return counts, stale
+
+    def update(self, price, volume, buy=False, sell=False):
+        """Top up pending orders for the enabled sides; returns the number of orders placed
+
+        Pending orders of a disabled side are cancelled. Call after
+        bot.refresh_positions() so the position table is current.
+        """
+        if self.levels is None or not self.levels.contains(price) or self.levels.spacing != self.spacing:
+            self.rebuild(price)
+        orders = self.bot.get_pending_orders()
+        if orders is None:
+            return 0
+        counts, stale = self.sync(orders)
+        for order in stale:
+            # Left over from an earlier anchor; one that cannot be cancelled still counts
+            if self.bot.cancel_order(order.ticket) is None:
+                counts[order_direction(order)] += 1
+        orders = [order for order in orders if order not in stale]
+
+        placed = 0
+        for direction, enabled in ((1, buy), (-1, sell)):
+            if not enabled:
+                for order in orders:
+                    if order_direction(order) == direction:
+                        self.bot.cancel_order(order.ticket)
+                continue
+            next_level = self.levels.free_below if direction > 0 else self.levels.free_above
+            while counts[direction] < self.bot.max_positions:
+                level = next_level(price)
+                if level is None:
+                    break
+                if not self.place(direction, level, volume):
+                    break
+                self.levels.occupy(level)
+                counts[direction] += 1
+                placed += 1
+        return placed
+
+    def place(self, direction, level, volume):
+        bot = self.bot
+        if direction > 0:
+            order_type = mt5.ORDER_TYPE_BUY_LIMIT
+            sl = level * (1 - bot.stop_loss / 100)
+            tp = level * (1 + bot.take_profit / 100)
+        else:
+            order_type = mt5.ORDER_TYPE_SELL_LIMIT
+            sl = level * (1 + bot.stop_loss / 100)
+            tp = level * (1 - bot.take_profit / 100)
+        return bot.place_pending_order(order_type, volume, level, sl, tp)
+
+
+def order_direction(order):
+    """+1 for buy-side pending orders, -1 for sell-side ones"""
+    buy_types = (mt5.ORDER_TYPE_BUY_LIMIT, mt5.ORDER_TYPE_BUY_STOP, mt5.ORDER_TYPE_BUY_STOP_LIMIT)
+    return 1 if order.type in buy_types else -1
@@ -0,0 +1,259 @@
+import math
+
+# Incremental indicators. Each one is updated once per closed bar with update(bar)
+# and can be evaluated on the still-forming bar with peek(bar), which reads the
+# committed state without changing it, so intra-bar evaluation never has to be
+# rolled back. Both calls are O(1). Bars are anything indexable by 'high', 'low'
+# and 'close' (a rates record or a dict). state() returns plain JSON-friendly
+# data that load_state() restores exactly, for warm restarts.
+
+
+def _check(state, **expected):
+    """Reject state saved with different indicator settings"""
+    for key, value in expected.items():
+        if state.get(key) != value:
+            raise ValueError(f"Indicator {key} mismatch: saved {state.get(key)}, expected {value}")
+
+
+class RollingMean:
+    """O(1) rolling mean over a fixed window"""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = [0.0] * window
+        self.count = 0
+        self.total = 0.0
+
+    def update(self, value):
+        slot = self.count % self.window
+        if self.count >= self.window:
+            self.total -= self.values[slot]
+        self.values[slot] = value
+        self.total += value
+        self.count += 1
+        return self.value
+
+    @property
+    def value(self):
+        if self.count < self.window:
+            return math.nan
+        return self.total / self.window
+
+    def peek(self, value):
+        """Mean if value were the next element"""
+        if self.count + 1 < self.window:
+            return math.nan
+        oldest = self.values[self.count % self.window] if self.count >= self.window else 0.0
+        return (self.total - oldest + value) / self.window
+
+    def state(self):
+        return {'window': self.window, 'values': list(self.values), 'count': self.count, 'total': self.total}
+
+    def load_state(self, state):
+        _check(state, window=self.window)
+        self.values = [float(v) for v in state['values']]
+        self.count = int(state['count'])
+        self.total = float(state['total'])
+
+
+class EMA:
+    """Exponential moving average of the close (pandas ewm(span, adjust=False))"""
+
+    def __init__(self, span):
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+        self.value = math.nan
+
+    def _next(self, close):
+        if math.isnan(self.value):
+            return close
+        return self.value + self.alpha * (close - self.value)
+
+    def update(self, bar):
+        self.value = self._next(float(bar['close']))
+        return self.value
+
+    def peek(self, bar):
+        return self._next(float(bar['close']))
+
+    def state(self):
+        return {'span': self.span, 'value': self.value}
+
+    def load_state(self, state):
+        _check(state, span=self.span)
+        self.value = float(state['value'])
+
+
+class SMA:
+    """Simple moving average of the close"""
+
+    def __init__(self, window):
+        self.mean = RollingMean(window)
+
+    @property
+    def value(self):
+        return self.mean.value
+
+    def update(self, bar):
+        return self.mean.update(float(bar['close']))
+
+    def peek(self, bar):
+        return self.mean.peek(float(bar['close']))
+
+    def state(self):
+        return {'mean': self.mean.state()}
+
+    def load_state(self, state):
+        self.mean.load_state(state['mean'])
+
+
+def _rsi(gain, loss):
+    if math.isnan(gain) or math.isnan(loss):
+        return math.nan
+    if loss == 0:
+        return 100.0 if gain > 0 else math.nan
+    return 100 - (100 / (1 + gain / loss))
+
+
+class RSI:
+    """RSI with simple rolling averages, same as trading_bot.calculate_rsi"""
+
+    def __init__(self, period=14):
+        self.period = period
+        self.gains = RollingMean(period)
+        self.losses = RollingMean(period)
+        self.prev_close = None
+        self.value = math.nan
+
+    def update(self, bar):
+        close = float(bar['close'])
+        if self.prev_close is not None:
+            delta = close - self.prev_close
+            self.value = _rsi(self.gains.update(max(delta, 0.0)), self.losses.update(max(-delta, 0.0)))
+        self.prev_close = close
+        return self.value
+
+    def peek(self, bar):
+        if self.prev_close is None:
+            return math.nan
+        delta = float(bar['close']) - self.prev_close
+        return _rsi(self.gains.peek(max(delta, 0.0)), self.losses.peek(max(-delta, 0.0)))
+
+    def state(self):
+        return {
+            'period': self.period, 'gains': self.gains.state(), 'losses': self.losses.state(),
+            'prev_close': self.prev_close, 'value': self.value,
+        }
+
+    def load_state(self, state):
+        _check(state, period=self.period)
+        self.gains.load_state(state['gains'])
+        self.losses.load_state(state['losses'])
+        self.prev_close = state['prev_close']
+        self.value = float(state['value'])
+
+
+class ATR:
+    """Average true range with a simple rolling mean"""
+
+    def __init__(self, period=14):
+        self.period = period
+        self.ranges = RollingMean(period)
+        self.prev_close = None
+
+    @property
+    def value(self):
+        return self.ranges.value
+
+    def _true_range(self, bar):
+        high, low = float(bar['high']), float(bar['low'])
+        if self.prev_close is None:
+            return high - low
+        return max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+
+    def update(self, bar):
+        value = self.ranges.update(self._true_range(bar))
+        self.prev_close = float(bar['close'])
+        return value
+
+    def peek(self, bar):
+        return self.ranges.peek(self._true_range(bar))
+
+    def state(self):
+        return {'period': self.period, 'ranges': self.ranges.state(), 'prev_close': self.prev_close}
+
+    def load_state(self, state):
+        _check(state, period=self.period)
+        self.ranges.load_state(state['ranges'])
+        self.prev_close = state['prev_close']
+
+
+class MACD:
+    """MACD line and signal line from EMAs of the close"""
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+
+    @property
+    def value(self):
+        return self.fast.value - self.slow.value, self.signal.value
+
+    def update(self, bar):
+        macd = self.fast.update(bar) - self.slow.update(bar)
+        signal = self.signal.update({'close': macd})
+        return macd, signal
+
+    def peek(self, bar):
+        macd = self.fast.peek(bar) - self.slow.peek(bar)
+        return macd, self.signal.peek({'close': macd})
+
+    def state(self):
+        return {'fast': self.fast.state(), 'slow': self.slow.state(), 'signal': self.signal.state()}
+
+    def load_state(self, state):
+        self.fast.load_state(state['fast'])
+        self.slow.load_state(state['slow'])
+        self.signal.load_state(state['signal'])
+
+
+class IndicatorSet:
+    """Named group of incremental indicators updated together"""
+
+    def __init__(self, indicators):
+        self.indicators = indicators
+
+    def update(self, bar):
+        return {name: ind.update(bar) for name, ind in self.indicators.items()}
+
+    def peek(self, bar):
+        return {name: ind.peek(bar) for name, ind in self.indicators.items()}
+
+    def state(self):
+        return {name: ind.state() for name, ind in self.indicators.items()}
+
+    def load_state(self, state):
+        """Restore every indicator; raises ValueError if the set or its periods differ"""
+        if set(state) != set(self.indicators):
+            raise ValueError(f"Indicator set mismatch: {sorted(state)} != {sorted(self.indicators)}")
+        for name, ind in self.indicators.items():
+            ind.load_state(state[name])
+
+
+def interface_indicators():
+    """The fast indicator set used by the GUI auto-trading loop
+
+    SMA20, SMA50 and RSI14 are the periods of trading_bot.main's rules,
+    for the trend_rsi strategy plugin.
+    """
+    return IndicatorSet({
+        'EMA20': EMA(5),
+        'EMA50': EMA(10),
+        'RSI': RSI(5),
+        'MACD': MACD(5, 10, 3),
+        'ATR': ATR(5),
+        'SMA20': SMA(20),
+        'SMA50': SMA(50),
+        'RSI14': RSI(14),
+    })
@@ -0,0 +1,256 @@
+import argparse
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from lazy import LazyModule
+
+mt5 = LazyModule('MetaTrader5')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deals (
+    ticket      INTEGER PRIMARY KEY,
+    order_id    INTEGER,
+    position_id INTEGER,
+    time_msc    INTEGER NOT NULL,
+    symbol      TEXT NOT NULL,
+    type        INTEGER,
+    entry       INTEGER,
+    reason      INTEGER,
+    volume      REAL,
+    price       REAL,
+    profit      REAL,
+    commission  REAL,
+    swap        REAL,
+    fee         REAL,
+    net         REAL,
+    magic       INTEGER,
+    comment     TEXT
+);
+CREATE INDEX IF NOT EXISTS deals_time ON deals (time_msc);
+CREATE INDEX IF NOT EXISTS deals_closed ON deals (time_msc, ticket, net, symbol, magic) WHERE entry IN (1, 2, 3);
+CREATE INDEX IF NOT EXISTS deals_symbol_time ON deals (symbol, time_msc);
+CREATE INDEX IF NOT EXISTS deals_magic_time ON deals (magic, time_msc);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key   TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+DEAL_COLUMNS = ('ticket', 'order_id', 'position_id', 'time_msc', 'symbol', 'type', 'entry', 'reason',
+                'volume', 'price', 'profit', 'commission', 'swap', 'fee', 'net', 'magic', 'comment')
+
+# Deals that close (part of) a position (DEAL_ENTRY_OUT, DEAL_ENTRY_INOUT, DEAL_ENTRY_OUT_BY);
+# must match the deals_closed partial index so reports scan only that index
+CLOSING = "entry IN (1, 2, 3)"
+
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def deal_row(deal):
+    """Row tuple in DEAL_COLUMNS order for an MT5 TradeDeal"""
+    net = deal.profit + deal.commission + deal.swap + deal.fee
+    return (deal.ticket, deal.order, deal.position_id, deal.time_msc, deal.symbol, deal.type, deal.entry,
+            deal.reason, deal.volume, deal.price, deal.profit, deal.commission, deal.swap, deal.fee,
+            net, deal.magic, deal.comment)
+
+
+class TradeJournal:
+    """SQLite trade journal fed from history_deals_get
+
+    Deals are queued and written by a background thread in batched
+    transactions, so syncing never blocks the trading loop on disk I/O.
+    Each sync only fetches the range since the newest deal already
+    stored (with a small overlap; duplicates are ignored by ticket).
+    """
+
+    def __init__(self, path='journal.db', lookback_days=30, overlap=60, batch_size=1000, batch_wait=0.5):
+        self.path = path
+        self.lookback_days = lookback_days
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.queue = queue.Queue()
+        self.conn = connect(path)
+        row = self.conn.execute("SELECT value FROM sync_state WHERE key = 'last_time_msc'").fetchone()
+        self.last_time_msc = row[0] if row else 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write_deals(self, rows):
+        """Queue deal rows for the writer"""
+        if rows:
+            self.queue.put(rows)
+
+    def _run(self):
+        while True:
+            rows = self.queue.get()
+            if rows is None:
+                return
+            batch = list(rows)
+            deadline = time.monotonic() + self.batch_wait
+            # Fold whatever else arrives shortly into the same transaction
+            while len(batch) < self.batch_size:
+                try:
+                    more = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if more is None:
+                    self._write(batch)
+                    return
+                batch.extend(more)
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    f"INSERT OR IGNORE INTO deals ({', '.join(DEAL_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(DEAL_COLUMNS))})", batch
+                )
+                self.conn.execute(
+                    "INSERT INTO sync_state (key, value) VALUES ('last_time_msc', ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)",
+                    (max(row[3] for row in batch),)
+                )
+        except sqlite3.Error as e:
+            logging.error(f"Failed to write {len(batch)} deal(s) to journal: {str(e)}")
+
+    def sync(self):
+        """Fetch deals since the last sync and queue them; returns the number fetched"""
+        # history_deals_get takes UTC datetimes; deal times are epochs on the same scale
+        now = datetime.now(timezone.utc)
+        if self.last_time_msc:
+            start = datetime.fromtimestamp(self.last_time_msc / 1000 - self.overlap, tz=timezone.utc)
+        else:
+            start = now - timedelta(days=self.lookback_days)
+        # Server time can run ahead of local time, so look a day past now
+        deals = mt5.history_deals_get(start, now + timedelta(days=1))
+        if deals is None:
+            logging.error(f"history_deals_get failed: {mt5.last_error()}")
+            return 0
+        rows = [deal_row(deal) for deal in deals if deal.time_msc >= self.last_time_msc - self.overlap * 1000]
+        if rows:
+            self.last_time_msc = max(self.last_time_msc, max(row[3] for row in rows))
+            self.write_deals(rows)
+        return len(rows)
+
+    def close(self):
+        """Write everything queued and stop the writer"""
+        self.queue.put(None)
+        self.thread.join()
+        self.conn.close()
+
+
+def _epoch_msc(when):
+    # Naive dates are UTC, like the deal times they are compared with
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return int(when.timestamp() * 1000)
+
+
+def _filters(symbol=None, magic=None, since=None, until=None):
+    clauses, params = [CLOSING], []
+    if symbol:
+        clauses.append("symbol = ?")
+        params.append(symbol)
+    if magic is not None:
+        clauses.append("magic = ?")
+        params.append(magic)
+    if since is not None:
+        clauses.append("time_msc >= ?")
+        params.append(_epoch_msc(since))
+    if until is not None:
+        clauses.append("time_msc < ?")
+        params.append(_epoch_msc(until))
+    return " AND ".join(clauses), params
+
+
+def report(conn, symbol=None, magic=None, since=None, until=None):
+    """P&L, win rate, profit factor and max drawdown of closing deals
+
+    One ordered scan of the deals_closed covering index feeds NumPy,
+    which computes every statistic including the running drawdown.
+    """
+    where, params = _filters(symbol, magic, since, until)
+    cursor = conn.execute(f"SELECT net FROM deals WHERE {where} ORDER BY time_msc, ticket", params)
+    net = np.fromiter((row[0] for row in cursor), dtype=np.float64)
+    if len(net) == 0:
+        return {'trades': 0, 'net_profit': 0.0, 'win_rate': 0.0, 'profit_factor': None, 'max_drawdown': 0.0}
+    equity = np.cumsum(net)
+    peak = np.maximum.accumulate(np.concatenate(([0.0], equity)))[1:]
+    gross_loss = -net[net < 0].sum()
+    return {
+        'trades': len(net),
+        'net_profit': float(equity[-1]),
+        'win_rate': float(np.mean(net > 0)),
+        'profit_factor': float(net[net > 0].sum() / gross_loss) if gross_loss else None,
+        'max_drawdown': float((peak - equity).max()),
+    }
+
+
+def report_by(conn, group, symbol=None, magic=None, since=None, until=None):
+    """Net profit, trade count and wins per 'symbol', 'day' or 'magic'"""
+    key = {
+        'symbol': "symbol",
+        'magic': "magic",
+        'day': "date(time_msc / 1000, 'unixepoch')",
+    }[group]
+    where, params = _filters(symbol, magic, since, until)
+    return conn.execute(
+        f"SELECT {key}, COUNT(*), SUM(net), SUM(net > 0) FROM deals WHERE {where} GROUP BY 1 ORDER BY 1",
+        params
+    ).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trade journal sync and reports")
+    parser.add_argument('command', choices=['report', 'sync'])
+    parser.add_argument('--db', default='journal.db')
+    parser.add_argument('--symbol', default=None)
+    parser.add_argument('--magic', type=int, default=None)
+    parser.add_argument('--since', type=datetime.fromisoformat, default=None, help="YYYY-MM-DD (UTC)")
+    parser.add_argument('--until', type=datetime.fromisoformat, default=None, help="YYYY-MM-DD (UTC)")
+    parser.add_argument('--by', choices=['symbol', 'day', 'magic'], default=None)
+    parser.add_argument('--days', type=int, default=30, help="History to fetch on the first sync")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'sync':
+        if not mt5.initialize():
+            logging.error(f"MT5 initialization failed: {mt5.last_error()}")
+            return
+        journal = TradeJournal(args.db, lookback_days=args.days)
+        logging.info(f"Fetched {journal.sync()} deal(s)")
+        journal.close()
+        mt5.shutdown()
+        return
+
+    started = time.perf_counter()
+    conn = connect(args.db)
+    summary = report(conn, args.symbol, args.magic, args.since, args.until)
+    print(
+        f"Trades: {summary['trades']}  Net P&L: {summary['net_profit']:.2f}  "
+        f"Win rate: {summary['win_rate']:.1%}  Profit factor: {summary['profit_factor'] or 0:.2f}  "
+        f"Max drawdown: {summary['max_drawdown']:.2f}"
+    )
+    if args.by:
+        for key, trades, pnl, wins in report_by(conn, args.by, args.symbol, args.magic, args.since, args.until):
+            print(f"  {key!s:<14} trades={trades:<7} pnl={pnl:12.2f}  win rate={wins / trades:.1%}")
+    print(f"({time.perf_counter() - started:.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import argparse
+import logging
+import re
+import time
+
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+
+from connection import ConnectionSupervisor
+from lazy import LazyModule
+from timeframes import RATE_DTYPE
+
+mt5 = LazyModule('MetaTrader5')
+
+BUS_VERSION = 1
+
+# Header slots (int64)
+H_VERSION, H_TICK_CAPACITY, H_BAR_CAPACITY, H_TICK_SEQ, H_BAR_SEQ, H_FORMING_SEQ, H_HEARTBEAT = range(7)
+HEADER_SIZE = 8
+
+TICK_SLOT_DTYPE = np.dtype([
+    ('seq', 'i8'), ('time_msc', 'i8'), ('bid', 'f8'), ('ask', 'f8'), ('last', 'f8'), ('volume', 'f8'),
+], align=True)
+BAR_SLOT_DTYPE = np.dtype([('seq', 'i8'), ('bar', RATE_DTYPE)], align=True)
+
+
+def segment_name(symbol):
+    return "mtbus_" + re.sub(r'[^A-Za-z0-9]', '_', symbol)
+
+
+class SymbolChannel:
+    """Shared-memory layout for one symbol: header, tick ring, closed M1 bar ring, forming bar
+
+    Ring slots carry the sequence number they were written with. The
+    single writer marks a slot -1 while writing it and publishes the new
+    head in the header afterwards; readers copy a range and keep only the
+    slots whose seq matches both in the copy and when re-read after it,
+    so a slot overwritten during the copy is detected without any lock. The forming bar uses a seqlock counter
+    that is odd while it is being written.
+    """
+
+    def __init__(self, shm):
+        self.shm = shm
+        self.header = np.ndarray(HEADER_SIZE, dtype=np.int64, buffer=shm.buf)
+        tick_capacity = int(self.header[H_TICK_CAPACITY])
+        bar_capacity = int(self.header[H_BAR_CAPACITY])
+        offset = self.header.nbytes
+        self.ticks = np.ndarray(tick_capacity, dtype=TICK_SLOT_DTYPE, buffer=shm.buf, offset=offset)
+        offset += self.ticks.nbytes
+        self.bars = np.ndarray(bar_capacity, dtype=BAR_SLOT_DTYPE, buffer=shm.buf, offset=offset)
+        offset += self.bars.nbytes
+        self.forming = np.ndarray(1, dtype=RATE_DTYPE, buffer=shm.buf, offset=offset)
+
+    @staticmethod
+    def size(tick_capacity, bar_capacity):
+        return (HEADER_SIZE * 8 + tick_capacity * TICK_SLOT_DTYPE.itemsize
+                + bar_capacity * BAR_SLOT_DTYPE.itemsize + RATE_DTYPE.itemsize)
+
+    @classmethod
+    def create(cls, symbol, tick_capacity=65536, bar_capacity=20000):
+        name = segment_name(symbol)
+        try:
+            # A segment left behind by a crashed publisher is replaced
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls.size(tick_capacity, bar_capacity))
+        header = np.ndarray(HEADER_SIZE, dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[H_TICK_CAPACITY] = tick_capacity
+        header[H_BAR_CAPACITY] = bar_capacity
+        header[H_VERSION] = BUS_VERSION
+        del header
+        return cls(shm)
+
+    @classmethod
+    def attach(cls, symbol):
+        shm = shared_memory.SharedMemory(name=segment_name(symbol))
+        # Readers must not unlink the publisher's segment when they exit
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        channel = cls(shm)
+        if channel.header[H_VERSION] != BUS_VERSION:
+            channel.close()
+            raise ValueError(f"Market data bus version mismatch for {symbol}")
+        return channel
+
+    # Writer side
+
+    def write_ticks(self, ticks):
+        """Append ticks (copy_ticks_from records) to the ring"""
+        capacity = len(self.ticks)
+        ticks = ticks[-capacity:]
+        head = int(self.header[H_TICK_SEQ])
+        seqs = np.arange(head, head + len(ticks))
+        idx = seqs % capacity
+        self.ticks['seq'][idx] = -1
+        for field in ('time_msc', 'bid', 'ask', 'last'):
+            self.ticks[field][idx] = ticks[field]
+        self.ticks['volume'][idx] = ticks['volume_real'] if 'volume_real' in ticks.dtype.names else ticks['volume']
+        self.ticks['seq'][idx] = seqs
+        self.header[H_TICK_SEQ] = head + len(ticks)
+
+    def write_bars(self, bars):
+        """Append closed M1 bars to the ring"""
+        capacity = len(self.bars)
+        bars = bars[-capacity:]
+        head = int(self.header[H_BAR_SEQ])
+        seqs = np.arange(head, head + len(bars))
+        idx = seqs % capacity
+        self.bars['seq'][idx] = -1
+        self.bars['bar'][idx] = bars
+        self.bars['seq'][idx] = seqs
+        self.header[H_BAR_SEQ] = head + len(bars)
+
+    def write_forming(self, bar):
+        self.header[H_FORMING_SEQ] += 1
+        self.forming[0] = bar
+        self.header[H_FORMING_SEQ] += 1
+
+    def heartbeat(self):
+        self.header[H_HEARTBEAT] = time.time_ns()
+
+    # Reader side
+
+    def read_range(self, ring, head_slot, next_seq):
+        """Slots from next_seq to the current head; returns (rows, new next_seq, lost count)"""
+        head = int(self.header[head_slot])
+        if head <= next_seq:
+            return ring[:0].copy(), next_seq, 0
+        start = max(next_seq, head - len(ring))
+        seqs = np.arange(start, head)
+        idx = seqs % len(ring)
+        rows = ring[idx]  # Fancy indexing copies
+        # A slot the writer touched during the copy has a different seq afterwards, so the row may be torn
+        valid = (rows['seq'] == seqs) & (ring['seq'][idx] == seqs)
+        lost = (start - next_seq) + int((~valid).sum())
+        return rows[valid], head, lost
+
+    def read_forming(self, retries=100):
+        for _ in range(retries):
+            before = int(self.header[H_FORMING_SEQ])
+            if before % 2:
+                continue
+            bar = self.forming[0].copy()
+            if int(self.header[H_FORMING_SEQ]) == before:
+                return bar if before else None
+        return None
+
+    def close(self):
+        self.header = self.ticks = self.bars = self.forming = None
+        self.shm.close()
+
+
+class MarketDataPublisher:
+    """Single process that polls MT5 for every symbol and publishes to shared memory"""
+
+    def __init__(self, symbols, tick_capacity=65536, bar_capacity=20000, interval=0.01,
+                 bar_interval=1.0, ticks_per_poll=10000):
+        self.symbols = list(symbols)
+        self.tick_capacity = tick_capacity
+        self.bar_capacity = bar_capacity
+        self.interval = interval
+        self.bar_interval = bar_interval
+        self.ticks_per_poll = ticks_per_poll
+        self.channels = {}
+        self.last_tick_msc = {}
+        self.last_bar_time = {}
+        self.bar_poll_time = 0.0
+        self.supervisor = ConnectionSupervisor(mt5.initialize)
+        self.running = False
+
+    def open(self):
+        for symbol in self.symbols:
+            self.channels[symbol] = SymbolChannel.create(symbol, self.tick_capacity, self.bar_capacity)
+            self.last_tick_msc[symbol] = int(time.time() * 1000) - 60000
+            self.last_bar_time[symbol] = 0
+
+    def poll_ticks(self, symbol):
+        last = self.last_tick_msc[symbol]
+        ticks = mt5.copy_ticks_from(symbol, last // 1000, self.ticks_per_poll, mt5.COPY_TICKS_ALL)
+        if ticks is None:
+            self.supervisor.report_failure()
+            return 0
+        ticks = ticks[ticks['time_msc'] > last]
+        if len(ticks):
+            self.channels[symbol].write_ticks(ticks)
+            self.last_tick_msc[symbol] = int(ticks['time_msc'][-1])
+        return len(ticks)
+
+    def poll_bars(self, symbol):
+        rates = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M1, 0, 3)
+        if rates is None or len(rates) == 0:
+            return
+        channel = self.channels[symbol]
+        closed = rates[:-1]
+        closed = closed[closed['time'] > self.last_bar_time[symbol]]
+        if len(closed):
+            channel.write_bars(closed.astype(RATE_DTYPE))
+            self.last_bar_time[symbol] = int(closed['time'][-1])
+        channel.write_forming(rates[-1].astype(RATE_DTYPE))
+
+    def run(self):
+        self.open()
+        self.running = True
+        self.supervisor.try_connect()
+        self.supervisor.start()
+        logging.info(f"Publishing market data for {', '.join(self.symbols)}")
+        try:
+            while self.running:
+                if not self.supervisor.wait_connected(1.0):
+                    continue
+                for symbol in self.symbols:
+                    self.poll_ticks(symbol)
+                if time.monotonic() - self.bar_poll_time >= self.bar_interval:
+                    self.bar_poll_time = time.monotonic()
+                    for symbol in self.symbols:
+                        self.poll_bars(symbol)
+                for channel in self.channels.values():
+                    channel.heartbeat()
+                time.sleep(self.interval)
+        finally:
+            self.close()
+
+    def close(self):
+        self.running = False
+        self.supervisor.stop()
+        for channel in self.channels.values():
+            shm = channel.shm
+            channel.close()
+            shm.unlink()
+        self.channels = {}
+
+
+class MarketDataReader:
+    """Lock-free reader of one symbol's channel; any number of processes can attach
+
+    read_ticks() has the same role as copy_ticks_from for a TickBarBuilder
+    (its tick_source), so strategies add no load on the terminal.
+    """
+
+    def __init__(self, symbol, from_start=False):
+        self.symbol = symbol
+        self.channel = SymbolChannel.attach(symbol)
+        header = self.channel.header
+        self.next_tick = 0 if from_start else int(header[H_TICK_SEQ])
+        self.next_bar = 0 if from_start else int(header[H_BAR_SEQ])
+        self.lost = 0  # Slots overwritten before this reader got to them
+
+    def read_ticks(self):
+        """Ticks published since the last call, as a structured array"""
+        rows, self.next_tick, lost = self.channel.read_range(self.channel.ticks, H_TICK_SEQ, self.next_tick)
+        self.lost += lost
+        return rows
+
+    def read_bars(self):
+        """Closed M1 bars published since the last call (RATE_DTYPE)"""
+        rows, self.next_bar, lost = self.channel.read_range(self.channel.bars, H_BAR_SEQ, self.next_bar)
+        self.lost += lost
+        return rows['bar']
+
+    def forming_bar(self):
+        return self.channel.read_forming()
+
+    def publisher_age(self):
+        """Seconds since the publisher's last heartbeat"""
+        return (time.time_ns() - int(self.channel.header[H_HEARTBEAT])) / 1e9
+
+    def close(self):
+        self.channel.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish MT5 ticks and M1 bars to shared memory")
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--tick-capacity', type=int, default=65536)
+    parser.add_argument('--bar-capacity', type=int, default=20000)
+    parser.add_argument('--interval', type=float, default=0.01, help="Seconds between tick polls")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    publisher = MarketDataPublisher(args.symbols, args.tick_capacity, args.bar_capacity, args.interval)
+    try:
+        publisher.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from backtest import IndicatorCache, load_history, run_backtest
+
+# Risk-per-trade fractions to evaluate, as the share of equity lost when the stop is hit.
+# trading_bot.main sizes by notional (0.1% of balance / price), not by the stop distance,
+# so its volume is not one of these levels.
+DEFAULT_RISK_LEVELS = (0.001, 0.0025, 0.005, 0.01, 0.02)
+
+
+def trade_arrays(trades):
+    """Extract the per-trade arrays the simulation needs from a backtest trade list"""
+    direction = trades['direction'].to_numpy(dtype=np.float64)
+    entry = trades['entry_price'].to_numpy(dtype=np.float64)
+    exit_price = trades['exit_price'].to_numpy(dtype=np.float64)
+    sl = trades['sl'].to_numpy(dtype=np.float64)
+    return {
+        'points': (exit_price - entry) * direction,
+        'risk_points': np.abs(entry - sl),
+        'is_sl': (trades['reason'] == 'SL').to_numpy(),
+        'is_tp': (trades['reason'] == 'TP').to_numpy(),
+    }
+
+
+def _simulate_batch(args):
+    """Run one batch of Monte Carlo paths, vectorized over paths and trades"""
+    arrays, n_paths, n_trades, risk_levels, costs, ruin_level, seed = args
+    rng = np.random.default_rng(seed)
+    n = len(arrays['points'])
+
+    # Resample trade orderings (bootstrap with replacement)
+    idx = rng.integers(0, n, size=(n_paths, n_trades))
+    points = arrays['points'][idx]
+    risk_points = arrays['risk_points'][idx]
+    is_sl = arrays['is_sl'][idx]
+    is_tp = arrays['is_tp'][idx]
+
+    # Spread and entry slippage are always adverse
+    spread = costs['spread'] * rng.uniform(0.5, 1.5, size=points.shape)
+    entry_slip = np.abs(rng.normal(0.0, costs['slippage'], size=points.shape))
+    points = points - spread - entry_slip
+
+    # Stop losses fill with extra adverse slippage, take profits can fill either side
+    sl_slip = np.abs(rng.normal(0.0, costs['sl_slippage'], size=points.shape))
+    tp_slip = rng.normal(0.0, costs['tp_slippage'], size=points.shape)
+    points = points - np.where(is_sl, sl_slip, 0.0) + np.where(is_tp, tp_slip, 0.0)
+
+    r_multiples = points / np.where(risk_points > 0, risk_points, np.nan)
+    r_multiples = np.nan_to_num(r_multiples, nan=0.0)
+
+    results = {}
+    for risk in risk_levels:
+        growth = np.maximum(1.0 + risk * r_multiples, 0.0)
+        equity = np.cumprod(growth, axis=1)
+        peak = np.maximum.accumulate(np.maximum(equity, 1.0), axis=1)
+        drawdown = 1.0 - equity / peak
+        results[risk] = {
+            'max_drawdown': drawdown.max(axis=1),
+            'final_equity': equity[:, -1],
+            'ruined': equity.min(axis=1) <= ruin_level,
+        }
+    return results
+
+
+class MonteCarloReport:
+    """Drawdown and ruin-probability distributions per risk level"""
+
+    def __init__(self, results, n_paths, n_trades):
+        self.results = results
+        self.n_paths = n_paths
+        self.n_trades = n_trades
+
+    def stats(self, risk):
+        r = self.results[risk]
+        dd = r['max_drawdown']
+        final = r['final_equity']
+        return {
+            'risk_per_trade': risk,
+            'ruin_probability': float(r['ruined'].mean()),
+            'drawdown_p50': float(np.percentile(dd, 50)),
+            'drawdown_p95': float(np.percentile(dd, 95)),
+            'drawdown_p99': float(np.percentile(dd, 99)),
+            'return_p5': float(np.percentile(final, 5) - 1.0),
+            'return_p50': float(np.percentile(final, 50) - 1.0),
+        }
+
+    def table(self):
+        return [self.stats(risk) for risk in sorted(self.results)]
+
+    def recommend_risk(self, max_ruin=0.01, max_drawdown_p95=0.2):
+        """Largest risk per trade that keeps ruin and tail drawdown inside the limits"""
+        best = None
+        for row in self.table():
+            if row['ruin_probability'] <= max_ruin and row['drawdown_p95'] <= max_drawdown_p95:
+                best = row['risk_per_trade']
+        return best
+
+
+class MonteCarloSimulator:
+    def __init__(self, n_paths=20000, batch_size=2000, n_trades=None, risk_levels=DEFAULT_RISK_LEVELS,
+                 spread=0.0, slippage=0.0, sl_slippage=0.0, tp_slippage=0.0,
+                 ruin_level=0.5, max_workers=None, seed=None):
+        self.n_paths = n_paths
+        self.batch_size = batch_size
+        self.n_trades = n_trades
+        self.risk_levels = tuple(risk_levels)
+        # Costs are in price units, same as the trade list
+        self.costs = {
+            'spread': spread,
+            'slippage': slippage,
+            'sl_slippage': sl_slippage,
+            'tp_slippage': tp_slippage,
+        }
+        self.ruin_level = ruin_level
+        self.max_workers = max_workers or os.cpu_count()
+        self.seed = seed
+        self.logger = logging.getLogger(__name__)
+
+    def run(self, trades):
+        """Simulate resampled and perturbed trade sequences across a process pool"""
+        if trades is None or len(trades) == 0:
+            raise ValueError("Monte Carlo analysis needs at least one trade")
+
+        arrays = trade_arrays(trades)
+        n_trades = self.n_trades or len(trades)
+        batches = []
+        remaining = self.n_paths
+        while remaining > 0:
+            batches.append(min(self.batch_size, remaining))
+            remaining -= batches[-1]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(batches))
+        jobs = [
+            (arrays, size, n_trades, self.risk_levels, self.costs, self.ruin_level, seed)
+            for size, seed in zip(batches, seeds)
+        ]
+
+        self.logger.info(
+            f"Monte Carlo: {self.n_paths} paths x {n_trades} trades in {len(jobs)} batches "
+            f"on {self.max_workers} workers"
+        )
+        if self.max_workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                parts = list(executor.map(_simulate_batch, jobs))
+        else:
+            parts = [_simulate_batch(job) for job in jobs]
+
+        results = {
+            risk: {key: np.concatenate([part[risk][key] for part in parts]) for key in parts[0][risk]}
+            for risk in self.risk_levels
+        }
+        return MonteCarloReport(results, self.n_paths, n_trades)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo robustness analysis of backtest trades")
+    parser.add_argument('history', help="CSV file with time, open, high, low, close columns")
+    parser.add_argument('--params', help="JSON file with strategy parameters (e.g. best_params.json)")
+    parser.add_argument('--paths', type=int, default=20000)
+    parser.add_argument('--spread', type=float, default=0.0, help="Spread in price units")
+    parser.add_argument('--slippage', type=float, default=0.0, help="Entry slippage std in price units")
+    parser.add_argument('--sl-slippage', type=float, default=0.0, help="Stop loss slippage std in price units")
+    parser.add_argument('--tp-slippage', type=float, default=0.0, help="Take profit slippage std in price units")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    params = None
+    if args.params:
+        with open(args.params) as f:
+            params = json.load(f)
+    result = run_backtest(IndicatorCache(load_history(args.history)), params)
+    logging.info(f"Backtest: {result.summary()}")
+
+    simulator = MonteCarloSimulator(
+        n_paths=args.paths,
+        spread=args.spread,
+        slippage=args.slippage,
+        sl_slippage=args.sl_slippage,
+        tp_slippage=args.tp_slippage,
+        max_workers=args.workers,
+        seed=args.seed,
+    )
+    report = simulator.run(result.trades)
+    for row in report.table():
+        logging.info(
+            f"Risk {row['risk_per_trade']:.2%}: ruin={row['ruin_probability']:.2%} "
+            f"DD p50={row['drawdown_p50']:.2%} p95={row['drawdown_p95']:.2%} "
+            f"p99={row['drawdown_p99']:.2%} return p50={row['return_p50']:.2%}"
+        )
+    recommended = report.recommend_risk()
+    if recommended is None:
+        logging.info("No tested risk level keeps ruin and drawdown within limits")
+    else:
+        logging.info(f"Recommended risk per trade: {recommended:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import math
+import threading
+import time
+from collections import deque
+
+from config import Param, Schema
+
+# What set the last interval, reported in the metrics
+MARKET = 'market'
+MIN_INTERVAL = 'min_interval'
+MAX_INTERVAL = 'max_interval'
+CPU_BUDGET = 'cpu_budget'
+CALL_BUDGET = 'call_budget'
+
+
+def ewma(previous, value, dt, half_life):
+    """Time-weighted exponential average: value gets half the weight after half_life seconds"""
+    if previous is None:
+        return value
+    alpha = 1.0 - math.exp(-math.log(2) * dt / half_life)
+    return previous + alpha * (value - previous)
+
+
+class LoopRateController:
+    """Adaptive sleep between trading loop iterations
+
+    Market activity is the larger of two ratios: the ATR against its
+    own long-run average, and the recent tick arrival rate against its
+    long-run average. The interval is base_interval / activity, clamped
+    to [min_interval, max_interval], so the loop polls faster when the
+    market moves and backs off when it is quiet. Two budgets then set a
+    floor that wins over everything else: the loop thread's CPU time as a
+    fraction of one core, and terminal calls per second.
+
+    Per iteration: begin(), observe() the ATR and new ticks, then sleep
+    for end(calls).
+    """
+
+    SCHEMA = Schema(
+        base_interval=Param(float, 1.0, min=0.001, max=3600, doc="Seconds between iterations at normal activity"),
+        min_interval=Param(float, 0.1, min=0.001, max=3600, doc="Shortest sleep in volatile markets"),
+        max_interval=Param(float, 10.0, min=0.001, max=3600, doc="Longest sleep in quiet markets"),
+        cpu_budget=Param(float, 0.5, min=0.01, max=8, doc="Loop thread CPU time per second (1 = one core)"),
+        call_budget=Param(float, 50.0, min=0.01, max=10000, doc="Terminal calls per second"),
+    )
+
+    def __init__(self, base_interval=1.0, min_interval=0.1, max_interval=10.0, cpu_budget=0.5, call_budget=50.0,
+                 fast_half_life=10.0, slow_half_life=3600.0, window=60.0):
+        self.lock = threading.Lock()
+        self.params = self.SCHEMA.defaults()
+        self.configure(base_interval=base_interval, min_interval=min_interval, max_interval=max_interval,
+                       cpu_budget=cpu_budget, call_budget=call_budget)
+        self.fast_half_life = fast_half_life
+        self.slow_half_life = slow_half_life
+        self.window = window
+
+        self.atr = None
+        self.atr_baseline = None
+        self.tick_rate = None
+        self.tick_baseline = None
+        self.observed_at = None
+        self.last_bar = (None, 0)
+
+        # Averages per iteration, for the budget floors
+        self.work = None
+        self.cpu = None
+        self.calls = None
+        self.started = None
+        self.cpu_started = None
+        self.usage = deque()  # (end time, wall seconds, cpu seconds, calls) of recent iterations
+
+        self.interval = self.params['base_interval']
+        self.limited_by = MARKET
+        self.iterations = 0
+
+    def validate(self, params):
+        """Current params updated with params; raises ValueError without changing anything"""
+        params = self.SCHEMA.validate(params, base=self.params)
+        if params['min_interval'] > params['max_interval']:
+            raise ValueError("min_interval is above max_interval")
+        return params
+
+    def configure(self, **params):
+        """Validate and apply new intervals or budgets"""
+        params = self.validate(params)
+        with self.lock:
+            self.params = params
+        return params
+
+    def begin(self):
+        """Mark the start of an iteration's work"""
+        self.started = time.monotonic()
+        self.cpu_started = time.thread_time()
+
+    def observe(self, atr=None, ticks=None):
+        """Feed the latest ATR and the number of ticks received since the last observation"""
+        now = time.monotonic()
+        dt = now - self.observed_at if self.observed_at is not None else None
+        self.observed_at = now
+        if atr is not None and atr == atr and atr > 0:
+            self.atr = atr
+            self.atr_baseline = ewma(self.atr_baseline, atr, dt or 0.0, self.slow_half_life)
+        if ticks is not None and dt:
+            rate = ticks / dt
+            self.tick_rate = ewma(self.tick_rate, rate, dt, self.fast_half_life)
+            self.tick_baseline = ewma(self.tick_baseline, rate, dt, self.slow_half_life)
+
+    def bar_ticks(self, bar_time, tick_volume):
+        """Ticks since the last call, from the tick volume of the forming bar"""
+        last_time, last_volume = self.last_bar
+        self.last_bar = (bar_time, tick_volume)
+        if last_time is None:
+            return None
+        return max(tick_volume - last_volume, 0) if bar_time == last_time else tick_volume
+
+    def activity(self):
+        """(activity, ATR ratio, tick rate ratio); 1.0 is normal, ratios are 1.0 until there is data"""
+        atr_ratio = self.atr / self.atr_baseline if self.atr_baseline else 1.0
+        tick_ratio = self.tick_rate / self.tick_baseline if self.tick_baseline else 1.0
+        return max(atr_ratio, tick_ratio), atr_ratio, tick_ratio
+
+    def end(self, calls=0):
+        """Close the iteration (calls = terminal calls it made); returns the seconds to sleep"""
+        now = time.monotonic()
+        started = self.started if self.started is not None else now
+        work = now - started
+        cpu = time.thread_time() - self.cpu_started if self.cpu_started is not None else 0.0
+        self.started = self.cpu_started = None
+
+        with self.lock:
+            params = self.params
+            # Averaged over roughly the last ten iterations
+            self.work = ewma(self.work, work, 1.0, 10.0)
+            self.cpu = ewma(self.cpu, cpu, 1.0, 10.0)
+            self.calls = ewma(self.calls, float(calls), 1.0, 10.0)
+
+            activity = self.activity()[0]
+            interval = params['base_interval'] / max(activity, 1e-6)
+            limited_by = MARKET
+            if interval < params['min_interval']:
+                interval, limited_by = params['min_interval'], MIN_INTERVAL
+            elif interval > params['max_interval']:
+                interval, limited_by = params['max_interval'], MAX_INTERVAL
+
+            # An iteration plus its sleep must be long enough to stay within both budgets
+            cpu_floor = self.cpu / params['cpu_budget'] - self.work
+            call_floor = self.calls / params['call_budget'] - self.work
+            if cpu_floor > interval and cpu_floor >= call_floor:
+                interval, limited_by = cpu_floor, CPU_BUDGET
+            elif call_floor > interval:
+                interval, limited_by = call_floor, CALL_BUDGET
+
+            self.interval = interval
+            self.limited_by = limited_by
+            self.iterations += 1
+            self.usage.append((now + interval, work + interval, cpu, calls))
+            while self.usage and self.usage[0][0] < now - self.window:
+                self.usage.popleft()
+        return interval
+
+    def metrics(self):
+        """Current rate, activity and budget usage over the last window seconds"""
+        with self.lock:
+            params = self.params
+            wall = sum(item[1] for item in self.usage)
+            cpu = sum(item[2] for item in self.usage)
+            calls = sum(item[3] for item in self.usage)
+            activity, atr_ratio, tick_ratio = self.activity()
+            cpu_usage = cpu / wall if wall else 0.0
+            call_rate = calls / wall if wall else 0.0
+            cycle = self.interval + (self.work or 0.0)
+            return {
+                'interval': self.interval,
+                'rate': 1.0 / cycle if cycle > 0 else None,  # Iterations per second
+                'limited_by': self.limited_by,
+                'activity': activity,
+                'atr_ratio': atr_ratio,
+                'tick_ratio': tick_ratio,
+                'tick_rate': self.tick_rate,
+                'cpu_usage': cpu_usage,
+                'cpu_budget': params['cpu_budget'],
+                'cpu_budget_used': cpu_usage / params['cpu_budget'],
+                'call_rate': call_rate,
+                'call_budget': params['call_budget'],
+                'call_budget_used': call_rate / params['call_budget'],
+                'iterations': self.iterations,
+            }
@@ -0,0 +1,179 @@
+import logging
+import time
+
+import numpy as np
+
+from records import MAGIC
+
+
+class PositionManager:
+    """ATR trailing stops, break-even moves and strategy exits for open positions
+
+    Stop levels are computed for the whole book at once from the
+    PositionTable. A TRADE_ACTION_SLTP modification is sent only when the
+    stop improves by at least min_move_atr * ATR over both the current
+    stop and the last one requested, and at most max_batch per cycle, so
+    the terminal is not flooded with requests on every tick. Stops are
+    kept the symbol's trade_stops_level away from the price, and a ticket
+    whose modification was rejected is retried after a backoff that
+    doubles from retry_backoff up to max_backoff seconds. With
+    use_strategy_exits, positions TradingStrategy.should_close_position
+    wants closed are closed in one batch. These exits belong to
+    TradingStrategy's entry rules and churn against other entry signals,
+    so they are off by default.
+    """
+
+    def __init__(self, bot, strategy=None, trail_atr=2.0, break_even_atr=1.0, break_even_offset_atr=0.1,
+                 min_move_atr=0.25, max_batch=20, min_interval=1.0, use_strategy_exits=False,
+                 retry_backoff=5.0, max_backoff=300.0, stops_refresh=60.0):
+        self.bot = bot
+        self._strategy = strategy
+        self.trail_atr = trail_atr
+        self.break_even_atr = break_even_atr
+        self.break_even_offset_atr = break_even_offset_atr
+        self.min_move_atr = min_move_atr
+        self.max_batch = max_batch
+        self.min_interval = min_interval
+        self.use_strategy_exits = use_strategy_exits
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.stops_refresh = stops_refresh
+        self.requested = {}  # Ticket -> last stop sent, until the terminal reports it
+        self.backoff = {}  # Ticket -> (monotonic time of the next try, delay) after a rejection
+        self.stops = {}  # Symbol -> (minimum stop distance, monotonic time fetched)
+        self.last_cycle = 0.0
+
+    @property
+    def strategy(self):
+        # TradingStrategy pulls in pandas and ta, so load it on first use
+        if self._strategy is None:
+            from strategy import TradingStrategy
+            self._strategy = TradingStrategy()
+        return self._strategy
+
+    def plan(self, positions, quotes, atr, mask=None, stops=None):
+        """New stop levels as a list of (ticket, symbol, sl, tp)
+
+        quotes maps symbol -> (bid, ask) and atr maps symbol -> ATR;
+        positions on symbols missing from either are left alone. stops
+        maps symbol -> minimum stop distance from the price (default 0).
+        """
+        rows = positions.rows if mask is None else positions.rows[mask]
+        stops = stops or {}
+        n_symbols = len(positions.symbols)
+        bids = np.full(n_symbols, np.nan)
+        asks = np.full(n_symbols, np.nan)
+        atrs = np.full(n_symbols, np.nan)
+        distances = np.zeros(n_symbols)
+        for i, symbol in enumerate(positions.symbols):
+            if symbol in quotes:
+                bids[i], asks[i] = quotes[symbol]
+            if symbol in atr:
+                atrs[i] = atr[symbol]
+            distances[i] = stops.get(symbol, 0.0)
+
+        ids = rows['symbol']
+        direction = rows['direction'].astype(np.float64)
+        price_open = rows['price_open']
+        sl = rows['sl']
+        price = np.where(direction > 0, bids[ids], asks[ids])
+        atr_values = atrs[ids]
+
+        # Work in favourable-distance space: higher is always a tighter stop
+        candidate = np.full(len(rows), -np.inf)
+        if self.trail_atr is not None:
+            candidate = (price - direction * self.trail_atr * atr_values - price_open) * direction
+        if self.break_even_atr is not None:
+            armed = (price - price_open) * direction >= self.break_even_atr * atr_values
+            candidate = np.where(armed, np.fmax(candidate, self.break_even_offset_atr * atr_values), candidate)
+        # The broker rejects stops closer to the price than its stops level
+        profit = (price - price_open) * direction
+        candidate = np.fmin(candidate, profit - distances[ids])
+
+        current = np.where(sl > 0, (sl - price_open) * direction, -np.inf)
+        tickets = rows['ticket'].tolist()
+        last_sent = np.array([self.requested.get(t, np.nan) for t in tickets], dtype=np.float64)
+        last_sent = np.where(np.isnan(last_sent), -np.inf, (last_sent - price_open) * direction)
+        threshold = self.min_move_atr * atr_values
+        # Never loosen a stop, never place it through the market, and wait out a rejection's backoff
+        now = time.monotonic()
+        waiting = np.array([self.backoff.get(t, (0.0,))[0] > now for t in tickets], dtype=bool)
+        valid = np.isfinite(candidate) & (candidate < profit) & ~waiting
+        move = valid & (candidate - np.fmax(current, last_sent) >= threshold)
+
+        new_sl = price_open + direction * candidate
+        return [
+            (tickets[i], positions.symbols[ids[i]], float(new_sl[i]), float(rows['tp'][i]))
+            for i in np.flatnonzero(move)
+        ]
+
+    def apply(self, modifications):
+        """Send one batch of SLTP modifications; returns the number accepted"""
+        batch = modifications[:self.max_batch]
+        sent = 0
+        for ticket, symbol, sl, tp in batch:
+            if self.bot.modify_position(ticket, symbol, sl, tp):
+                self.requested[ticket] = sl
+                self.backoff.pop(ticket, None)
+                sent += 1
+            else:
+                _, delay = self.backoff.get(ticket, (0.0, 0.0))
+                delay = min(delay * 2, self.max_backoff) if delay else self.retry_backoff
+                self.backoff[ticket] = (time.monotonic() + delay, delay)
+                self.stops.pop(symbol, None)  # The stops level may have widened
+        if batch:
+            logging.info(f"Stop modifications: {sent}/{len(batch)} sent, {len(modifications) - len(batch)} deferred")
+        return sent
+
+    def stop_distances(self, symbols):
+        """Minimum stop distance per symbol, refetched every stops_refresh seconds"""
+        now = time.monotonic()
+        for symbol in symbols:
+            cached = self.stops.get(symbol)
+            if cached is None or now - cached[1] >= self.stops_refresh:
+                distance = self.bot.get_stops_distance(symbol)
+                if distance is not None:
+                    self.stops[symbol] = (distance, now)
+        return {symbol: self.stops[symbol][0] for symbol in symbols if symbol in self.stops}
+
+    def strategy_exits(self, positions, bars, symbol, mask=None):
+        """Tickets on symbol that TradingStrategy.should_close_position wants closed"""
+        if mask is None:
+            mask = positions.mask(symbol, magic=MAGIC)
+        tickets = []
+        for direction, position_type in ((1, "BUY"), (-1, "SELL")):
+            side = mask & (positions.rows['direction'] == direction)
+            if side.any() and self.strategy.should_close_position(bars.copy(), position_type):
+                tickets.extend(positions.rows['ticket'][side].tolist())
+        return tickets
+
+    def due(self):
+        """Whether min_interval has passed since the last cycle; starts a new one if so"""
+        now = time.monotonic()
+        if now - self.last_cycle < self.min_interval:
+            return False
+        self.last_cycle = now
+        return True
+
+    def update(self, positions, quotes, atr, bars=None, symbol=None):
+        """Run one management cycle over the bot's positions
+
+        bars is a price DataFrame for symbol used for the strategy exits.
+        Returns the number of stop modifications and closes sent.
+        """
+        mask = positions.mask(magic=MAGIC)
+        open_tickets = set(positions.rows['ticket'][mask].tolist())
+        self.requested = {t: sl for t, sl in self.requested.items() if t in open_tickets}
+        self.backoff = {t: state for t, state in self.backoff.items() if t in open_tickets}
+
+        actions = 0
+        if self.use_strategy_exits and bars is not None and symbol is not None:
+            tickets = self.strategy_exits(positions, bars, symbol, mask & positions.mask(symbol))
+            if tickets:
+                logging.info(f"Strategy exit signal, closing positions {tickets}")
+                results = self.bot.close_positions(tickets, quotes)
+                actions += sum(1 for result in results.values() if result)
+                mask &= ~np.isin(positions.rows['ticket'], tickets)
+
+        actions += self.apply(self.plan(positions, quotes, atr, mask, self.stop_distances(quotes)))
+        return actions
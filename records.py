@@ -0,0 +1,191 @@
+import numpy as np
+
+from execution import FILLED
+from lazy import LazyModule
+
+mt5 = LazyModule('MetaTrader5')
+
+# Defaults shared by every request the bot sends
+MAGIC = 234000
+DEVIATION = 20
+
+
+class OrderRequest:
+    """Trade request for mt5.order_send"""
+
+    __slots__ = ('action', 'symbol', 'volume', 'type', 'price', 'sl', 'tp', 'position', 'order',
+                 'deviation', 'magic', 'comment', 'type_time', 'type_filling')
+
+    def __init__(self, action, symbol=None, volume=None, type=None, price=None, sl=None, tp=None,
+                 position=None, order=None, deviation=DEVIATION, magic=MAGIC, comment="python script order",
+                 type_time=None, type_filling=None):
+        self.action = action
+        self.symbol = symbol
+        self.volume = volume
+        self.type = type
+        self.price = price
+        self.sl = sl
+        self.tp = tp
+        self.position = position
+        self.order = order
+        self.deviation = deviation
+        self.magic = magic
+        self.comment = comment
+        self.type_time = mt5.ORDER_TIME_GTC if type_time is None else type_time
+        self.type_filling = mt5.ORDER_FILLING_IOC if type_filling is None else type_filling
+
+    def to_dict(self):
+        """Request dict for order_send; unset optional fields are left out"""
+        return {name: getattr(self, name) for name in self.__slots__ if getattr(self, name) is not None}
+
+    def __repr__(self):
+        return f"OrderRequest({self.to_dict()})"
+
+
+class Fill:
+    """Outcome of an order_send call, as ForexTradingBot.send_order returns it"""
+
+    __slots__ = ('retcode', 'order', 'deal', 'volume', 'price', 'bid', 'ask', 'comment', 'request_id')
+
+    def __init__(self, retcode, order=0, deal=0, volume=0.0, price=0.0, bid=0.0, ask=0.0,
+                 comment="", request_id=0):
+        self.retcode = retcode
+        self.order = order
+        self.deal = deal
+        self.volume = volume
+        self.price = price
+        self.bid = bid
+        self.ask = ask
+        self.comment = comment
+        self.request_id = request_id
+
+    @classmethod
+    def from_result(cls, result):
+        return cls(result.retcode, result.order, result.deal, result.volume, result.price,
+                   result.bid, result.ask, result.comment, result.request_id)
+
+    @property
+    def filled(self):
+        """Executed, fully or in part"""
+        return self.retcode in FILLED
+
+    @property
+    def partial(self):
+        return self.retcode == mt5.TRADE_RETCODE_DONE_PARTIAL
+
+    def __repr__(self):
+        return f"Fill(retcode={self.retcode}, deal={self.deal}, price={self.price}, volume={self.volume})"
+
+
+class PositionRecord:
+    """Open position, direction is +1 for buys and -1 for sells"""
+
+    __slots__ = ('ticket', 'symbol', 'direction', 'volume', 'price_open', 'price_current',
+                 'sl', 'tp', 'profit', 'swap', 'magic', 'time')
+
+    def __init__(self, ticket, symbol, direction, volume, price_open, price_current=0.0,
+                 sl=0.0, tp=0.0, profit=0.0, swap=0.0, magic=0, time=0):
+        self.ticket = ticket
+        self.symbol = symbol
+        self.direction = direction
+        self.volume = volume
+        self.price_open = price_open
+        self.price_current = price_current
+        self.sl = sl
+        self.tp = tp
+        self.profit = profit
+        self.swap = swap
+        self.magic = magic
+        self.time = time
+
+    def __repr__(self):
+        side = "BUY" if self.direction > 0 else "SELL"
+        return f"PositionRecord({self.ticket}, {self.symbol}, {side}, {self.volume} @ {self.price_open})"
+
+
+POSITION_DTYPE = np.dtype([
+    ('ticket', 'i8'), ('symbol', 'i4'), ('direction', 'i1'), ('volume', 'f8'),
+    ('price_open', 'f8'), ('price_current', 'f8'), ('sl', 'f8'), ('tp', 'f8'),
+    ('profit', 'f8'), ('swap', 'f8'), ('magic', 'i8'), ('time', 'i8'),
+])
+
+
+class PositionTable:
+    """Open positions as a NumPy structured array for bulk P&L and exposure math
+
+    The array is allocated once and refilled in place on every refresh;
+    symbols are interned to small integer ids, so hundreds of positions
+    across symbols cost no per-position Python objects.
+    """
+
+    def __init__(self, capacity=256):
+        self.data = np.zeros(capacity, dtype=POSITION_DTYPE)
+        self.size = 0
+        self.symbols = []
+        self.symbol_ids = {}
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def rows(self):
+        """View of the filled part of the table"""
+        return self.data[:self.size]
+
+    def symbol_id(self, symbol):
+        if symbol not in self.symbol_ids:
+            self.symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return self.symbol_ids[symbol]
+
+    def load(self, positions):
+        """Replace the table contents with MT5 positions (positions_get result)"""
+        positions = positions or ()
+        n = len(positions)
+        if n > len(self.data):
+            self.data = np.zeros(max(n, 2 * len(self.data)), dtype=POSITION_DTYPE)
+        buy = mt5.ORDER_TYPE_BUY
+        for i, pos in enumerate(positions):
+            self.data[i] = (
+                pos.ticket, self.symbol_id(pos.symbol), 1 if pos.type == buy else -1, pos.volume,
+                pos.price_open, pos.price_current, pos.sl, pos.tp, pos.profit, pos.swap, pos.magic, pos.time,
+            )
+        self.size = n
+        return self
+
+    def mask(self, symbol=None, direction=None, magic=None):
+        rows = self.rows
+        mask = np.ones(self.size, dtype=bool)
+        if symbol is not None:
+            mask &= rows['symbol'] == self.symbol_ids.get(symbol, -1)
+        if direction is not None:
+            mask &= rows['direction'] == direction
+        if magic is not None:
+            mask &= rows['magic'] == magic
+        return mask
+
+    def count(self, symbol=None, direction=None, magic=None):
+        return int(self.mask(symbol, direction, magic).sum())
+
+    def tickets(self, symbol=None, direction=None):
+        return self.rows['ticket'][self.mask(symbol, direction)]
+
+    def find(self, tickets):
+        """Row indices of the given tickets; tickets no longer open are skipped"""
+        return np.flatnonzero(np.isin(self.rows['ticket'], np.asarray(tickets, dtype=np.int64)))
+
+    def open_symbols(self):
+        """Symbols with at least one open position"""
+        return [self.symbols[i] for i in np.unique(self.rows['symbol'])]
+
+    def records(self, symbol=None, direction=None):
+        """PositionRecords for the matching rows"""
+        return [self.record(i) for i in np.flatnonzero(self.mask(symbol, direction))]
+
+    def record(self, i):
+        """PositionRecord for row i"""
+        row = self.data[i]
+        return PositionRecord(int(row['ticket']), self.symbols[row['symbol']], int(row['direction']),
+                              float(row['volume']), float(row['price_open']), float(row['price_current']),
+                              float(row['sl']), float(row['tp']), float(row['profit']), float(row['swap']),
+                              int(row['magic']), int(row['time']))
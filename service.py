@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+
+from aiohttp import web, WSMsgType
+from dotenv import load_dotenv
+
+from engine import TradingEngine
+from trading_bot import ForexTradingBot
+
+# Minimum seconds between two snapshots streamed to the same WebSocket client
+STREAM_INTERVAL = 0.25
+
+
+def json_response(data, status=200):
+    return web.json_response(data, status=status, dumps=lambda obj: json.dumps(obj, default=str))
+
+
+class ControlService:
+    """Local HTTP/WebSocket control API for a headless TradingEngine
+
+    GET  /status      latest engine snapshot
+    GET  /positions   open positions on the engine's symbol
+    GET  /params      current trading parameters
+    POST /params      update lot_size, sl_atr, tp_atr, max_positions
+    GET  /config      engine, strategy and bot parameters
+    POST /config      validate and apply any of those sections at once
+    POST /start       start auto trading
+    POST /stop        stop auto trading
+    POST /close_all   close all open positions
+    GET  /stream      WebSocket of snapshots and log messages
+    """
+
+    def __init__(self, engine, token=None):
+        self.engine = engine
+        self.token = token
+        self.clients = {}  # WebSocket -> loop time of the last snapshot sent
+        self.loop = None
+        self.app = web.Application(middlewares=[self.auth_middleware])
+        self.app.add_routes([
+            web.get('/status', self.get_status),
+            web.get('/positions', self.get_positions),
+            web.get('/params', self.get_params),
+            web.post('/params', self.post_params),
+            web.get('/config', self.get_config),
+            web.post('/config', self.post_config),
+            web.post('/start', self.post_start),
+            web.post('/stop', self.post_stop),
+            web.post('/close_all', self.post_close_all),
+            web.get('/stream', self.stream),
+        ])
+        self.app.on_startup.append(self.on_startup)
+        self.app.on_shutdown.append(self.on_shutdown)
+
+    @web.middleware
+    async def auth_middleware(self, request, handler):
+        """Require the bearer token when one is configured"""
+        if self.token and request.headers.get('Authorization') != f"Bearer {self.token}":
+            return json_response({'error': 'unauthorized'}, status=401)
+        return await handler(request)
+
+    async def on_startup(self, app):
+        self.loop = asyncio.get_running_loop()
+        self.engine.subscribe(self.on_snapshot)
+        self.engine.subscribe_log(self.on_log)
+
+    async def on_shutdown(self, app):
+        self.engine.unsubscribe(self.on_snapshot)
+        self.engine.stop()
+        for ws in list(self.clients):
+            await ws.close()
+
+    def on_snapshot(self, snapshot):
+        """Called from the engine thread; hands the snapshot to the event loop"""
+        if self.clients and self.loop is not None:
+            self.loop.call_soon_threadsafe(self.broadcast, {'type': 'snapshot', 'data': snapshot})
+
+    def on_log(self, message):
+        if self.clients and self.loop is not None:
+            self.loop.call_soon_threadsafe(self.broadcast, {'type': 'log', 'data': message})
+
+    def broadcast(self, message):
+        """Send to every client, dropping snapshots for clients that were updated too recently"""
+        now = self.loop.time()
+        payload = json.dumps(message, default=str)
+        for ws, last_sent in list(self.clients.items()):
+            if message['type'] == 'snapshot':
+                if now - last_sent < STREAM_INTERVAL:
+                    continue
+                self.clients[ws] = now
+            asyncio.ensure_future(self._send(ws, payload))
+
+    async def _send(self, ws, payload):
+        try:
+            await ws.send_str(payload)
+        except Exception:
+            self.clients.pop(ws, None)
+
+    async def get_status(self, request):
+        snapshot = await self.loop.run_in_executor(None, self.engine.snapshot)
+        return json_response(snapshot)
+
+    async def get_positions(self, request):
+        snapshot = await self.loop.run_in_executor(None, self.engine.snapshot)
+        return json_response(snapshot['positions'])
+
+    async def get_params(self, request):
+        return json_response(self.engine.params)
+
+    async def post_params(self, request):
+        try:
+            params = await request.json()
+            return json_response(self.engine.set_params(**params))
+        except (ValueError, TypeError) as e:
+            return json_response({'error': str(e)}, status=400)
+
+    async def get_config(self, request):
+        return json_response(self.engine.get_config())
+
+    async def post_config(self, request):
+        try:
+            config = await request.json()
+            if not isinstance(config, dict):
+                raise ValueError("Config must be a JSON object")
+            return json_response(self.engine.apply_config(config))
+        except (ValueError, TypeError, AttributeError) as e:
+            return json_response({'error': str(e)}, status=400)
+
+    async def post_start(self, request):
+        return json_response({'started': self.engine.start(), 'running': self.engine.running})
+
+    async def post_stop(self, request):
+        return json_response({'stopped': self.engine.stop(), 'running': self.engine.running})
+
+    async def post_close_all(self, request):
+        closed = await self.loop.run_in_executor(None, self.engine.close_all_positions)
+        return json_response({'closed': closed})
+
+    async def stream(self, request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        self.clients[ws] = 0.0
+        if self.engine.last_snapshot is not None:
+            await ws.send_str(json.dumps({'type': 'snapshot', 'data': self.engine.last_snapshot}, default=str))
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            self.clients.pop(ws, None)
+        return ws
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run the trading engine headless with a local control API")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to bind (default: localhost only)")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--symbol', default='XAUUSDm')
+    parser.add_argument('--autostart', action='store_true', help="Start auto trading immediately")
+    parser.add_argument('--bus', action='store_true', help="Read ticks from a running market_bus.py publisher")
+    parser.add_argument('--config', default=None, help="JSON config file, reloaded whenever it changes")
+    args = parser.parse_args()
+
+    tick_source = None
+    if args.bus:
+        from market_bus import MarketDataReader
+        tick_source = MarketDataReader(args.symbol)
+
+    bot = ForexTradingBot(symbol=args.symbol)
+    engine = TradingEngine(bot, tick_source=tick_source)
+    if args.config:
+        engine.watch_config(args.config)
+    service = ControlService(engine, token=os.getenv('CONTROL_API_TOKEN'))
+    if args.autostart:
+        engine.start()
+
+    logging.info(f"Control API listening on http://{args.host}:{args.port}")
+    try:
+        web.run_app(service.app, host=args.host, port=args.port, print=None)
+    finally:
+        bot.shutdown()
+
+
+if __name__ == "__main__":
+    main()
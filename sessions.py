@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import threading
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+
+from lazy import LazyModule
+
+mt5 = LazyModule('MetaTrader5')
+
+DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+WEEK_MINUTES = 7 * 24 * 60
+
+# Spot gold in UTC: Sunday 23:00 to Friday 22:00 with a daily break from 22:00 to 23:00
+DEFAULT_SESSIONS = [
+    ("Sun 23:00", "Mon 22:00"), ("Mon 23:00", "Tue 22:00"), ("Tue 23:00", "Wed 22:00"),
+    ("Wed 23:00", "Thu 22:00"), ("Thu 23:00", "Fri 22:00"),
+]
+
+
+def week_minute(text):
+    """'Mon 09:30' -> minutes since Monday 00:00"""
+    day, clock = text.split()
+    hours, minutes = clock.split(':')
+    return DAYS.index(day.capitalize()[:3]) * 1440 + int(hours) * 60 + int(minutes)
+
+
+def parse_time(text):
+    """ISO timestamp, taken as UTC unless it carries an offset"""
+    dt = datetime.fromisoformat(text)
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+class WeeklySchedule:
+    """Weekly sessions as merged, sorted minute-of-week intervals"""
+
+    def __init__(self, sessions):
+        intervals = []
+        for start, end in sessions:
+            start, end = week_minute(start), week_minute(end)
+            if end <= start:  # Wraps past Sunday midnight
+                intervals += [(start, WEEK_MINUTES), (0, end)]
+            else:
+                intervals.append((start, end))
+        if not intervals:
+            raise ValueError("A schedule needs at least one session")
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        self.intervals = merged
+        self.starts = [start for start, _ in merged]
+
+    def next_change(self, dt):
+        """(is_open, time of the next close when open or of the next open when closed)"""
+        minute = dt.weekday() * 1440 + dt.hour * 60 + dt.minute
+        week_start = dt.replace(second=0, microsecond=0) - timedelta(minutes=minute)
+        i = bisect_right(self.starts, minute) - 1
+        if i >= 0 and minute < self.intervals[i][1]:
+            end = self.intervals[i][1]
+            if end == WEEK_MINUTES and self.starts[0] == 0:  # Runs on into next week's first session
+                end += self.intervals[0][1]
+            return True, week_start + timedelta(minutes=end)
+        if i + 1 < len(self.starts):
+            return False, week_start + timedelta(minutes=self.starts[i + 1])
+        return False, week_start + timedelta(minutes=WEEK_MINUTES + self.starts[0])
+
+
+class SessionCalendar:
+    """Trading sessions per symbol plus holiday and news blackouts
+
+    The MT5 Python API does not expose the terminal's session table, so
+    weekly sessions come from a JSON file (DEFAULT_SESSIONS when absent),
+    together with blackouts: UTC ranges during which the listed symbols,
+    or all of them for "*", take no new entries. Open positions are still
+    managed through a blackout unless it sets "manage": false, for
+    holidays when the market itself is closed.
+
+        {"sessions": {"default": [["Sun 23:00", "Fri 22:00"]], "EURUSD": [...]},
+         "blackouts": [{"start": "2025-12-25T00:00", "end": "2025-12-26T00:00",
+                        "symbols": ["*"], "reason": "Christmas", "manage": false}]}
+    """
+
+    def __init__(self, sessions=None, blackouts=None):
+        sessions = dict(sessions or {})
+        self.default = WeeklySchedule(sessions.pop('default', DEFAULT_SESSIONS))
+        self.schedules = {symbol: WeeklySchedule(spec) for symbol, spec in sessions.items()}
+        self.blackouts = sorted(
+            (parse_time(b['start']), parse_time(b['end']), tuple(b.get('symbols', ['*'])), b.get('reason', "blackout"),
+             bool(b.get('manage', True)))
+            for b in (blackouts or [])
+        )
+
+    @classmethod
+    def load(cls, path='sessions.json'):
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data.get('sessions'), data.get('blackouts'))
+
+    def schedule(self, symbol):
+        return self.schedules.get(symbol, self.default)
+
+    def _blackouts(self, symbol):
+        return [(start, end, reason, manage) for start, end, symbols, reason, manage in self.blackouts
+                if '*' in symbols or symbol in symbols]
+
+    def status(self, symbol, now=None):
+        """(active, until, reason): whether symbol trades at now and when that changes
+
+        reason says why an inactive symbol is closed and is None when active.
+        """
+        now = now or datetime.now(timezone.utc)
+        blackouts = self._blackouts(symbol)
+        schedule = self.schedule(symbol)
+        t, reason = now, None
+        # Step over back-to-back blackouts and closed sessions to the next active moment
+        for _ in range(len(blackouts) + 16):
+            covering = [(end, r) for start, end, r, _ in blackouts if start <= t < end]
+            if covering:
+                end, r = max(covering)
+                t, reason = end, reason or r
+                continue
+            is_open, change = schedule.next_change(t)
+            if not is_open:
+                t, reason = change, reason or "session closed"
+                continue
+            if t > now:
+                return False, t, reason
+            # Active until the session closes or a blackout starts, whichever comes first
+            starts = [start for start, _, _, _ in blackouts if now < start < change]
+            return True, min(starts, default=change), None
+        return False, t, reason
+
+    def blackout(self, symbol, now=None):
+        """Reason of a blackout at now during which open positions are still managed, else None
+
+        None as well when the symbol's session is closed anyway.
+        """
+        now = now or datetime.now(timezone.utc)
+        covering = [(start, end, r, manage) for start, end, r, manage in self._blackouts(symbol) if start <= now < end]
+        if not covering or not all(manage for _, _, _, manage in covering):
+            return None
+        if not self.schedule(symbol).next_change(now)[0]:
+            return None
+        return covering[0][2]
+
+
+class SessionScheduler:
+    """Idles a trading loop while its symbol is outside its sessions
+
+    Status is cached until the next change, so while trading is active a
+    check is a single datetime comparison. On each calendar open the
+    terminal's trade mode is also checked (when check_trade_mode is set),
+    catching holidays missing from the file; a disabled symbol is
+    checked again every recheck seconds.
+    """
+
+    def __init__(self, symbol, calendar=None, warmup=30.0, recheck=300.0, check_trade_mode=True):
+        self.symbol = symbol
+        self.calendar = calendar or SessionCalendar.load()
+        self.warmup = warmup
+        self.recheck = recheck
+        self.check_trade_mode = check_trade_mode
+        self.active = False
+        self.until = None
+        self.reason = None
+
+    def status(self, now=None):
+        """(active, until, reason), recomputed only once the cached status expires"""
+        now = now or datetime.now(timezone.utc)
+        if self.until is None or now >= self.until:
+            active, until, reason = self.calendar.status(self.symbol, now)
+            if active and self.check_trade_mode and not self.trade_allowed():
+                active, until, reason = False, now + timedelta(seconds=self.recheck), "trading disabled"
+            self.active, self.until, self.reason = active, until, reason
+        return self.active, self.until, self.reason
+
+    def is_active(self, now=None):
+        return self.status(now)[0]
+
+    def blackout(self, now=None):
+        """Reason when only a blackout keeps the symbol inactive and its positions are still managed, else None"""
+        active, _, reason = self.status(now)
+        if active or reason == "trading disabled":
+            return None
+        return self.calendar.blackout(self.symbol, now)
+
+    def trade_allowed(self):
+        """False when the terminal reports trading disabled for the symbol"""
+        info = mt5.symbol_info(self.symbol)
+        return info is None or info.trade_mode != mt5.SYMBOL_TRADE_MODE_DISABLED
+
+    def wait_for_session(self, stopped=None, warm_up=None, max_sleep=60.0):
+        """Sleep until the session is active; returns False if the stopped Event was set first
+
+        warm_up() is called warmup seconds before the open so caches are
+        current when the loop resumes. Sleeps are capped at max_sleep and
+        end as soon as stopped is set.
+        """
+        stopped = stopped if stopped is not None else threading.Event()
+        active, until, reason = self.status()
+        if active:
+            return True
+        logging.info(f"{self.symbol} inactive ({reason}) until {until.isoformat()}")
+        warmed = False
+        while not stopped.is_set():
+            remaining = (until - datetime.now(timezone.utc)).total_seconds()
+            if remaining <= 0:
+                active, until, reason = self.status()
+                if active:
+                    logging.info(f"{self.symbol} session open")
+                    return True
+                logging.info(f"{self.symbol} inactive ({reason}) until {until.isoformat()}")
+                warmed = False
+                continue
+            if not warmed and remaining <= self.warmup:
+                warmed = True
+                if warm_up is not None:
+                    try:
+                        warm_up()
+                    except Exception as e:
+                        logging.error(f"Error warming up for the session: {str(e)}")
+                continue
+            wake = remaining if warmed else remaining - self.warmup
+            stopped.wait(min(max(wake, 0.01), max_sleep))
+        return False
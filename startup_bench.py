@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Modules on the restart path, and the statement that brings each one to a tradeable state
+DEFAULT_TARGETS = {
+    'trading_bot': "import trading_bot; trading_bot.ForexTradingBot()",
+    'engine': "import engine",
+    'service': "import service",
+    'trading_interface': "import trading_interface",
+}
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into (module, self_us, cumulative_us) rows"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            rows.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def measure(module, statement, repeat=5):
+    """Best-of-N import profile and wall time for one target"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', statement],
+            cwd=HERE, capture_output=True, text=True
+        )
+        wall = time.perf_counter() - started
+        rows = parse_importtime(proc.stderr)
+        total = next((cum for name, _, cum in rows if name == module), None)
+        if proc.returncode != 0 or total is None:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'unknown error'
+            return {'module': module, 'error': error}
+        if best is None or total < best['import_us']:
+            slowest = sorted(rows, key=lambda row: row[1], reverse=True)[:10]
+            best = {
+                'module': module,
+                'import_us': total,
+                'wall_ms': round(wall * 1000, 1),
+                'modules_loaded': len(rows),
+                'slowest': [{'name': name, 'self_us': us} for name, us, _ in slowest],
+            }
+    return best
+
+
+def git_revision():
+    try:
+        proc = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True)
+        return proc.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure startup import cost with python -X importtime")
+    parser.add_argument('modules', nargs='*', default=list(DEFAULT_TARGETS), help="Modules to measure")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per module, the fastest is kept")
+    parser.add_argument('--output', default='startup_bench.jsonl', help="File the results are appended to")
+    args = parser.parse_args()
+
+    results = []
+    for module in args.modules:
+        result = measure(module, DEFAULT_TARGETS.get(module, f"import {module}"), args.repeat)
+        results.append(result)
+        if 'error' in result:
+            print(f"{module:<20} failed: {result['error']}")
+            continue
+        print(
+            f"{module:<20} import {result['import_us'] / 1000:8.1f} ms   "
+            f"process {result['wall_ms']:8.1f} ms   {result['modules_loaded']} modules"
+        )
+        for row in result['slowest'][:5]:
+            print(f"    {row['name']:<40} {row['self_us'] / 1000:8.1f} ms")
+
+    record = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'results': results,
+    }
+    with open(args.output, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+if __name__ == "__main__":
+    main()
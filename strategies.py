@@ -0,0 +1,163 @@
+from config import Param, Schema
+
+# Strategy plugins, by name. A plugin is a class with a `name`, a `schema`
+# and evaluate(values) -> signals, where values are the indicator values of
+# the engine's IndicatorSet (EMA20, EMA50, RSI, MACD, ATR, close). Instances
+# are built from already validated parameters and copy them into plain
+# attributes, so evaluate() never converts or looks anything up by name.
+STRATEGIES = {}
+
+
+def register_strategy(cls):
+    """Class decorator adding a strategy plugin to the registry"""
+    STRATEGIES[cls.name] = cls
+    return cls
+
+
+def create_strategy(name, params=None):
+    """Validated strategy instance; raises ValueError for unknown names or parameters"""
+    try:
+        cls = STRATEGIES[name]
+    except (KeyError, TypeError):
+        raise ValueError(f"Unknown strategy: {name} (available: {', '.join(sorted(STRATEGIES))})")
+    return cls(cls.schema.validate(params or {}))
+
+
+class Strategy:
+    """Base class for strategy plugins"""
+
+    name = None
+    schema = Schema()
+
+    def __init__(self, params):
+        self.params = params
+
+    def evaluate(self, values):
+        raise NotImplementedError
+
+    def signals(self, values, buy_conditions, sell_conditions):
+        """Signal dict shared by every plugin, for the engine and the UIs"""
+        ema20, ema50, rsi = values['EMA20'], values['EMA50'], values['RSI']
+        macd, macd_signal = values['MACD']
+        return {
+            'ema_cross': 'up' if ema20 > ema50 else 'down' if ema20 < ema50 else None,
+            'macd_cross': 'up' if macd > macd_signal else 'down' if macd < macd_signal else None,
+            'rsi_overbought': rsi > 70,
+            'rsi_oversold': rsi < 30,
+            'quick_buy': bool(buy_conditions),
+            'quick_sell': bool(sell_conditions),
+            'buy_conditions': buy_conditions,
+            'sell_conditions': sell_conditions,
+        }
+
+
+@register_strategy
+class QuickSignalStrategy(Strategy):
+    """The GUI's quick buy/sell rules: any one RSI, MACD or EMA condition triggers"""
+
+    name = 'quick'
+    schema = Schema(
+        rsi_buy_max=Param(float, 80.0, 0, 100, doc="Buy on a MACD cross only below this RSI"),
+        rsi_sell_min=Param(float, 20.0, 0, 100, doc="Sell on a MACD cross only above this RSI"),
+        trend_rsi_buy_max=Param(float, 85.0, 0, 100, doc="Buy on an EMA uptrend only below this RSI"),
+        trend_rsi_sell_min=Param(float, 15.0, 0, 100, doc="Sell on an EMA downtrend only above this RSI"),
+        oversold=Param(float, 30.0, 0, 100, doc="Buy below this RSI"),
+        overbought=Param(float, 70.0, 0, 100, doc="Sell above this RSI"),
+    )
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.rsi_buy_max = params['rsi_buy_max']
+        self.rsi_sell_min = params['rsi_sell_min']
+        self.trend_rsi_buy_max = params['trend_rsi_buy_max']
+        self.trend_rsi_sell_min = params['trend_rsi_sell_min']
+        self.oversold = params['oversold']
+        self.overbought = params['overbought']
+
+    def evaluate(self, values):
+        ema20, ema50, rsi = values['EMA20'], values['EMA50'], values['RSI']
+        macd, macd_signal = values['MACD']
+        buy_conditions = []
+        if rsi < self.rsi_buy_max and macd > macd_signal: buy_conditions.append(f"RSI<{self.rsi_buy_max:g} & MACD_Cross")
+        if ema20 > ema50 and rsi < self.trend_rsi_buy_max: buy_conditions.append(f"EMA_Cross & RSI<{self.trend_rsi_buy_max:g}")
+        if rsi < self.oversold: buy_conditions.append(f"RSI<{self.oversold:g}")
+        sell_conditions = []
+        if rsi > self.rsi_sell_min and macd < macd_signal: sell_conditions.append(f"RSI>{self.rsi_sell_min:g} & MACD_Cross")
+        if ema20 < ema50 and rsi > self.trend_rsi_sell_min: sell_conditions.append(f"EMA_Cross & RSI>{self.trend_rsi_sell_min:g}")
+        if rsi > self.overbought: sell_conditions.append(f"RSI>{self.overbought:g}")
+        return self.signals(values, buy_conditions, sell_conditions)
+
+
+@register_strategy
+class TrendRsiStrategy(Strategy):
+    """trading_bot.main's rules: trade with the SMA20/SMA50 trend, or fade RSI(14) extremes"""
+
+    name = 'trend_rsi'
+    schema = Schema(
+        oversold=Param(float, 30.0, 0, 100, doc="Buy below this RSI regardless of trend"),
+        overbought=Param(float, 70.0, 0, 100, doc="Sell above this RSI regardless of trend"),
+    )
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.oversold = params['oversold']
+        self.overbought = params['overbought']
+
+    def evaluate(self, values):
+        sma20, sma50, rsi = values['SMA20'], values['SMA50'], values['RSI14']
+        buy_conditions = []
+        if sma20 > sma50 and rsi < self.overbought: buy_conditions.append(f"Uptrend & RSI<{self.overbought:g}")
+        if rsi < self.oversold: buy_conditions.append(f"RSI<{self.oversold:g}")
+        sell_conditions = []
+        if sma20 < sma50 and rsi > self.oversold: sell_conditions.append(f"Downtrend & RSI>{self.oversold:g}")
+        if rsi > self.overbought: sell_conditions.append(f"RSI>{self.overbought:g}")
+        return self.signals(values, buy_conditions, sell_conditions)
+
+
+@register_strategy
+class ModelStrategy(Strategy):
+    """Signals from a CPU model (scikit-learn pickle or ONNX) scoring the feature row of features.py
+
+    The score is the model's probability that the close is higher after
+    the label horizon, i.e. a classifier trained on features.up_labels.
+    Only the last closed bar is scored, the same row batch_features
+    builds for training; the forming bar's partial range, body and
+    indicators never reach the model. The engine trades one symbol, so
+    each evaluation scores a single row, cached until the next bar closes.
+    """
+
+    name = 'model'
+    schema = Schema(
+        model=Param(str, 'model.onnx', doc="Model file: .onnx for ONNX Runtime, anything else a pickled estimator"),
+        buy_above=Param(float, 0.6, 0, 1, doc="Buy when the up-move probability is at or above this"),
+        sell_below=Param(float, 0.4, 0, 1, doc="Sell when the up-move probability is at or below this"),
+        budget_ms=Param(float, 5.0, 0.1, 1000, doc="Inference latency budget per evaluation"),
+    )
+
+    def __init__(self, params):
+        from features import InferenceStage, load_model
+        super().__init__(params)
+        self.buy_above = params['buy_above']
+        self.sell_below = params['sell_below']
+        try:
+            model = load_model(params['model'])
+        except Exception as e:
+            raise ValueError(f"Cannot load model {params['model']}: {str(e)}")
+        self.stage = InferenceStage(model, [self.name], params['budget_ms'])
+
+    def evaluate(self, values):
+        # Scores are cached per feature row, so the model runs once per closed bar
+        closed = values.get('closed')
+        score = None
+        if closed is not None:
+            self.stage.submit(self.name, closed)
+            self.stage.run()
+            score = self.stage.score(self.name)
+        buy_conditions = []
+        sell_conditions = []
+        if score is not None:
+            if score >= self.buy_above: buy_conditions.append(f"Model {score:.2f}>={self.buy_above:g}")
+            if score <= self.sell_below: sell_conditions.append(f"Model {score:.2f}<={self.sell_below:g}")
+        signals = self.signals(values, buy_conditions, sell_conditions)
+        signals['model_score'] = score
+        return signals
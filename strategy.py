@@ -81,6 +81,15 @@ class TradingStrategy:
             self.logger.error(f"Error getting latest signal: {str(e)}")
             return None
 
+    def get_basket_signals(self, basket):
+        """get_latest_signal for every symbol of a basket.Basket in one vectorized pass"""
+        from basket import basket_indicators, latest_signals
+        try:
+            return latest_signals(basket_indicators(basket, self.short_window, self.long_window))
+        except Exception as e:
+            self.logger.error(f"Error getting basket signals: {str(e)}")
+            return None
+
     def should_close_position(self, df, position_type):
         """Determine if a position should be closed"""
         try:
@@ -1,24 +1,37 @@
 import os
 import logging
-from telegram.ext import Application
-from telegram.error import TelegramError
-from dotenv import load_dotenv
+import asyncio
+import threading
+from concurrent.futures import wait
 
 class TelegramNotifier:
     def __init__(self):
-        load_dotenv()
-        self.bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-        self.chat_id = os.getenv('TELEGRAM_CHAT_ID')
+        self.bot_token = None
+        self.chat_id = None
         self.bot = None
-        self.initialize()
+        self.initialized = False
+        self.loop = None
+        self.loop_thread = None
+        self.pending = set()
+        self.lock = threading.Lock()
 
     def initialize(self):
-        """Initialize Telegram bot"""
+        """Initialize Telegram bot on first use"""
+        if self.initialized:
+            return self.bot is not None
+        self.initialized = True
         try:
+            # Deferred so importing the bot does not pull in python-telegram-bot
+            from dotenv import load_dotenv
+            from telegram.ext import Application
+
+            load_dotenv()
+            self.bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
+            self.chat_id = os.getenv('TELEGRAM_CHAT_ID')
             if not self.bot_token or not self.chat_id:
                 logging.error("Telegram bot token or chat ID not found in environment variables")
                 return False
-            
+
             self.bot = Application.builder().token(self.bot_token).build()
             logging.info("Telegram bot initialized successfully")
             return True
@@ -26,13 +39,32 @@ class TelegramNotifier:
             logging.error(f"Failed to initialize Telegram bot: {str(e)}")
             return False
 
+    def post(self, coro):
+        """Run a notification coroutine on a background event loop without waiting for it"""
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+                self.loop_thread.start()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        self.pending.add(future)
+        future.add_done_callback(self.pending.discard)
+        return future
+
+    def flush(self, timeout=5):
+        """Wait for notifications that are still being sent"""
+        if self.pending:
+            wait(list(self.pending), timeout=timeout)
+
     async def send_message(self, message):
         """Send message to Telegram group"""
+        from telegram.error import TelegramError
+
         try:
-            if not self.bot:
+            if not self.initialize():
                 logging.error("Telegram bot not initialized")
                 return False
-            
+
             await self.bot.bot.send_message(
                 chat_id=self.chat_id,
                 text=message,
@@ -52,12 +84,12 @@ class TelegramNotifier:
             f"Volume: {volume}\n"
             f"Price: {price}\n"
         )
-        
+
         if sl:
             message += f"Stop Loss: {sl}\n"
         if tp:
             message += f"Take Profit: {tp}\n"
-        
+
         return await self.send_message(message)
 
     async def send_error_notification(self, error_message):
@@ -73,4 +105,4 @@ class TelegramNotifier:
             f"Equity: {equity}\n"
             f"Profit: {profit}\n"
         )
-        return await self.send_message(message) 
\ No newline at end of file
+        return await self.send_message(message)
\ No newline at end of file
@@ -0,0 +1,222 @@
+import json
+import logging
+import os
+import time
+import numpy as np
+
+from lazy import LazyModule
+from timeframes import RATE_DTYPE, BarBuffer, timeframe_minutes
+
+mt5 = LazyModule('MetaTrader5')
+
+CHECKPOINT_VERSION = 1
+
+
+class TickBarBuilder:
+    """Maintains the forming bar of one symbol/timeframe from tick deltas
+
+    Closed bars are kept in an array-backed ring buffer and committed to the
+    incremental indicators once. Every new tick only updates the forming
+    bar in place, and evaluate() peeks the indicators with it, so a
+    tick-driven decision is O(1) and never needs a bar refetch.
+    """
+
+    def __init__(self, symbol, timeframe, indicators, capacity=500, ticks_per_poll=1000, tick_source=None,
+                 events=None):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.seconds = timeframe_minutes(timeframe) * 60
+        self.indicators = indicators
+        self.bars = BarBuffer(capacity)
+        self.forming = np.zeros(1, dtype=RATE_DTYPE)[0]
+        self.has_forming = False
+        self.last_time_msc = 0
+        self.last_values = None
+        self.closed_values = None  # Indicator values and OHLC of the last closed bar
+        self.ticks_seen = 0  # Ticks applied so far, for tick arrival rates
+        self.ticks_per_poll = ticks_per_poll
+        self.tick_source = tick_source  # e.g. a market_bus.MarketDataReader instead of the terminal
+        self.events = events  # Optional events.EventLog receiving every new tick
+
+    def seed(self, rates, last_time_msc):
+        """Start from terminal bars (oldest first, last one forming) and the latest tick time"""
+        for bar in rates[:-1]:
+            self._commit(bar)
+        self.forming = rates[-1].copy()
+        self.has_forming = True
+        self.last_time_msc = last_time_msc
+        self.last_values = None
+
+    def seed_from_terminal(self, history=200):
+        """Seed once from copy_rates_from_pos; afterwards only ticks are fetched"""
+        rates = mt5.copy_rates_from_pos(self.symbol, self.timeframe, 0, history)
+        tick = mt5.symbol_info_tick(self.symbol)
+        if rates is None or len(rates) == 0 or tick is None:
+            logging.error(f"Failed to seed tick bar builder for {self.symbol}")
+            return False
+        self.seed(rates, tick.time_msc)
+        return True
+
+    def save_checkpoint(self, path):
+        """Write bars, the forming bar and the indicator state to a compressed .npz file
+
+        The file is written to a temporary name and renamed, so a crash
+        mid-write never leaves a truncated checkpoint behind.
+        """
+        meta = {
+            'version': CHECKPOINT_VERSION,
+            'symbol': self.symbol,
+            'timeframe': self.timeframe,
+            'last_time_msc': int(self.last_time_msc),
+            'has_forming': self.has_forming,
+            'indicators': self.indicators.state(),
+            'saved_at': time.time(),
+        }
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(
+                f, bars=self.bars.last(), forming=np.array([self.forming], dtype=RATE_DTYPE),
+                meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8),
+            )
+        os.replace(tmp, path)
+
+    def restore_checkpoint(self, path):
+        """Load a checkpoint written by save_checkpoint; returns False if it is missing or does not match"""
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path) as data:
+                meta = json.loads(data['meta'].tobytes().decode())
+                bars = data['bars']
+                forming = data['forming'][0]
+            if meta.get('version') != CHECKPOINT_VERSION or meta['symbol'] != self.symbol \
+                    or meta['timeframe'] != self.timeframe or not meta['has_forming']:
+                logging.info(f"Ignoring checkpoint {path}: saved for another symbol or timeframe")
+                return False
+            self.indicators.load_state(meta['indicators'])
+        except (OSError, KeyError, ValueError) as e:
+            logging.error(f"Failed to load checkpoint {path}: {str(e)}")
+            return False
+
+        self.bars = BarBuffer(self.bars.capacity)
+        for bar in bars:
+            self.bars.append(bar)
+        self.forming = forming.copy()
+        self.has_forming = True
+        self.last_time_msc = meta['last_time_msc']
+        self.last_values = None
+        self.closed_values = None  # Unknown until the next bar closes
+        return True
+
+    def catch_up(self):
+        """Apply only the bars missed since the checkpoint; returns False if a full reseed is needed
+
+        The checkpointed forming bar is replaced by the terminal's final
+        version of it, then every later bar but the newest is committed.
+        """
+        tick = mt5.symbol_info_tick(self.symbol)
+        if tick is None:
+            return False
+        missed = max(int(tick.time - self.forming['time']) // self.seconds, 0) + 2
+        if missed > self.bars.capacity:
+            return False
+        rates = mt5.copy_rates_from_pos(self.symbol, self.timeframe, 0, missed)
+        if rates is None or len(rates) == 0 or rates[0]['time'] > self.forming['time']:
+            return False
+        rates = rates[rates['time'] >= self.forming['time']]
+        for bar in rates[:-1]:
+            self._commit(bar)
+        self.forming = rates[-1].copy()
+        self.last_time_msc = max(self.last_time_msc, tick.time_msc)
+        self.last_values = None
+        logging.info(f"Warm restart of {self.symbol}: caught up {len(rates) - 1} bar(s)")
+        return True
+
+    def resume(self, path):
+        """Warm start from a checkpoint plus the missed bars"""
+        return self.restore_checkpoint(path) and self.catch_up()
+
+    def _commit(self, bar):
+        self.bars.append(bar)
+        values = self.indicators.update(bar)
+        for field in ('open', 'high', 'low', 'close'):
+            values[field] = float(bar[field])
+        values['time'] = int(bar['time'])
+        self.closed_values = values
+
+    def poll(self):
+        """Fetch ticks newer than the last one seen; returns True when the bar changed"""
+        if self.tick_source is not None:
+            ticks = self.tick_source.read_ticks()
+        else:
+            ticks = mt5.copy_ticks_from(self.symbol, self.last_time_msc // 1000, self.ticks_per_poll,
+                                        mt5.COPY_TICKS_ALL)
+        if ticks is None or len(ticks) == 0:
+            return False
+        ticks = ticks[ticks['time_msc'] > self.last_time_msc]
+        if len(ticks) == 0:
+            return False
+        if self.events is not None:
+            self.events.ticks(self.symbol, ticks['time_msc'], ticks['bid'], ticks['ask'])
+        self.on_ticks(ticks['time_msc'], ticks['bid'])
+        return True
+
+    def on_tick(self, time_msc, price):
+        """Apply a single tick, e.g. from symbol_info_tick"""
+        if time_msc <= self.last_time_msc:
+            return False
+        self.on_ticks(np.array([time_msc]), np.array([price]))
+        return True
+
+    def on_ticks(self, time_msc, prices):
+        """Apply a batch of ticks, splitting it only where a bar boundary is crossed"""
+        buckets = (time_msc // 1000) // self.seconds * self.seconds
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        ends = np.concatenate((starts[1:], [len(buckets)]))
+
+        for start, end in zip(starts, ends):
+            bucket = buckets[start]
+            segment = prices[start:end]
+            if self.has_forming and bucket != self.forming['time']:
+                self._commit(self.forming.copy())
+                self.has_forming = False
+            if not self.has_forming:
+                self.forming['time'] = bucket
+                self.forming['open'] = segment[0]
+                self.forming['high'] = segment.max()
+                self.forming['low'] = segment.min()
+                self.forming['tick_volume'] = 0
+                self.has_forming = True
+            else:
+                self.forming['high'] = max(self.forming['high'], segment.max())
+                self.forming['low'] = min(self.forming['low'], segment.min())
+            self.forming['close'] = segment[-1]
+            self.forming['tick_volume'] += end - start
+
+        self.last_time_msc = int(time_msc[-1])
+        self.ticks_seen += len(time_msc)
+        self.last_values = None
+
+    def evaluate(self):
+        """Indicator values on the forming bar, cached until the next tick
+
+        values['closed'] holds the last closed bar's values (None until
+        one has closed), for strategies that only act on complete bars.
+        """
+        if not self.has_forming:
+            return None
+        if self.last_values is None:
+            values = self.indicators.peek(self.forming)
+            for field in ('open', 'high', 'low', 'close'):
+                values[field] = float(self.forming[field])
+            values['time'] = int(self.forming['time'])
+            values['closed'] = self.closed_values
+            self.last_values = values
+        return self.last_values
+
+    def get_rates(self, count=100):
+        """Closed bars plus the forming bar, oldest first"""
+        rates = self.bars.last(count - 1 if self.has_forming else count)
+        if self.has_forming:
+            rates = np.concatenate([rates, np.array([self.forming], dtype=RATE_DTYPE)])
+        return rates
@@ -0,0 +1,222 @@
+import logging
+import time
+import numpy as np
+
+from lazy import LazyModule
+
+mt5 = LazyModule('MetaTrader5')
+pd = LazyModule('pandas')
+
+# Bar layout returned by mt5.copy_rates_from_pos
+RATE_DTYPE = np.dtype([
+    ('time', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'), ('close', 'f8'),
+    ('tick_volume', 'i8'), ('spread', 'i4'), ('real_volume', 'i8'),
+])
+
+# Timeframe names and MT5 TIMEFRAME_* constant values mapped to minutes
+TIMEFRAME_MINUTES = {
+    'M1': 1, 'M2': 2, 'M3': 3, 'M4': 4, 'M5': 5, 'M6': 6, 'M10': 10, 'M12': 12,
+    'M15': 15, 'M20': 20, 'M30': 30, 'H1': 60, 'H2': 120, 'H3': 180, 'H4': 240,
+    'H6': 360, 'H8': 480, 'H12': 720, 'D1': 1440,
+    1: 1, 2: 2, 3: 3, 4: 4, 5: 5, 6: 6, 10: 10, 12: 12, 15: 15, 20: 20, 30: 30,
+    16385: 60, 16386: 120, 16387: 180, 16388: 240, 16390: 360, 16392: 480,
+    16396: 720, 16408: 1440,
+}
+
+
+def timeframe_minutes(timeframe):
+    """Minutes per bar for a timeframe name ('M15') or MT5 constant (mt5.TIMEFRAME_M15)"""
+    try:
+        return TIMEFRAME_MINUTES[timeframe]
+    except KeyError:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+
+
+class BarBuffer:
+    """Fixed-capacity ring buffer of closed bars in RATE_DTYPE layout"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=RATE_DTYPE)
+        self.count = 0  # Total bars ever appended
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, bar):
+        self.data[self.count % self.capacity] = bar
+        self.count += 1
+
+    def last(self, n=None):
+        """Last n closed bars, oldest first"""
+        size = len(self)
+        n = size if n is None else min(n, size)
+        if n == 0:
+            return self.data[:0].copy()
+        end = self.count % self.capacity
+        idx = (np.arange(end - n, end)) % self.capacity
+        return self.data[idx]
+
+
+class TimeframeAggregator:
+    """Builds higher timeframe bars incrementally from a stream of M1 bars
+
+    Closed M1 bars are folded into every subscribed timeframe's forming
+    bar; a timeframe bar closes when the first M1 bar of the next bucket
+    arrives. The still-forming M1 bar is merged in only when bars are read,
+    so updates to it never have to be rolled back. All timeframes are
+    bucketed on the epoch and fed from the same M1 stream, which keeps
+    their boundaries aligned.
+    """
+
+    def __init__(self, timeframes, capacity=1000):
+        self.minutes = {tf: timeframe_minutes(tf) for tf in timeframes}
+        self.buffers = {tf: BarBuffer(capacity) for tf in timeframes}
+        self.partial = {tf: None for tf in timeframes}
+        self.truncated = {tf: False for tf in timeframes}
+        self.forming_m1 = None
+        self.last_closed_time = None
+        self.listeners = {tf: [] for tf in timeframes}
+
+    def subscribe(self, timeframe, callback):
+        """Call callback(timeframe, bar) every time a bar of this timeframe closes"""
+        if timeframe not in self.buffers:
+            raise ValueError(f"Timeframe {timeframe} is not aggregated")
+        self.listeners[timeframe].append(callback)
+
+    def update(self, rates):
+        """Feed M1 bars (oldest first); the last one is treated as still forming"""
+        if rates is None or len(rates) == 0:
+            return
+        for bar in rates[:-1]:
+            self._close_m1(bar)
+        self.forming_m1 = rates[-1].copy()
+
+    def _close_m1(self, bar):
+        if self.last_closed_time is not None and bar['time'] <= self.last_closed_time:
+            return  # Already aggregated
+        first = self.last_closed_time is None
+        self.last_closed_time = int(bar['time'])
+
+        for tf, minutes in self.minutes.items():
+            bucket = bar['time'] // (minutes * 60) * (minutes * 60)
+            partial = self.partial[tf]
+            if partial is not None and partial['time'] != bucket:
+                # The first bucket of the stream may start mid-bar and is dropped
+                if not self.truncated[tf]:
+                    self._emit(tf, partial)
+                self.truncated[tf] = False
+                partial = None
+            if partial is None:
+                if first:
+                    self.truncated[tf] = bar['time'] != bucket
+                partial = bar.copy()
+                partial['time'] = bucket
+            else:
+                partial['high'] = max(partial['high'], bar['high'])
+                partial['low'] = min(partial['low'], bar['low'])
+                partial['close'] = bar['close']
+                partial['tick_volume'] += bar['tick_volume']
+                partial['real_volume'] += bar['real_volume']
+                partial['spread'] = bar['spread']
+            self.partial[tf] = partial
+
+            # A 1-minute timeframe closes with every M1 bar
+            if minutes == 1:
+                self._emit(tf, partial)
+                self.partial[tf] = None
+
+    def _emit(self, tf, bar):
+        self.buffers[tf].append(bar)
+        for callback in self.listeners[tf]:
+            try:
+                callback(tf, bar)
+            except Exception as e:
+                logging.error(f"Error in {tf} bar listener: {str(e)}")
+
+    def forming_bar(self, timeframe):
+        """Current forming bar of a timeframe including the forming M1 bar, or None"""
+        minutes = self.minutes[timeframe]
+        partial = self.partial[timeframe]
+        m1 = self.forming_m1
+        if m1 is None:
+            return None if partial is None else partial.copy()
+
+        bucket = m1['time'] // (minutes * 60) * (minutes * 60)
+        if partial is None or partial['time'] != bucket:
+            bar = m1.copy()
+            bar['time'] = bucket
+            return bar
+        bar = partial.copy()
+        bar['high'] = max(bar['high'], m1['high'])
+        bar['low'] = min(bar['low'], m1['low'])
+        bar['close'] = m1['close']
+        bar['tick_volume'] += m1['tick_volume']
+        bar['real_volume'] += m1['real_volume']
+        bar['spread'] = m1['spread']
+        return bar
+
+    def get_rates(self, timeframe, count=100, include_forming=True):
+        """Last count bars of a timeframe as a rates array, oldest first"""
+        minutes = self.minutes[timeframe]
+        forming = self.forming_bar(timeframe) if include_forming else None
+        # A partial bucket the forming M1 bar has moved past is complete but not emitted yet
+        partial = self.partial[timeframe]
+        m1 = self.forming_m1
+        pending = (
+            partial is not None and m1 is not None and not self.truncated[timeframe]
+            and partial['time'] != m1['time'] // (minutes * 60) * (minutes * 60)
+        )
+
+        closed_count = count - (forming is not None) - pending
+        rates = self.buffers[timeframe].last(max(closed_count, 0))
+        extra = [bar for bar, use in ((partial, pending), (forming, forming is not None)) if use]
+        if extra:
+            rates = np.concatenate([rates, np.array(extra, dtype=RATE_DTYPE)])
+        return rates[-count:]
+
+
+def rates_to_frame(rates):
+    """Convert a rates array to the DataFrame layout used by get_market_data"""
+    df = pd.DataFrame(rates)
+    df['time'] = pd.to_datetime(df['time'], unit='s')
+    return df
+
+
+class MultiTimeframeFeed:
+    """Serves any number of timeframes for one symbol from a single M1 request per poll"""
+
+    def __init__(self, symbol, timeframes, history=100):
+        self.symbol = symbol
+        self.history = history
+        self.timeframes = list(dict.fromkeys(list(timeframes)))
+        largest = max(timeframe_minutes(tf) for tf in self.timeframes)
+        self.warmup_bars = largest * (history + 1)
+        self.aggregator = TimeframeAggregator(self.timeframes, capacity=max(history * 2, 500))
+        self.last_poll = None
+
+    def subscribe(self, timeframe, callback):
+        self.aggregator.subscribe(timeframe, callback)
+
+    def poll(self):
+        """Fetch only the M1 bars missed since the previous poll and aggregate them"""
+        now = time.monotonic()
+        if self.last_poll is None:
+            count = self.warmup_bars
+        else:
+            # Minutes elapsed since the last poll plus the previously forming bar
+            count = min(int((now - self.last_poll) // 60) + 3, self.warmup_bars)
+        rates = mt5.copy_rates_from_pos(self.symbol, mt5.TIMEFRAME_M1, 0, count)
+        if rates is None or len(rates) == 0:
+            logging.error(f"Failed to get M1 data for {self.symbol}")
+            return False
+        self.aggregator.update(rates)
+        self.last_poll = now
+        return True
+
+    def get_rates(self, timeframe, count=100):
+        return self.aggregator.get_rates(timeframe, count)
+
+    def get_bars(self, timeframe, count=100):
+        """Bars of any aggregated timeframe as a DataFrame, without a terminal call"""
+        return rates_to_frame(self.get_rates(timeframe, count))
@@ -1,13 +1,27 @@
-import MetaTrader5 as mt5
-import pandas as pd
-import numpy as np
 from datetime import datetime
 import time
 import os
-from dotenv import load_dotenv
 import logging
 import asyncio
+import threading
+from lazy import LazyModule
 from telegram_notifier import TelegramNotifier
+from connection import ConnectionSupervisor, CONNECTED, DISCONNECTED
+from records import Fill, OrderRequest, PositionTable, MAGIC
+from exits import ExitEvaluator
+from grid import GridEngine
+from position_manager import PositionManager
+from execution import ExecutionLog, order_side
+from events import EventLog, EventLogHandler
+from account import AccountMonitor
+from gate import ExecutionGate
+from config import ConfigWatcher, Param, Schema, config_section
+from sessions import SessionScheduler
+from pacing import LoopRateController
+
+# Heavy dependencies are imported on first use to keep startup fast
+mt5 = LazyModule('MetaTrader5')
+pd = LazyModule('pandas')
 
 # Configure logging
 logging.basicConfig(
@@ -20,24 +34,94 @@ logging.basicConfig(
 )
 
 class ForexTradingBot:
-    def __init__(self, symbol="XAUUSDm", timeframe=mt5.TIMEFRAME_M15):
-        load_dotenv()
+    SCHEMA = Schema(
+        max_positions=Param(int, 3, min=1, max=100, doc="Maximum number of positions per direction"),
+        grid_spacing=Param(float, 0.2, min=0.01, max=10, doc="Grid spacing in percentage"),
+        take_profit=Param(float, 0.3, min=0.01, max=50, doc="Take profit in percentage"),
+        stop_loss=Param(float, 0.5, min=0.01, max=50, doc="Stop loss in percentage"),
+    )
+
+    def __init__(self, symbol="XAUUSDm", timeframe=None, **params):
         self.symbol = symbol
-        self.timeframe = timeframe
+        self.timeframe = timeframe if timeframe is not None else 15  # mt5.TIMEFRAME_M15
         self.initialized = False
+        self.connect_attempted = False
         self.telegram = TelegramNotifier()
-        self.max_positions = 3  # Maximum number of positions per direction
-        self.grid_spacing = 0.2  # Grid spacing in percentage
-        self.take_profit = 0.3  # Take profit in percentage
-        self.stop_loss = 0.5    # Stop loss in percentage
-        self.initialize_mt5()
+        self.config_lock = threading.Lock()  # Held while parameters are swapped, see configure()
+        # max_positions, grid_spacing, take_profit and stop_loss, see SCHEMA
+        for name, value in self.SCHEMA.validate(params).items():
+            setattr(self, name, value)
+        self.feed = None        # Optional M1-based multi-timeframe feed
+        self.positions = PositionTable()  # Reused on every refresh
+        self.contract_sizes = {}  # Symbol -> contract size, fetched once per symbol
+        self.last_ticks = {}      # Symbol -> latest tick seen by get_quotes
+        self.executions = ExecutionLog()  # Every order_send with its decision tick and result
+        # Binary log of ticks, signals, orders and errors; error log records are copied into it
+        self.events = EventLog()
+        self.event_handler = EventLogHandler(self.events)
+        logging.getLogger().addHandler(self.event_handler)
+        self.journal = None       # SQLite trade journal, opened on the first sync
+        # Cached balance/equity for sizing, risk and the UI, polled adaptively once connected
+        self.account = AccountMonitor(self.get_account_info)
+        # Cooldowns, signal idempotency and in-flight tracking for market orders
+        self.gate = ExecutionGate()
+        self.ever_connected = False
+        # Probes the terminal and reconnects with backoff after a drop
+        self.supervisor = ConnectionSupervisor(self.connect_mt5)
+        self.supervisor.add_listener(self.on_connection_state)
+
+    def configure(self, **params):
+        """Validate and apply strategy parameters (see SCHEMA)
+
+        All values change together under config_lock, so a loop holding
+        the lock never sees half of a reloaded config.
+        """
+        params = self.SCHEMA.validate(params, base=self.params())
+        with self.config_lock:
+            for name, value in params.items():
+                setattr(self, name, value)
+
+    def params(self):
+        return {name: getattr(self, name) for name in self.SCHEMA.params}
+
+    def ensure_initialized(self):
+        """Connect to MT5 on first use instead of at construction"""
+        if not self.connect_attempted:
+            self.connect_attempted = True
+            self.supervisor.try_connect()
+            self.supervisor.start()
+        return self.initialized
+
+    def connect_mt5(self):
+        """Connection attempt used by the supervisor; failures are only notified at startup"""
+        if self.ever_connected:
+            mt5.shutdown()
+        return self.initialize_mt5(notify=not self.ever_connected and self.supervisor.attempts == 0)
 
-    def initialize_mt5(self):
+    def on_connection_state(self, state, previous):
+        """Track the supervisor's connection state and notify on transitions"""
+        self.initialized = state == CONNECTED
+        if state == CONNECTED:
+            if self.ever_connected:
+                message = "✅ MT5 connection restored"
+            else:
+                message = "🤖 Trading bot initialized successfully"
+            self.ever_connected = True
+            self.account.start()
+            self.account.touch()
+            self.telegram.post(self.telegram.send_message(message))
+        elif state == DISCONNECTED and previous == CONNECTED:
+            self.telegram.post(self.telegram.send_error_notification(
+                f"MT5 connection lost: {self.supervisor.last_error}"
+            ))
+
+    def initialize_mt5(self, notify=True):
         """Initialize connection to MT5"""
         if not mt5.initialize():
-            error_msg = "MT5 initialization failed"
+            error_msg = f"MT5 initialization failed: {mt5.last_error()}"
             logging.error(error_msg)
-            asyncio.run(self.telegram.send_error_notification(error_msg))
+            if notify:
+                self.telegram.post(self.telegram.send_error_notification(error_msg))
             return False
         
         # Check if the symbol exists
@@ -45,7 +129,8 @@ class ForexTradingBot:
         if symbol_info is None:
             error_msg = f"Symbol {self.symbol} not found in Market Watch"
             logging.error(error_msg)
-            asyncio.run(self.telegram.send_error_notification(error_msg))
+            if notify:
+                self.telegram.post(self.telegram.send_error_notification(error_msg))
             return False
 
         # If the symbol is not visible in MarketWatch, add it
@@ -53,32 +138,53 @@ class ForexTradingBot:
             if not mt5.symbol_select(self.symbol, True):
                 error_msg = f"Failed to select {self.symbol}"
                 logging.error(error_msg)
-                asyncio.run(self.telegram.send_error_notification(error_msg))
+                if notify:
+                    self.telegram.post(self.telegram.send_error_notification(error_msg))
                 return False
         
-        self.initialized = True
         logging.info("MT5 initialized successfully")
-        asyncio.run(self.telegram.send_message("🤖 Trading bot initialized successfully"))
         return True
 
     def get_account_info(self):
         """Get account information"""
-        if not self.initialized:
+        if not self.ensure_initialized():
             return None
         return mt5.account_info()
 
+    def enable_multi_timeframe(self, timeframes, history=100):
+        """Serve all given timeframes (plus the bot's own) from a single M1 feed"""
+        from timeframes import MultiTimeframeFeed
+
+        self.feed = MultiTimeframeFeed(self.symbol, [self.timeframe] + list(timeframes), history)
+        return self.feed
+
+    def get_bars(self, timeframe, num_candles=100):
+        """Bars of any timeframe aggregated by the M1 feed, without a terminal call"""
+        if self.feed is None:
+            return None
+        return self.feed.get_bars(timeframe, num_candles)
+
     def get_market_data(self, num_candles=100):
         """Fetch recent market data"""
-        if not self.initialized:
+        if not self.ensure_initialized():
             return None
         
         try:
+            if self.feed is not None:
+                # A single M1 request refreshes every subscribed timeframe
+                if not self.feed.poll():
+                    return None
+                return self.feed.get_bars(self.timeframe, num_candles)
+
             # First check if we can get the current tick
             tick = mt5.symbol_info_tick(self.symbol)
             if tick is None:
                 error_msg = f"Failed to get current tick for {self.symbol}"
                 logging.error(error_msg)
-                asyncio.run(self.telegram.send_error_notification(error_msg))
+                # A dropped terminal is reported once by the supervisor, not on every loop
+                if not self.supervisor.report_failure():
+                    return None
+                self.telegram.post(self.telegram.send_error_notification(error_msg))
                 return None
 
             # Then try to get the historical data
@@ -86,7 +192,9 @@ class ForexTradingBot:
             if rates is None:
                 error_msg = f"Failed to get market data for {self.symbol}"
                 logging.error(error_msg)
-                asyncio.run(self.telegram.send_error_notification(error_msg))
+                if not self.supervisor.report_failure():
+                    return None
+                self.telegram.post(self.telegram.send_error_notification(error_msg))
                 return None
             
             df = pd.DataFrame(rates)
@@ -100,76 +208,116 @@ class ForexTradingBot:
         except Exception as e:
             error_msg = f"Error getting market data: {str(e)}"
             logging.error(error_msg)
-            asyncio.run(self.telegram.send_error_notification(error_msg))
+            self.telegram.post(self.telegram.send_error_notification(error_msg))
             return None
 
-    def place_order(self, order_type, volume, price=None, sl=None, tp=None):
-        """Place a market order"""
-        if not self.initialized:
-            logging.error("MT5 not initialized")
+    def send_order(self, request, tick=None):
+        """order_send an OrderRequest and record it, with the decision tick, in the execution log
+
+        Returns a Fill, or None when order_send returned nothing.
+        """
+        sent_at = time.time()
+        started = time.perf_counter()
+        result = mt5.order_send(request.to_dict())
+        latency_ms = (time.perf_counter() - started) * 1000
+        result = Fill.from_result(result) if result is not None else None
+        if result is not None:
+            self.account.touch()
+            self.events.order(request.symbol or '', order_side(request.type), result.retcode,
+                              result.price or request.price or 0.0, request.volume or 0.0, result.comment)
+        else:
+            self.events.order(request.symbol or '', order_side(request.type), -1, request.price or 0.0,
+                              request.volume or 0.0)
+        try:
+            self.executions.record(request, result, latency_ms, tick, sent_at)
+        except Exception as e:
+            logging.error(f"Failed to record execution: {str(e)}")
+        return result
+
+    def place_order(self, order_type, volume, price=None, sl=None, tp=None, key=None):
+        """Place a market order through the execution gate; returns None when it is held back
+
+        key identifies the signal (e.g. bar time and conditions) so it is sent at most once.
+        The key is only released for another try when the order was never sent or the
+        terminal rejected it; when order_send returns nothing the order may still have
+        been filled, so the signal is not resent.
+        """
+        side = 1 if order_type == mt5.ORDER_TYPE_BUY else -1
+        if not self.gate.admit(self.symbol, side, key):
+            logging.info(f"Order held back by the execution gate: {key or self.symbol}")
             return None
+        sent, result = False, None
+        try:
+            sent, result = self._place_order(order_type, volume, price, sl, tp)
+        finally:
+            rejected = not sent or (result is not None and not result.filled)
+            self.gate.complete(self.symbol, side, key, success=not rejected)
+        return result if result is not None and result.filled else None
 
+    def _place_order(self, order_type, volume, price, sl, tp):
+        """Returns (sent, result): whether order_send was called, and what it returned"""
+        if not self.ensure_initialized():
+            logging.error("MT5 not initialized")
+            return False, None
+
+        sent = False
         try:
             # Get symbol info
             symbol_info = mt5.symbol_info(self.symbol)
             if symbol_info is None:
                 logging.error(f"Failed to get symbol info for {self.symbol}")
-                return None
+                return False, None
 
             # Check if symbol is available for trading
             if not symbol_info.visible:
                 if not mt5.symbol_select(self.symbol, True):
                     logging.error(f"Failed to select {self.symbol}")
-                    return None
+                    return False, None
 
-            # Get current price if not provided
+            # Tick the decision is made on, also used as the price if none was provided
+            tick = mt5.symbol_info_tick(self.symbol)
             if price is None:
-                tick = mt5.symbol_info_tick(self.symbol)
                 if tick is None:
                     logging.error(f"Failed to get current price for {self.symbol}")
-                    return None
+                    return False, None
                 price = tick.ask if order_type == mt5.ORDER_TYPE_BUY else tick.bid
 
             # Prepare the trade request
-            point = symbol_info.point
-            request = {
-                "action": mt5.TRADE_ACTION_DEAL,
-                "symbol": self.symbol,
-                "volume": volume,
-                "type": order_type,
-                "price": price,
-                "sl": sl,
-                "tp": tp,
-                "deviation": 20,
-                "magic": 234000,
-                "comment": "python script order",
-                "type_time": mt5.ORDER_TIME_GTC,
-                "type_filling": mt5.ORDER_FILLING_IOC,
-            }
+            request = OrderRequest(
+                mt5.TRADE_ACTION_DEAL, self.symbol, volume, order_type,
+                price=price, sl=sl, tp=tp, comment="python script order"
+            )
 
             # Log the request details
             logging.info(f"Placing order: {request}")
 
             # Send the order
-            result = mt5.order_send(request)
+            sent = True
+            result = self.send_order(request, tick)
             if result is None:
-                logging.error("Order send failed - result is None")
-                return None
+                error_msg = f"Order send returned no result, outcome unknown: {request}"
+                logging.error(error_msg)
+                self.telegram.post(self.telegram.send_error_notification(error_msg))
+                return True, None
 
             # Check the result
-            if result.retcode != mt5.TRADE_RETCODE_DONE:
+            if not result.filled:
                 error_msg = f"Order failed: {result.comment} (retcode: {result.retcode})"
                 logging.error(error_msg)
-                asyncio.run(self.telegram.send_error_notification(error_msg))
-                return None
-            
-            # Log successful order
+                self.telegram.post(self.telegram.send_error_notification(error_msg))
+                return True, result
+
             action = "BUY" if order_type == mt5.ORDER_TYPE_BUY else "SELL"
+            if result.partial:
+                logging.warning(f"Order partially filled: {action} {result.volume} of {volume} {self.symbol}")
+                volume = result.volume
+
+            # Log successful order
             success_msg = f"Order placed successfully: {action} {volume} {self.symbol} at {price}"
             logging.info(success_msg)
             
             # Send notification
-            asyncio.run(self.telegram.send_trade_notification(
+            self.telegram.post(self.telegram.send_trade_notification(
                 action=action,
                 symbol=self.symbol,
                 volume=volume,
@@ -178,53 +326,125 @@ class ForexTradingBot:
                 tp=tp
             ))
             
-            return result
+            return True, result
 
         except Exception as e:
             error_msg = f"Error placing order: {str(e)}"
             logging.error(error_msg)
-            asyncio.run(self.telegram.send_error_notification(error_msg))
+            self.telegram.post(self.telegram.send_error_notification(error_msg))
+            return sent, None
+
+    def place_pending_order(self, order_type, volume, price, sl=None, tp=None):
+        """Place a pending limit/stop order at price; returns the result or None"""
+        if not self.ensure_initialized():
+            logging.error("MT5 not initialized")
+            return None
+
+        try:
+            symbol_info = mt5.symbol_info(self.symbol)
+            if symbol_info is None:
+                logging.error(f"Failed to get symbol info for {self.symbol}")
+                return None
+
+            digits = symbol_info.digits
+            request = OrderRequest(
+                mt5.TRADE_ACTION_PENDING, self.symbol, volume, order_type,
+                price=round(price, digits),
+                sl=round(sl, digits) if sl is not None else None,
+                tp=round(tp, digits) if tp is not None else None,
+                comment="python script grid", type_filling=mt5.ORDER_FILLING_RETURN
+            )
+            logging.info(f"Placing pending order: {request}")
+
+            result = self.send_order(request, self.last_ticks.get(self.symbol))
+            if result is None or result.retcode != mt5.TRADE_RETCODE_DONE:
+                reason = f"{result.comment} (retcode: {result.retcode})" if result is not None else "no result"
+                error_msg = f"Pending order failed: {reason}"
+                logging.error(error_msg)
+                self.telegram.post(self.telegram.send_error_notification(error_msg))
+                return None
+            return result
+
+        except Exception as e:
+            error_msg = f"Error placing pending order: {str(e)}"
+            logging.error(error_msg)
+            self.telegram.post(self.telegram.send_error_notification(error_msg))
+            return None
+
+    def cancel_order(self, order_id):
+        """Remove a pending order"""
+        if not self.ensure_initialized():
+            return None
+        try:
+            result = self.send_order(OrderRequest(mt5.TRADE_ACTION_REMOVE, order=order_id))
+            if result is None or result.retcode != mt5.TRADE_RETCODE_DONE:
+                reason = result.comment if result is not None else "no result"
+                logging.error(f"Cancel order {order_id} failed: {reason}")
+                return None
+            logging.info(f"Pending order {order_id} cancelled")
+            return result
+        except Exception as e:
+            logging.error(f"Error cancelling order {order_id}: {str(e)}")
             return None
 
+    def get_pending_orders(self):
+        """The bot's pending orders on its symbol, or None when the terminal is unavailable"""
+        if not self.ensure_initialized():
+            return None
+        orders = mt5.orders_get(symbol=self.symbol)
+        if orders is None:
+            return None
+        return [order for order in orders if order.magic == MAGIC]
+
     def close_position(self, position_id):
         """Close a specific position"""
-        if not self.initialized:
+        if not self.ensure_initialized():
+            # Closing is still wanted once the terminal is back, so buffer it
+            self.supervisor.submit(self.close_position, position_id, ttl=60)
             return None
 
         try:
             position = mt5.positions_get(ticket=position_id)
-            if position is None:
+            # None is a failed call, an empty tuple a ticket that is no longer open
+            if not position:
                 error_msg = f"Position {position_id} not found"
                 logging.error(error_msg)
-                asyncio.run(self.telegram.send_error_notification(error_msg))
+                self.telegram.post(self.telegram.send_error_notification(error_msg))
+                return None
+            position = position[0]
+
+            tick = mt5.symbol_info_tick(position.symbol)
+            if tick is None:
+                logging.error(f"Failed to get current price for {position.symbol}")
                 return None
+            # A buy is closed by selling at the bid, a sell by buying at the ask
+            is_buy = position.type == mt5.ORDER_TYPE_BUY
+            price = tick.bid if is_buy else tick.ask
+            request = OrderRequest(
+                mt5.TRADE_ACTION_DEAL, position.symbol, position.volume,
+                mt5.ORDER_TYPE_SELL if is_buy else mt5.ORDER_TYPE_BUY,
+                price=price, position=position_id,
+                comment="python script close"
+            )
 
-            request = {
-                "action": mt5.TRADE_ACTION_DEAL,
-                "symbol": position[0].symbol,
-                "volume": position[0].volume,
-                "type": mt5.ORDER_TYPE_SELL if position[0].type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY,
-                "position": position_id,
-                "price": mt5.symbol_info_tick(position[0].symbol).bid,
-                "deviation": 20,
-                "magic": 234000,
-                "comment": "python script close",
-                "type_time": mt5.ORDER_TIME_GTC,
-                "type_filling": mt5.ORDER_FILLING_IOC,
-            }
-
-            result = mt5.order_send(request)
-            if result.retcode != mt5.TRADE_RETCODE_DONE:
-                error_msg = f"Close position failed: {result.comment}"
+            result = self.send_order(request, tick)
+            if result is None or not result.filled:
+                reason = f"{result.comment} (retcode: {result.retcode})" if result is not None else "no result"
+                error_msg = f"Close position failed: {reason}"
                 logging.error(error_msg)
-                asyncio.run(self.telegram.send_error_notification(error_msg))
+                self.telegram.post(self.telegram.send_error_notification(error_msg))
                 return None
+
+            volume = position.volume
+            if result.partial:
+                logging.warning(f"Position {position_id} partially closed: {result.volume} of {volume}")
+                volume = result.volume
             
-            asyncio.run(self.telegram.send_trade_notification(
+            self.telegram.post(self.telegram.send_trade_notification(
                 action="CLOSE",
-                symbol=position[0].symbol,
-                volume=position[0].volume,
-                price=mt5.symbol_info_tick(position[0].symbol).bid
+                symbol=position.symbol,
+                volume=volume,
+                price=price
             ))
             
             logging.info(f"Position closed successfully: {result.comment}")
@@ -232,32 +452,174 @@ class ForexTradingBot:
         except Exception as e:
             error_msg = f"Error closing position: {str(e)}"
             logging.error(error_msg)
-            asyncio.run(self.telegram.send_error_notification(error_msg))
+            self.telegram.post(self.telegram.send_error_notification(error_msg))
+            return None
+
+    def close_positions(self, tickets, quotes=None):
+        """Close several positions from the PositionTable in one pass
+
+        Positions are read from the last refresh instead of one
+        positions_get per ticket, and each is closed at its own symbol's
+        bid (buys) or ask (sells). Returns {ticket: result or None}.
+        """
+        if not self.ensure_initialized():
+            for ticket in tickets:
+                self.supervisor.submit(self.close_position, int(ticket), ttl=60)
+            return {}
+
+        quotes = dict(quotes or {})
+        results = {}
+        closed = []
+        for i in self.positions.find(tickets):
+            pos = self.positions.record(i)
+            try:
+                if pos.symbol not in quotes:
+                    tick = mt5.symbol_info_tick(pos.symbol)
+                    if tick is None:
+                        logging.error(f"Failed to get current price for {pos.symbol}")
+                        results[pos.ticket] = None
+                        continue
+                    self.last_ticks[pos.symbol] = tick
+                    quotes[pos.symbol] = (tick.bid, tick.ask)
+                bid, ask = quotes[pos.symbol]
+                price = bid if pos.direction > 0 else ask
+                request = OrderRequest(
+                    mt5.TRADE_ACTION_DEAL, pos.symbol, pos.volume,
+                    mt5.ORDER_TYPE_SELL if pos.direction > 0 else mt5.ORDER_TYPE_BUY,
+                    price=price, position=pos.ticket, comment="python script close"
+                )
+                result = self.send_order(request, self.last_ticks.get(pos.symbol))
+                if result is None or not result.filled:
+                    reason = result.comment if result is not None else "no result"
+                    logging.error(f"Close position {pos.ticket} failed: {reason}")
+                    results[pos.ticket] = None
+                    continue
+                volume = pos.volume
+                if result.partial:
+                    logging.warning(f"Position {pos.ticket} partially closed: {result.volume} of {volume}")
+                    volume = result.volume
+                results[pos.ticket] = result
+                closed.append(f"{pos.symbol} #{pos.ticket} {volume} @ {price}")
+                logging.info(f"Position {pos.ticket} closed successfully: {result.comment}")
+            except Exception as e:
+                logging.error(f"Error closing position {pos.ticket}: {str(e)}")
+                results[pos.ticket] = None
+
+        failed = len(results) - len(closed)
+        if closed or failed:
+            message = f"🔒 Closed {len(closed)} position(s)\n" + "\n".join(closed)
+            if failed:
+                message += f"\n⚠️ {failed} close(s) failed"
+            self.telegram.post(self.telegram.send_message(message))
+        return results
+
+    def modify_position(self, ticket, symbol, sl, tp=None):
+        """Move a position's SL/TP with TRADE_ACTION_SLTP; tp=None keeps no take profit"""
+        if not self.ensure_initialized():
+            return None
+        try:
+            symbol_info = mt5.symbol_info(symbol)
+            digits = symbol_info.digits if symbol_info is not None else 5
+            request = OrderRequest(
+                mt5.TRADE_ACTION_SLTP, symbol, position=int(ticket), sl=round(sl, digits),
+                tp=round(tp, digits) if tp else 0.0
+            )
+            result = self.send_order(request, self.last_ticks.get(symbol))
+            if result is None or result.retcode != mt5.TRADE_RETCODE_DONE:
+                reason = f"{result.comment} (retcode: {result.retcode})" if result is not None else "no result"
+                logging.error(f"Modify position {ticket} failed: {reason}")
+                return None
+            logging.info(f"Position {ticket} stop moved to {request.sl}")
+            return result
+        except Exception as e:
+            logging.error(f"Error modifying position {ticket}: {str(e)}")
+            return None
+
+    def get_quotes(self, symbols):
+        """Latest (bid, ask) per symbol; symbols without a tick are left out"""
+        quotes = {}
+        for symbol in symbols:
+            tick = mt5.symbol_info_tick(symbol)
+            if tick is not None:
+                self.last_ticks[symbol] = tick
+                quotes[symbol] = (tick.bid, tick.ask)
+        return quotes
+
+    def get_contract_sizes(self, symbols):
+        """Contract size per symbol, cached after the first lookup"""
+        for symbol in symbols:
+            if symbol not in self.contract_sizes:
+                info = mt5.symbol_info(symbol)
+                if info is not None:
+                    self.contract_sizes[symbol] = info.trade_contract_size
+        return self.contract_sizes
+
+    def get_stops_distance(self, symbol):
+        """Closest distance to the price a stop may be placed at (trade_stops_level in price units), or None"""
+        info = mt5.symbol_info(symbol)
+        if info is None:
             return None
+        return info.trade_stops_level * info.point
 
     def get_open_positions(self):
         """Get all open positions"""
-        if not self.initialized:
+        if not self.ensure_initialized():
             return None
         return mt5.positions_get()
 
+    def refresh_positions(self):
+        """Reload open positions into the bot's PositionTable
+
+        A failed positions_get keeps the last table: loading None would
+        report no open positions and let the position limits be exceeded.
+        """
+        positions = self.get_open_positions()
+        if positions is None:
+            logging.error("Failed to get open positions, keeping the last known positions")
+            return self.positions
+        return self.positions.load(positions)
+
+    def sync_journal(self):
+        """Copy deals closed since the last sync into the trade journal"""
+        if not self.ensure_initialized():
+            return 0
+        try:
+            if self.journal is None:
+                from journal import TradeJournal
+                self.journal = TradeJournal()
+            return self.journal.sync()
+        except Exception as e:
+            logging.error(f"Error syncing trade journal: {str(e)}")
+            return 0
+
     def send_account_update(self):
         """Send account update to Telegram"""
-        account_info = self.get_account_info()
-        if account_info:
-            asyncio.run(self.telegram.send_account_update(
-                balance=account_info.balance,
-                equity=account_info.equity,
-                profit=account_info.profit
+        account = self.account.get(max_age=1.0)
+        if account:
+            self.telegram.post(self.telegram.send_account_update(
+                balance=account['balance'],
+                equity=account['equity'],
+                profit=account['profit']
             ))
 
     def shutdown(self):
         """Shutdown MT5 connection"""
+        self.supervisor.stop()
+        self.account.stop()
         if self.initialized:
+            if self.journal is not None:
+                self.sync_journal()
             mt5.shutdown()
             self.initialized = False
-            asyncio.run(self.telegram.send_message("🛑 Trading bot shutdown"))
+            self.telegram.post(self.telegram.send_message("🛑 Trading bot shutdown"))
             logging.info("MT5 connection closed")
+        self.executions.close()
+        if self.journal is not None:
+            self.journal.close()
+        logging.getLogger().removeHandler(self.event_handler)
+        self.events.close()
+        # Let queued notifications go out before the process exits
+        self.telegram.flush()
 
 def calculate_rsi(prices, period=14):
     """Calculate RSI indicator"""
@@ -267,120 +629,176 @@ def calculate_rsi(prices, period=14):
     rs = gain / loss
     return 100 - (100 / (1 + rs))
 
-async def main():
+async def main(bot=None, scheduler=None, pacing=None):
+    """Run the grid trading loop; bot, scheduler and pacing default to the live setup"""
+    from backtest import atr
+
     # Initialize the bot
-    bot = ForexTradingBot()
+    bot = bot or ForexTradingBot()
     
     try:
         # Get account info
-        account_info = bot.get_account_info()
-        if account_info:
-            logging.info(f"Balance: {account_info.balance}")
-            logging.info(f"Equity: {account_info.equity}")
-            bot.send_account_update()
+        account = await asyncio.to_thread(bot.account.get)
+        if account:
+            logging.info(f"Balance: {account['balance']}")
+            logging.info(f"Equity: {account['equity']}")
+            await asyncio.to_thread(bot.send_account_update)
 
         # Get symbol info for volume validation
-        symbol_info = mt5.symbol_info(bot.symbol)
+        symbol_info = await asyncio.to_thread(mt5.symbol_info, bot.symbol)
         if symbol_info is None:
             logging.error(f"Failed to get symbol info for {bot.symbol}")
             return
 
+        # Iterations every minute at normal activity, from 10 s in volatile markets to 3 min in quiet ones
+        pacing = pacing or LoopRateController(base_interval=60, min_interval=10, max_interval=180, cpu_budget=0.1,
+                                              call_budget=2.0)
+
+        def apply_config(config):
+            # Both sections are validated before either one changes
+            bot_params = bot.SCHEMA.validate(config_section(config, 'bot'), base=bot.params())
+            pacing_params = pacing.validate(config_section(config, 'pacing'))
+            bot.configure(**bot_params)
+            pacing.configure(**pacing_params)
+
+        # Parameters in bot_config.json ({"bot": {...}, "pacing": {...}}) are validated and applied when the file changes
+        watcher = ConfigWatcher('bot_config.json', apply_config)
+        watcher.start()
+
+        # Take-profit checks over every position the bot opened, on any symbol
+        exits = ExitEvaluator(take_profit=bot.take_profit)
+        # Entries are pending limit orders on grid_spacing levels
+        grid = GridEngine(bot)
+        # ATR trailing stops and break-even moves; TradingStrategy exits would fight the grid entries
+        manager = PositionManager(bot)
+
+        # Sessions and holiday/news blackouts from sessions.json
+        scheduler = scheduler or SessionScheduler(bot.symbol)
+
+        def trade_once(entries=True):
+            """One iteration of the trading logic; returns the seconds to wait before the next one
+
+            Every terminal call blocks, so this runs in a worker thread and
+            the event loop stays free for notifications.
+            """
+            # Get market data
+            pacing.begin()
+            calls = 2  # Terminal calls this iteration, for the call budget
+            market_data = bot.get_market_data()
+            if market_data is not None:
+                # Calculate indicators
+                market_data['SMA20'] = market_data['close'].rolling(window=20).mean()
+                market_data['SMA50'] = market_data['close'].rolling(window=50).mean()
+                market_data['RSI'] = calculate_rsi(market_data['close'], 14)
+                
+                # Get the latest values
+                current_price = market_data['close'].iloc[-1]
+                sma20 = market_data['SMA20'].iloc[-1]
+                sma50 = market_data['SMA50'].iloc[-1]
+                rsi = market_data['RSI'].iloc[-1]
+                
+                # Get current positions
+                positions = bot.refresh_positions()
+                
+                # Calculate base volume (0.1% of the current balance)
+                balance = bot.account.balance
+                if balance is None:
+                    logging.error("Account balance unavailable, skipping this iteration")
+                    return 1.0
+                risk_amount = balance * 0.001
+                base_volume = round(risk_amount / current_price, 2)
+                
+                # Ensure volume meets minimum requirements
+                volume = max(base_volume, symbol_info.volume_min)
+                # Ensure volume doesn't exceed maximum
+                volume = min(volume, symbol_info.volume_max)
+                # Round to symbol's volume step
+                volume = round(volume / symbol_info.volume_step) * symbol_info.volume_step
+                
+                logging.info(f"Calculated volume: {volume} (min: {symbol_info.volume_min}, max: {symbol_info.volume_max}, step: {symbol_info.volume_step})")
+                
+                # Grid, exits and stops read the bot's parameters, which a config reload must not change midway
+                with bot.config_lock:
+                    # Trading logic: keep pending orders on the free grid levels for each active side;
+                    # without entries (a blackout) both sides are off and resting orders are cancelled
+                    placed = grid.update(
+                        current_price, volume,
+                        buy=entries and ((sma20 > sma50 and rsi < 70) or (rsi < 30)),   # Oversold or uptrend
+                        sell=entries and ((sma20 < sma50 and rsi > 30) or (rsi > 70)),  # Overbought or downtrend
+                    )
+                    if placed:
+                        logging.info(f"Placed {placed} grid order(s) around {current_price} with volume {volume}")
+                    calls += 2 + placed
+                
+                    # Check for take profit on existing positions, each priced at its own symbol's bid/ask
+                    exits.take_profit = bot.take_profit
+                    symbols = positions.open_symbols()
+                    quotes = bot.get_quotes(symbols)
+                    decision = exits.evaluate(positions, quotes, bot.get_contract_sizes(symbols),
+                                              mask=positions.mask(magic=MAGIC))
+                    close_list = decision.close_list()
+                    calls += len(symbols) + len(close_list)
+                    if close_list:
+                        results = bot.close_positions([ticket for ticket, _ in close_list], quotes)
+                        pnl = dict(zip(decision.tickets.tolist(), decision.pnl.tolist()))
+                        for ticket, reason in close_list:
+                            if results.get(ticket):
+                                logging.info(f"Closed position {ticket} ({reason}) with profit {pnl[ticket]:.2f}")
+                        positions = bot.refresh_positions()
+                
+                    # Trail stops and apply the strategy's exit rules
+                    atr_value = atr(market_data['high'], market_data['low'], market_data['close'], 14)[-1]
+                    if atr_value == atr_value:  # Skip while ATR is still NaN
+                        manager.update(positions, quotes, {bot.symbol: atr_value}, bars=market_data, symbol=bot.symbol)
+                
+                # Record closed deals in the trade journal
+                bot.sync_journal()
+                calls += 1
+
+                # Polling speeds up with the ATR and the tick rate of the forming bar
+                pacing.observe(atr_value, pacing.bar_ticks(market_data['time'].iloc[-1],
+                                                           int(market_data['tick_volume'].iloc[-1])))
+
+            # Wait until the next check, within the CPU and terminal call budgets
+            delay = pacing.end(calls)
+            metrics = pacing.metrics()
+            logging.info(f"Next check in {delay:.1f}s (activity {metrics['activity']:.2f}, "
+                         f"limited by {metrics['limited_by']}, CPU budget {metrics['cpu_budget_used']:.0%}, "
+                         f"call budget {metrics['call_budget_used']:.0%} used)")
+            return delay
+
         # Main trading loop
         while True:
             try:
-                # Get market data
-                market_data = bot.get_market_data()
-                if market_data is not None:
-                    # Calculate indicators
-                    market_data['SMA20'] = market_data['close'].rolling(window=20).mean()
-                    market_data['SMA50'] = market_data['close'].rolling(window=50).mean()
-                    market_data['RSI'] = calculate_rsi(market_data['close'], 14)
-                    
-                    # Get the latest values
-                    current_price = market_data['close'].iloc[-1]
-                    sma20 = market_data['SMA20'].iloc[-1]
-                    sma50 = market_data['SMA50'].iloc[-1]
-                    rsi = market_data['RSI'].iloc[-1]
-                    
-                    # Get current positions
-                    positions = bot.get_open_positions()
-                    buy_positions = []
-                    sell_positions = []
-                    
-                    if positions:
-                        for pos in positions:
-                            if pos.symbol == bot.symbol:
-                                if pos.type == mt5.ORDER_TYPE_BUY:
-                                    buy_positions.append(pos)
-                                else:
-                                    sell_positions.append(pos)
-                    
-                    # Calculate base volume (0.1% of balance)
-                    balance = account_info.balance
-                    risk_amount = balance * 0.001
-                    base_volume = round(risk_amount / current_price, 2)
-                    
-                    # Ensure volume meets minimum requirements
-                    volume = max(base_volume, symbol_info.volume_min)
-                    # Ensure volume doesn't exceed maximum
-                    volume = min(volume, symbol_info.volume_max)
-                    # Round to symbol's volume step
-                    volume = round(volume / symbol_info.volume_step) * symbol_info.volume_step
-                    
-                    logging.info(f"Calculated volume: {volume} (min: {symbol_info.volume_min}, max: {symbol_info.volume_max}, step: {symbol_info.volume_step})")
-                    
-                    # Trading logic
-                    # Check for buy opportunities
-                    if len(buy_positions) < bot.max_positions:
-                        if (sma20 > sma50 and rsi < 70) or (rsi < 30):  # Oversold or uptrend
-                            # Place buy order
-                            result = bot.place_order(
-                                order_type=mt5.ORDER_TYPE_BUY,
-                                volume=volume,
-                                price=current_price,
-                                sl=current_price * (1 - bot.stop_loss/100),
-                                tp=current_price * (1 + bot.take_profit/100)
-                            )
-                            if result:
-                                logging.info(f"Placed BUY order at {current_price} with volume {volume}")
-                    
-                    # Check for sell opportunities
-                    if len(sell_positions) < bot.max_positions:
-                        if (sma20 < sma50 and rsi > 30) or (rsi > 70):  # Overbought or downtrend
-                            # Place sell order
-                            result = bot.place_order(
-                                order_type=mt5.ORDER_TYPE_SELL,
-                                volume=volume,
-                                price=current_price,
-                                sl=current_price * (1 + bot.stop_loss/100),
-                                tp=current_price * (1 - bot.take_profit/100)
-                            )
-                            if result:
-                                logging.info(f"Placed SELL order at {current_price} with volume {volume}")
-                    
-                    # Check for take profit on existing positions
-                    for pos in buy_positions + sell_positions:
-                        current_profit = pos.profit
-                        if current_profit > 0 and current_profit >= pos.volume * current_price * (bot.take_profit/100):
-                            bot.close_position(pos.ticket)
-                            logging.info(f"Closed position {pos.ticket} with profit {current_profit}")
-                    
-                    # Wait for 1 minute before next check
-                    await asyncio.sleep(60)
+                # Wait for the supervisor to restore a dropped connection
+                if not await asyncio.to_thread(bot.ensure_initialized):
+                    await asyncio.sleep(1)
+                    continue
+
+                # Sleep through closed sessions, reconnecting just before the open; during a
+                # blackout open positions are still managed but no new entries are made
+                entries = await asyncio.to_thread(scheduler.is_active)
+                if not entries and await asyncio.to_thread(scheduler.blackout) is None:
+                    await asyncio.to_thread(scheduler.wait_for_session, warm_up=bot.ensure_initialized)
+                    continue
+
+                # The iteration's blocking terminal calls and indicator work run off the event loop
+                delay = await asyncio.to_thread(trade_once, entries)
+                await asyncio.sleep(delay)
                     
             except Exception as e:
                 error_msg = f"Error in trading loop: {str(e)}"
                 logging.error(error_msg)
-                await bot.telegram.send_error_notification(error_msg)
+                bot.telegram.post(bot.telegram.send_error_notification(error_msg))
                 await asyncio.sleep(60)  # Wait before retrying
 
     except Exception as e:
         error_msg = f"An error occurred: {str(e)}"
         logging.error(error_msg)
-        await bot.telegram.send_error_notification(error_msg)
+        bot.telegram.post(bot.telegram.send_error_notification(error_msg))
     
     finally:
-        bot.shutdown()
+        await asyncio.to_thread(bot.shutdown)
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
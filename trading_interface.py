@@ -2,19 +2,11 @@ import tkinter as tk
 from tkinter import ttk
 import queue
 import threading
-import time
-import MetaTrader5 as mt5
-import pandas as pd
-import numpy as np
 from datetime import datetime
 import asyncio
 import nest_asyncio
-from trading_bot import ForexTradingBot, calculate_rsi
-
-# Import matplotlib for charting
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
+from trading_bot import ForexTradingBot
+from engine import TradingEngine
 
 # Enable nested event loops
 nest_asyncio.apply()
@@ -47,6 +39,9 @@ class ModernTradingInterface:
         # Initialize last market data for comparison
         self.last_market_data = None
         
+        # Trading engine running the auto-trading loop independently of the UI
+        self.engine = TradingEngine(self.bot)
+        
         # Initialize trading parameters
         self.lot_size_var = tk.StringVar(value="0.01")
         self.sl_atr_var = tk.StringVar(value="1.5")
@@ -59,13 +54,11 @@ class ModernTradingInterface:
         # Configure styles
         self.configure_styles()
 
-        # Initialize Matplotlib figure and axes for charting
-        self.figure = Figure(figsize=(8, 4), dpi=100)
-        self.ax1 = self.figure.add_subplot(111) # Primary axis for price/EMAs
+        # Matplotlib chart is created after the window is up (see create_chart)
+        self.figure = None
+        self.ax1 = None # Primary axis for price/EMAs
         self.ax2 = None # Secondary axis for RSI, MACD later
-
-        # Create chart canvas
-        self.chart_canvas = FigureCanvasTkAgg(self.figure, master=self.root) # Parent to root initially
+        self.chart_canvas = None
 
         # Create main container with padding
         self.main_container = ttk.Frame(root, padding="10")
@@ -80,12 +73,15 @@ class ModernTradingInterface:
         # Create footer with contact information
         self.create_footer()
 
-        # Re-parent chart canvas to main_container after it's created
-        self.chart_canvas.get_tk_widget().master = self.main_container
+        # Render engine snapshots and forward parameter changes to the engine
+        self.engine.subscribe(self.on_snapshot)
+        self.engine.subscribe_log(self.on_engine_log)
+        for var in (self.lot_size_var, self.sl_atr_var, self.tp_atr_var, self.max_positions_var):
+            var.trace_add("write", self.apply_parameters)
 
-        # Start UI update thread
-        self.update_thread = threading.Thread(target=self.update_ui, daemon=True)
-        self.update_thread.start()
+        # Account labels follow the bot's AccountMonitor change events; connecting starts it
+        self.bot.account.add_listener(self.on_account)
+        threading.Thread(target=self.bot.ensure_initialized, daemon=True).start()
         
         # Handle window closing
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -302,7 +298,6 @@ class ModernTradingInterface:
         controls_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 5))
         
         # Controls in one row
-        self.auto_trading_var = tk.BooleanVar(value=False)
         self.auto_trading_button = ttk.Button(
             controls_frame,
             text="Start Auto Trading",
@@ -458,12 +453,24 @@ class ModernTradingInterface:
         )
         chart_frame.grid(row=5, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 5))
         
-        # Create canvas for matplotlib chart
-        self.chart_canvas.get_tk_widget().grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.chart_frame = chart_frame
         
         # Configure grid weights for chart_frame
         chart_frame.columnconfigure(0, weight=1)
         chart_frame.rowconfigure(0, weight=1)
+        
+        # Loading matplotlib's TkAgg backend is slow, so build the chart once the window is shown
+        self.root.after(100, self.create_chart)
+
+    def create_chart(self):
+        """Create the matplotlib figure and canvas for charting"""
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+
+        self.figure = Figure(figsize=(8, 4), dpi=100)
+        self.ax1 = self.figure.add_subplot(111) # Primary axis for price/EMAs
+        self.chart_canvas = FigureCanvasTkAgg(self.figure, master=self.chart_frame)
+        self.chart_canvas.get_tk_widget().grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
 
     def create_log_section(self, parent):
         """Create log section with modern design"""
@@ -582,302 +589,103 @@ class ModernTradingInterface:
 
     def toggle_auto_trading(self):
         """Toggle auto trading on/off"""
-        if not self.auto_trading_var.get():
-            self.auto_trading_var.set(True)
+        if not self.engine.running:
+            self.apply_parameters()
             self.auto_trading_button.configure(text="Stop Auto Trading")
-            self.log_action("Auto trading started")
-            # Start auto trading in a separate thread
-            threading.Thread(target=self.run_auto_trading, daemon=True).start()
+            # The engine runs the trading loop in its own thread
+            self.engine.start()
         else:
-            self.auto_trading_var.set(False)
+            self.engine.stop()
+            self.auto_trading_button.configure(text="Start Auto Trading")
+
+    def apply_parameters(self, *args):
+        """Push the trading parameters to the engine whenever a selection changes"""
+        try:
+            self.engine.set_params(
+                lot_size=self.lot_size_var.get(),
+                sl_atr=self.sl_atr_var.get(),
+                tp_atr=self.tp_atr_var.get(),
+                max_positions=self.max_positions_var.get()
+            )
+        except ValueError as e:
+            self.log_action(f"Invalid trading parameters: {str(e)}")
+
+    def on_snapshot(self, snapshot):
+        """Hand engine snapshots over to the Tk thread"""
+        self.root.after(0, self.render_snapshot, snapshot)
+
+    def on_engine_log(self, message):
+        """Hand engine log messages over to the Tk thread"""
+        self.root.after(0, self.log_action, message)
+
+    def render_snapshot(self, snapshot):
+        """Update market data and signal labels from an engine snapshot"""
+        if not snapshot['running']:
             self.auto_trading_button.configure(text="Start Auto Trading")
-            self.log_action("Auto trading stopped")
-
-    def run_auto_trading(self):
-        """Run auto trading logic"""
-        while self.auto_trading_var.get():
-            try:
-                # Get market data
-                market_data = self.bot.get_market_data()
-                if market_data is not None:
-                    # Calculate indicators with even shorter periods for faster response
-                    market_data['EMA20'] = market_data['close'].ewm(span=5, adjust=False).mean()
-                    market_data['EMA50'] = market_data['close'].ewm(span=10, adjust=False).mean()
-                    market_data['RSI'] = calculate_rsi(market_data['close'], 5)
-                    
-                    # Calculate MACD with faster periods
-                    exp1 = market_data['close'].ewm(span=5, adjust=False).mean()
-                    exp2 = market_data['close'].ewm(span=10, adjust=False).mean()
-                    market_data['MACD'] = exp1 - exp2
-                    market_data['MACD_Signal'] = market_data['MACD'].ewm(span=3, adjust=False).mean()
-                    
-                    # Calculate ATR
-                    high_low = market_data['high'] - market_data['low']
-                    high_close = abs(market_data['high'] - market_data['close'].shift())
-                    low_close = abs(market_data['low'] - market_data['close'].shift())
-                    ranges = pd.concat([high_low, high_close, low_close], axis=1)
-                    true_range = ranges.max(axis=1)
-                    market_data['ATR'] = true_range.rolling(5).mean()
-                    
-                    # Get the latest values
-                    current_price = market_data['close'].iloc[-1]
-                    ema20 = market_data['EMA20'].iloc[-1]
-                    ema50 = market_data['EMA50'].iloc[-1]
-                    rsi = market_data['RSI'].iloc[-1]
-                    macd = market_data['MACD'].iloc[-1]
-                    macd_signal = market_data['MACD_Signal'].iloc[-1]
-                    atr = market_data['ATR'].iloc[-1]
-                    
-                    # Update Market Data labels
-                    self.price_label.configure(text=f"{current_price:.2f}")
-                    self.ema20_label.configure(text=f"{ema20:.2f}")
-                    self.ema50_label.configure(text=f"{ema50:.2f}")
-                    self.rsi_label.configure(text=f"{rsi:.2f}")
-                    self.macd_label.configure(text=f"{macd:.2f}")
-                    self.macd_signal_label.configure(text=f"{macd_signal:.2f}")
-                    self.atr_label.configure(text=f"{atr:.2f}")
-                    
-                    # Evaluate Signal Conditions
-                    ema_crossed_up = ema20 > ema50
-                    ema_crossed_down = ema20 < ema50
-                    macd_crossed_up = macd > macd_signal
-                    macd_crossed_down = macd < macd_signal
-                    rsi_overbought = rsi > 70
-                    rsi_oversold = rsi < 30
-                    
-                    # Update Signal Panel Labels
-                    if ema_crossed_up:
-                        self.ema_cross_label.configure(text="EMA Cross: Up", foreground="green")
-                    elif ema_crossed_down:
-                        self.ema_cross_label.configure(text="EMA Cross: Down", foreground="red")
-                    else:
-                        self.ema_cross_label.configure(text="EMA Cross: --", foreground="black")
-                        
-                    if rsi_overbought:
-                        self.rsi_status_label.configure(text=f"RSI: {rsi:.2f} (Overbought)", foreground="red")
-                    elif rsi_oversold:
-                         self.rsi_status_label.configure(text=f"RSI: {rsi:.2f} (Oversold)", foreground="green")
-                    else:
-                        self.rsi_status_label.configure(text=f"RSI: {rsi:.2f}", foreground="black")
-                        
-                    if macd_crossed_up:
-                         self.macd_cross_label.configure(text="MACD Cross: Up", foreground="green")
-                    elif macd_crossed_down:
-                         self.macd_cross_label.configure(text="MACD Cross: Down", foreground="red")
-                    else:
-                         self.macd_cross_label.configure(text="MACD Cross: --", foreground="black")
-                         
-                    # Update Quick Signal Labels
-                    quick_buy = (
-                        (rsi < 80 and macd > macd_signal) or
-                        (ema20 > ema50 and rsi < 85) or
-                        (rsi < 30)
-                    )
-                    quick_sell = (
-                        (rsi > 20 and macd < macd_signal) or
-                        (ema20 < ema50 and rsi > 15) or
-                        (rsi > 70)
-                    )
-                    
-                    if quick_buy:
-                        self.quick_buy_signal_label.configure(text="Quick Buy: ✓", foreground="green")
-                    else:
-                        self.quick_buy_signal_label.configure(text="Quick Buy: ✗", foreground="black")
-                        
-                    if quick_sell:
-                        self.quick_sell_signal_label.configure(text="Quick Sell: ✓", foreground="red")
-                    else:
-                        self.quick_sell_signal_label.configure(text="Quick Sell: ✗", foreground="black")
-                        
-                    # --- Charting Logic --- 
-                    # In a real-time scenario, you would update the chart data here
-                    # and redraw the chart. This is a placeholder.
-                    
-                    # Fetch more historical data if needed for charting
-                    # market_data = self.bot.get_market_data(num_candles=200) # Example: fetch 200 candles
-                    
-                    # Update chart data (e.g., append new candle data)
-                    # self.ax1.clear() # Clear previous plot
-                    # self.ax1.plot(market_data['time'], market_data['close']) # Example plot
-                    # self.chart_canvas.draw_idle() # Redraw the canvas
-                    
-                    # Note: Real-time updating requires careful handling to avoid blocking the UI.
-                    # Consider using Tkinter's root.after() to schedule chart updates.
-                    
-                    # --- End Charting Logic ---
-                        
-                    # Get trading parameters
-                    volume = float(self.lot_size_var.get())
-                    sl_atr = float(self.sl_atr_var.get())
-                    tp_atr = float(self.tp_atr_var.get())
-                    max_positions = int(self.max_positions_var.get())
-                    
-                    # Get current positions
-                    positions = self.bot.get_open_positions()
-                    buy_positions = []
-                    sell_positions = []
-                    
-                    if positions:
-                        for pos in positions:
-                            if pos.symbol == self.bot.symbol:
-                                if pos.type == mt5.ORDER_TYPE_BUY:
-                                    buy_positions.append(pos)
-                                else:
-                                    sell_positions.append(pos)
-                                    
-                    # Check total number of open positions
-                    total_open_positions = len(buy_positions) + len(sell_positions)
-                    
-                    # Buy conditions - More aggressive
-                    # Only buy if total positions is less than max and there are no open sell positions
-                    if total_open_positions < max_positions and len(sell_positions) == 0:
-                        # Quick buy signals
-                        quick_buy = (
-                            (rsi < 80 and macd > macd_signal) or
-                            (ema20 > ema50 and rsi < 85) or
-                            (rsi < 30)
-                        )
-                        
-                        # Simplified condition check for logging
-                        buy_conditions_met = []
-                        if (rsi < 80 and macd > macd_signal): buy_conditions_met.append("RSI<80 & MACD_Cross")
-                        if (ema20 > ema50 and rsi < 85): buy_conditions_met.append("EMA_Cross & RSI<85")
-                        if (rsi < 30): buy_conditions_met.append("RSI<30")
-                        
-                        if buy_conditions_met:
-                             self.log_action(f"Buy Conditions Met: {', '.join(buy_conditions_met)}")
-                        
-                        if quick_buy: # Use combined quick_buy condition for entry
-                            sl = current_price - (atr * sl_atr)
-                            tp = current_price + (atr * tp_atr)
-                            
-                            self.log_action("Attempting to place BUY order...")
-                            result = self.loop.run_until_complete(self._place_order_async(
-                                mt5.ORDER_TYPE_BUY,
-                                volume,
-                                current_price,
-                                sl,
-                                tp
-                            ))
-                    
-                    # Sell conditions - More aggressive
-                    # Only sell if total positions is less than max and there are no open buy positions
-                    if total_open_positions < max_positions and len(buy_positions) == 0:
-                        # Quick sell signals
-                        quick_sell = (
-                            (rsi > 20 and macd < macd_signal) or
-                            (ema20 < ema50 and rsi > 15) or
-                            (rsi > 70)
-                        )
-                        
-                        # Simplified condition check for logging
-                        sell_conditions_met = []
-                        if (rsi > 20 and macd < macd_signal): sell_conditions_met.append("RSI>20 & MACD_Cross")
-                        if (ema20 < ema50 and rsi > 15): sell_conditions_met.append("EMA_Cross & RSI>15")
-                        if (rsi > 70): sell_conditions_met.append("RSI>70")
-
-                        if sell_conditions_met:
-                             self.log_action(f"Sell Conditions Met: {', '.join(sell_conditions_met)}")
-
-                        if quick_sell: # Use combined quick_sell condition for entry
-                            sl = current_price + (atr * sl_atr)
-                            tp = current_price - (atr * tp_atr)
-                            
-                            self.log_action("Attempting to place SELL order...")
-                            result = self.loop.run_until_complete(self._place_order_async(
-                                mt5.ORDER_TYPE_SELL,
-                                volume,
-                                current_price,
-                                sl,
-                                tp
-                            ))
-                    
-                    # Check for exit conditions - More responsive
-                    # Note: TP/SL are handled by MT5 automatically based on order parameters
-                    # This section can be used for other exit strategies if needed, but currently TP/SL are set on order placement.
-                    # We can log when a position is closed by checking open positions and comparing to previous state, but that adds complexity.
-                    # For now, relying on MT5 for TP/SL closure and the bot's notification system.
-                    
-                    time.sleep(0.02) # Sleep for a short duration
-                    
-            except Exception as e:
-                self.log_action(f"Error in trading loop: {str(e)}")
-                time.sleep(1) # Short error recovery time
-
-    async def _place_order_async(self, order_type, volume, price, sl, tp):
-        """Async wrapper for placing orders"""
-        result = self.bot.place_order(order_type, volume, price, sl, tp)
-        if result and result.retcode == mt5.TRADE_RETCODE_DONE:
-            action = "BUY" if order_type == mt5.ORDER_TYPE_BUY else "SELL"
-            self.log_action(f"Placed {action} order: Volume={volume}, Price={price:.5f}, SL={sl:.5f}, TP={tp:.5f}") # Log detailed info
-        elif result:
-             self.log_action(f"Order placement failed: {result.comment} (retcode: {result.retcode})")
+
+        values = snapshot['values']
+        if values is not None:
+            macd, macd_signal = values['MACD']
+            self.price_label.configure(text=f"{values['close']:.2f}")
+            self.ema20_label.configure(text=f"{values['EMA20']:.2f}")
+            self.ema50_label.configure(text=f"{values['EMA50']:.2f}")
+            self.rsi_label.configure(text=f"{values['RSI']:.2f}")
+            self.macd_label.configure(text=f"{macd:.2f}")
+            self.macd_signal_label.configure(text=f"{macd_signal:.2f}")
+            self.atr_label.configure(text=f"{values['ATR']:.2f}")
+
+        signals = snapshot['signals']
+        if values is None or signals is None:
+            return
+        rsi = values['RSI']
+
+        # Update Signal Panel Labels
+        if signals['ema_cross'] == 'up':
+            self.ema_cross_label.configure(text="EMA Cross: Up", foreground="green")
+        elif signals['ema_cross'] == 'down':
+            self.ema_cross_label.configure(text="EMA Cross: Down", foreground="red")
         else:
-             self.log_action("Order placement failed: No result")
-        return result
-
-    async def _close_position_async(self, position_id, close_reason="Manual", profit=None):
-        """Async wrapper for closing positions with reason and profit/loss logging"""
-        # Get position info before closing to log details
-        position = mt5.positions_get(ticket=position_id)
-        if position:
-            pos_type = "BUY" if position[0].type == mt5.ORDER_TYPE_BUY else "SELL"
-            volume = position[0].volume
-            entry_price = position[0].price_open
-            current_price = mt5.symbol_info_tick(position[0].symbol).bid if pos_type == "BUY" else mt5.symbol_info_tick(position[0].symbol).ask
-            current_profit = position[0].profit
-            symbol = position[0].symbol
-            
-            self.log_action(f"Attempting to close {pos_type} position {position_id} for {symbol} (Volume={volume}, Entry={entry_price:.5f}, Current Profit={current_profit:.2f})")
-            
-            result = self.bot.close_position(position_id)
-            
-            if result and result.retcode == mt5.TRADE_RETCODE_DONE:
-                # We might not get the final profit from the result, rely on position info before close or check account balance change
-                # For simplicity, let's log the profit just before closing attempt
-                self.log_action(f"Closed {pos_type} position {position_id}. Profit/Loss: {current_profit:.2f}") # Log profit/loss
-            elif result:
-                 self.log_action(f"Failed to close position {position_id}: {result.comment} (retcode: {result.retcode})")
-            else:
-                 self.log_action(f"Failed to close position {position_id}: No result")
-            return result
+            self.ema_cross_label.configure(text="EMA Cross: --", foreground="black")
+
+        if signals['rsi_overbought']:
+            self.rsi_status_label.configure(text=f"RSI: {rsi:.2f} (Overbought)", foreground="red")
+        elif signals['rsi_oversold']:
+            self.rsi_status_label.configure(text=f"RSI: {rsi:.2f} (Oversold)", foreground="green")
+        else:
+            self.rsi_status_label.configure(text=f"RSI: {rsi:.2f}", foreground="black")
+
+        if signals['macd_cross'] == 'up':
+            self.macd_cross_label.configure(text="MACD Cross: Up", foreground="green")
+        elif signals['macd_cross'] == 'down':
+            self.macd_cross_label.configure(text="MACD Cross: Down", foreground="red")
         else:
-            self.log_action(f"Position {position_id} not found for closing.")
-            return None
+            self.macd_cross_label.configure(text="MACD Cross: --", foreground="black")
+
+        # Update Quick Signal Labels
+        if signals['quick_buy']:
+            self.quick_buy_signal_label.configure(text="Quick Buy: ✓", foreground="green")
+        else:
+            self.quick_buy_signal_label.configure(text="Quick Buy: ✗", foreground="black")
+
+        if signals['quick_sell']:
+            self.quick_sell_signal_label.configure(text="Quick Sell: ✓", foreground="red")
+        else:
+            self.quick_sell_signal_label.configure(text="Quick Sell: ✗", foreground="black")
 
     def close_all_positions(self):
         """Close all open positions"""
-        positions = self.bot.get_open_positions()
-        if positions:
-            self.log_action("Attempting to close all positions...")
-            for position in positions:
-                if position.symbol == self.bot.symbol:
-                    # Call the updated async close position method without specific reason/profit yet
-                    # The detailed logging will happen inside _close_position_async
-                    self.loop.run_until_complete(self._close_position_async(position.ticket))
-            self.log_action("Finished attempting to close all positions.")
-        else:
-            self.log_action("No positions to close.")
-
-    def update_ui(self):
-        """Update UI elements with latest data"""
-        while True:
-            try:
-                # Update account information
-                account_info = self.bot.get_account_info()
-                if account_info:
-                    self.balance_label.configure(text=f"{account_info.balance:.2f}")
-                    self.equity_label.configure(text=f"{account_info.equity:.2f}")
-                    self.profit_label.configure(text=f"{account_info.profit:.2f}")
-                
-                # Market data updates are now handled in run_auto_trading
-                # This update_ui focuses on account info and other potential future UI updates
-                
-                time.sleep(1)  # Update account info every second
-                
-            except Exception as e:
-                self.log_action(f"Error updating UI: {str(e)}")
-                time.sleep(1)
+        self.engine.close_all_positions()
+
+    def on_account(self, snapshot, changed):
+        """Account changes arrive on the monitor thread; render them on the Tk thread"""
+        self.root.after(0, self.render_account, snapshot, changed)
+
+    def render_account(self, snapshot, changed):
+        """Reconfigure only the account labels whose value changed"""
+        labels = {'balance': self.balance_label, 'equity': self.equity_label, 'profit': self.profit_label}
+        for name in changed:
+            if name in labels:
+                labels[name].configure(text=f"{snapshot[name]:.2f}")
 
     def log_action(self, message):
         """Add trading action message to log with timestamp"""
@@ -890,8 +698,7 @@ class ModernTradingInterface:
 
     def on_closing(self):
         """Handle window closing"""
-        if self.auto_trading_var.get():
-            self.auto_trading_var.set(False)
+        self.engine.stop()
         self.bot.shutdown()
         self.loop.close()
         self.root.destroy()
@@ -0,0 +1,216 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtest import DEFAULT_PARAMS, IndicatorCache, load_history, run_backtest
+
+# Parameter grid used for the nightly XAUUSD re-tune
+DEFAULT_GRID = {
+    'short_window': [10, 20, 30],
+    'long_window': [50, 100],
+    'rsi_period': [14],
+    'stop_loss': [0.3, 0.5, 0.8],
+    'take_profit': [0.2, 0.3, 0.5],
+    'grid_spacing': [0.1, 0.2, 0.3],
+    'max_positions': [1, 3],
+}
+
+
+def expand_grid(grid, max_evals=None, seed=0):
+    """Turn a dict of value lists into a list of parameter dicts
+
+    When max_evals is set and the grid is larger, a deterministic random
+    subset is used so every window costs the same fixed CPU budget.
+    """
+    keys = list(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    combos = [c for c in combos if c.get('short_window', 0) < c.get('long_window', float('inf'))]
+    if max_evals and len(combos) > max_evals:
+        combos = random.Random(seed).sample(combos, max_evals)
+    return combos
+
+
+def split_windows(n_bars, in_sample, out_of_sample, step=None):
+    """Rolling (is_start, is_end, oos_end) index triples over n_bars"""
+    step = step or out_of_sample
+    windows = []
+    start = 0
+    while start + in_sample + out_of_sample <= n_bars:
+        windows.append((start, start + in_sample, start + in_sample + out_of_sample))
+        start += step
+    return windows
+
+
+def _optimize_window(args):
+    """Optimize one window in a worker process and evaluate the winner out of sample"""
+    window_id, df, is_end, param_sets, objective, backtest_kwargs = args
+    started = time.perf_counter()
+
+    # Indicators are computed once over the whole window and shared by every parameter set
+    indicators = IndicatorCache(df)
+
+    best_params, best_score, best_result = None, -np.inf, None
+    for params in param_sets:
+        result = run_backtest(indicators, params, start=0, end=is_end, **backtest_kwargs)
+        score = result.score(objective)
+        if score > best_score:
+            best_params, best_score, best_result = params, score, result
+
+    oos = run_backtest(indicators, best_params, start=is_end, end=len(indicators), **backtest_kwargs)
+    return {
+        'window': window_id,
+        'params': best_params,
+        'in_sample_score': best_score,
+        'in_sample': best_result.summary(),
+        'out_of_sample': oos.summary(),
+        'oos_equity': oos.equity,
+        'oos_trades': oos.trades,
+        'elapsed': time.perf_counter() - started,
+    }
+
+
+class WalkForwardResult:
+    """Per-window optimization results and the stitched out-of-sample equity curve"""
+
+    def __init__(self, windows, equity, trades):
+        self.windows = windows
+        self.equity = equity
+        self.trades = trades
+
+    @property
+    def best_params(self):
+        """Parameters chosen on the most recent in-sample window"""
+        return self.windows[-1]['params'] if self.windows else None
+
+    def summary(self):
+        equity = self.equity.to_numpy()
+        drawdown = float(np.max(np.maximum.accumulate(equity) - equity)) if len(equity) else 0.0
+        return {
+            'windows': len(self.windows),
+            'oos_trades': len(self.trades),
+            'oos_net_profit': float(self.trades['pnl'].sum()) if len(self.trades) else 0.0,
+            'oos_max_drawdown': drawdown,
+            'best_params': self.best_params,
+        }
+
+
+class WalkForwardOptimizer:
+    def __init__(self, param_grid=None, in_sample=2000, out_of_sample=500, step=None,
+                 objective='net_profit', max_workers=None, max_evals=None,
+                 initial_balance=10000.0, contract_size=100.0, spread=0.0):
+        self.param_grid = param_grid or DEFAULT_GRID
+        self.in_sample = in_sample
+        self.out_of_sample = out_of_sample
+        self.step = step
+        self.objective = objective
+        self.max_workers = max_workers or os.cpu_count()
+        self.max_evals = max_evals
+        self.initial_balance = initial_balance
+        self.backtest_kwargs = {
+            'initial_balance': initial_balance,
+            'contract_size': contract_size,
+            'spread': spread,
+        }
+        self.logger = logging.getLogger(__name__)
+
+    def run(self, df):
+        """Optimize every rolling window in parallel and stitch the out-of-sample results"""
+        df = df.reset_index(drop=True)
+        windows = split_windows(len(df), self.in_sample, self.out_of_sample, self.step)
+        if not windows:
+            raise ValueError(
+                f"Need at least {self.in_sample + self.out_of_sample} bars, got {len(df)}"
+            )
+
+        param_sets = expand_grid(self.param_grid, self.max_evals)
+        self.logger.info(
+            f"Walk-forward: {len(windows)} windows x {len(param_sets)} parameter sets "
+            f"on {self.max_workers} workers"
+        )
+
+        columns = [c for c in ('time', 'open', 'high', 'low', 'close') if c in df.columns]
+        jobs = [
+            (n, df.iloc[start:oos_end][columns].reset_index(drop=True), is_end - start,
+             param_sets, self.objective, self.backtest_kwargs)
+            for n, (start, is_end, oos_end) in enumerate(windows)
+        ]
+
+        if self.max_workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(executor.map(_optimize_window, jobs))
+        else:
+            results = [_optimize_window(job) for job in jobs]
+
+        return self._stitch(df, windows, results)
+
+    def _stitch(self, df, windows, results):
+        """Chain the out-of-sample equity curves so each window starts where the last ended"""
+        curves = []
+        trades = []
+        offset = 0.0
+        for (start, is_end, oos_end), result in zip(windows, results):
+            curve = result.pop('oos_equity') - self.initial_balance + offset
+            index = df['time'].iloc[is_end:oos_end] if 'time' in df.columns else range(is_end, oos_end)
+            curves.append(pd.Series(curve, index=index))
+            if len(curve):
+                offset = curve[-1]
+
+            window_trades = result.pop('oos_trades')
+            if len(window_trades):
+                window_trades = window_trades.copy()
+                window_trades[['entry_index', 'exit_index']] += start
+                window_trades['window'] = result['window']
+                trades.append(window_trades)
+
+            self.logger.info(
+                f"Window {result['window']}: params={result['params']} "
+                f"IS={result['in_sample']['net_profit']:.2f} "
+                f"OOS={result['out_of_sample']['net_profit']:.2f} ({result['elapsed']:.1f}s)"
+            )
+
+        equity = pd.concat(curves) + self.initial_balance if curves else pd.Series(dtype=float)
+        all_trades = pd.concat(trades, ignore_index=True) if trades else pd.DataFrame()
+        return WalkForwardResult(results, equity, all_trades)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward optimization of the trading bot parameters")
+    parser.add_argument('history', help="CSV file with time, open, high, low, close columns")
+    parser.add_argument('--in-sample', type=int, default=2000, help="Bars per in-sample window")
+    parser.add_argument('--out-of-sample', type=int, default=500, help="Bars per out-of-sample window")
+    parser.add_argument('--objective', default='net_profit', choices=['net_profit', 'sharpe', 'calmar'])
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--max-evals', type=int, default=None, help="Parameter sets per window")
+    parser.add_argument('--output', default='best_params.json', help="Where to write the latest best parameters")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    optimizer = WalkForwardOptimizer(
+        in_sample=args.in_sample,
+        out_of_sample=args.out_of_sample,
+        objective=args.objective,
+        max_workers=args.workers,
+        max_evals=args.max_evals,
+    )
+    result = optimizer.run(load_history(args.history))
+    summary = result.summary()
+    logging.info(f"Walk-forward summary: {summary}")
+
+    best = dict(DEFAULT_PARAMS)
+    best.update(result.best_params)
+    with open(args.output, 'w') as f:
+        json.dump(best, f, indent=2)
+    logging.info(f"Best parameters written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()